@@ -5,7 +5,7 @@ from PIL import Image
 # pylint: disable=import-error
 from utils.images import paste_and_save_album_image
 
-def create_album_image(display, image, text, colors):
+def create_album_image(display, image, text, colors, output_path=None):
     """
     Create a PNG file where the album cover is placed in the center of the screen.
 
@@ -18,12 +18,13 @@ def create_album_image(display, image, text, colors):
         image (PIL.Image): The album cover image to be placed in the center.
         text (str): The text to be displayed along with the image.
         colors (list): A list of two colors used to create the background.
+        output_path (str, optional): Where to save the final image.
     """
     # Create a color background
     background = create_color_background(int(display[0]), int(display[1]), colors)
 
     # Paste the album image and save the final image
-    paste_and_save_album_image(background, image, display, text)
+    paste_and_save_album_image(background, image, display, text, output_path)
 
 
 def create_color_background(base_width, base_height, colors):
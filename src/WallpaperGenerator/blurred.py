@@ -9,47 +9,76 @@ from PIL import Image, ImageFilter
 from utils import images
 
 #pylint: disable=no-member
-def create_blurred_image(image, display, radius=20):
+def create_blurred_image(image, display, radius=20, output_path=None, background=None):
     """
     Creates a blurred background image from the cover image data.
 
     Args:
-        cover_image_data (bytes): Image data as bytes.
-        display_dimensions (tuple): Dimensions of the display (width, height).
-        blur_radius (int): Radius of the Gaussian blur filter.
+        image (PIL.Image): The album cover image.
+        display (tuple): Dimensions of the display (width, height).
+        radius (int): Radius of the Gaussian blur filter.
+        output_path (str, optional): Where to save the final image.
+        background (PIL.Image, optional): The image already created by
+            `create_blurred_background` for this cover, if available.
 
     """
     try:
-        # Resize, crop, and blur the album image
+        blurred_image = background
+        if blurred_image is None:
+            blurred_image = create_blurred_background(image, display, radius)
 
-        base_width, base_height = int(display[0]), int(display[1])
-        resized_image = images.resize_and_center_image(image, base_width*2, base_height*2)
-        blurred_image = resized_image.filter(ImageFilter.GaussianBlur(radius=radius))
-
-        cover_image = image
-        cover_width, cover_height = image.size
-        cover_image = image.resize((int(1.2 * cover_width),
-                                    int(1.2 * cover_height)), Image.LANCZOS)
-        x_position = (blurred_image.width - cover_image.width) // 2
-        y_position = (blurred_image.height - cover_image.height) // 2
-        blurred_image.paste(cover_image, (x_position, y_position))
-
-        save_image(blurred_image)
+        save_image(blurred_image, output_path)
         return blurred_image
 
     except io.UnsupportedOperation as e:
         print(f"Error creating blurred background: {e}")
         return None
 
-def save_image(image):
+def create_blurred_background(image, display, radius=20, scale=1, resample=Image.LANCZOS):
+    """
+    Create the blurred cover with the cover pasted in the center.
+
+    Args:
+        image (PIL.Image): The album cover image.
+        display (tuple): Dimensions of the display (width, height).
+        radius (int): Radius of the Gaussian blur filter.
+        scale (float, optional): The size the blur is computed at, relative to the
+            wallpaper. Below 1, the blurred cover is stretched back to full size, which
+            the blur hides. Defaults to 1.
+        resample (int, optional): The resampling filter. Defaults to `Image.LANCZOS`.
+
+    Returns:
+        PIL.Image: The blurred image.
+    """
+    # Resize, crop, and blur the album image
+    base_width, base_height = int(display[0]), int(display[1])
+    resized_image = images.resize_and_center_image(image, int(base_width*2*scale),
+                                                   int(base_height*2*scale), resample)
+    blurred_image = resized_image.filter(ImageFilter.GaussianBlur(radius=radius*scale))
+    if scale != 1:
+        blurred_image = blurred_image.resize((round(blurred_image.width / scale),
+                                              round(blurred_image.height / scale)),
+                                             Image.BILINEAR)
+
+    cover_image = image
+    cover_width, cover_height = image.size
+    cover_image = image.resize((int(1.2 * cover_width),
+                                int(1.2 * cover_height)), resample)
+    x_position = (blurred_image.width - cover_image.width) // 2
+    y_position = (blurred_image.height - cover_image.height) // 2
+    blurred_image.paste(cover_image, (x_position, y_position))
+
+    return blurred_image
+
+def save_image(image, path=None):
     """
     Save the image to the specified path.
 
     Args:
         image (Image): The image to save.
-        path (str): The path to save the image to.
+        path (str, optional): The path to save the image to.
     """
     try:
-        image.save("ImageCache/finalImage.png")
+        images.save_final_image(image, path)
     except io.UnsupportedOperation as e:
         print(f"Error saving image: {e}")
@@ -2,12 +2,16 @@
 Module for generating a controller image based on the provided song details.
 """
 
+import io
+
 from PIL import Image, ImageDraw, ImageFont
 from lxml import etree
 from cairosvg import svg2png
+from utils.images import save_final_image
 
 #pylint: disable=import-error, too-many-arguments, too-many-positional-arguments, too-many-locals, c-extension-no-member
-def create_controller_image(song_title, artist_name, colors, display, song_length, album_image):
+def create_controller_image(song_title, artist_name, colors, display, song_length, album_image,
+                            output_path=None):
     """
     Create a controller image based on the provided song details.
     
@@ -18,83 +22,157 @@ def create_controller_image(song_title, artist_name, colors, display, song_lengt
         display (tuple): The dimensions of the display.
         song_length (int): The length of the song in milliseconds.
         album_image (Image): The album image.
+        output_path (str, optional): Where to save the final image.
         
     Returns:
         Image: A controller image based on the provided song details.
     """
-    # Calculate minutes and seconds from song length
-    minutes = int(song_length / 60000)
-    seconds = int((song_length % 60000) / 1000)
+    layer = ControllerLayer(song_title, artist_name, colors, display, song_length, album_image)
 
-    # Get display dimensions
-    width = int(display[0])
-    height = int(display[1])
+    # Save the final controller image
+    save_final_image(layer.render(), output_path)
 
-    # Set background color
-    background_color = colors[0].rgb
-
-    # Create a new image with the specified dimensions and background color
-    controller_image = Image.new('RGB', (width, height), background_color)
-
-    # Create a draw object for drawing on the image
-    draw = ImageDraw.Draw(controller_image)
-
-    # Set the font for text
-    font = ImageFont.truetype("./fonts/Rubik.ttf", 40)
-
-    # Paste the album image onto the controller image
-    controller_image.paste(album_image, (width // 2 - album_image.width // 2, height // 6))
-
-    # Modify the fill color of specified paths in an SVG and convert it to PNG
-    fill_with_secondary_color(colors[1].rgb, 200, 200)
-
-    # Open the pause button image
-    pause_button = Image.open("ImageCache/pause-button.png").convert("RGBA")
-
-    # Generate text image with song title and artist name
-    text = generate_centered_text_image(song_title, artist_name, colors, display)
-
-    # Paste the pause button image onto the controller image
-    controller_image.paste(pause_button,
-                           (width // 2 - pause_button.width // 2,
-                            height // 6 + album_image.height + 250),
-                           mask=pause_button)
-
-    # Draw a rectangle below the pause button
-    draw.rectangle([width//6,
-                    height//6 + album_image.height + 210,
-                    width - width//6 + 100, height//6 + album_image.height + 215],
-                    fill=colors[1].rgb)
-
-    # Draw the song length text
-    text_offset = (1, 1)
-    draw.text((width//6 - 120 + text_offset[0],
-               height//6 + album_image.height + 190 + text_offset[1]),
-               "00:00", font=font, fill=(0, 0, 0))  # Draw black shadow
-
-    draw.text((width//6 - 120,
-               height//6 + album_image.height + 190),
-               "00:00", font=font, fill=colors[1].rgb)  # Draw desired color on top
-
-    duration = f"{minutes if minutes > 9 else '0' + str(minutes)}"
-    duration += f":{seconds if seconds > 9 else '0' + str(seconds)}"
-    draw.text((width - width//6 + 100 + text_offset[0],
-                height//6 + album_image.height + 190 + text_offset[1]),
-                duration,
-                font=font, fill=(0, 0, 0))  # Draw black shadow
-    draw.text((width - width//6 + 100,
-                    height//6 + album_image.height + 190),
-                    duration,
-                    font=font, fill=colors[1].rgb)  # Draw desired color on top
-
-    # Paste the text image onto the controller image
-    controller_image.paste(text,
-                           (width // 2 - text.width // 2,
-                            height // 6 + album_image.height + 100),
-                            mask=text)
 
-    # Save the final controller image
-    controller_image.save("ImageCache/finalImage.png")
+class ControllerLayer:
+    """
+    A controller wallpaper whose progress bar can be redrawn without rebuilding the rest.
+
+    The album image, the title, the pause button and the song length are drawn once
+    into a base layer. Drawing a new progress only restores the rectangle of the
+    elapsed time and of the bar from the base layer and draws them again, which takes
+    well under a millisecond at any resolution.
+
+    Attributes:
+        song_length (int): The length of the song in milliseconds.
+        base (Image): The wallpaper without the elapsed time and the bar.
+        frame (Image): The wallpaper with the last progress drawn.
+        dirty_box (tuple): The rectangle redrawn for every progress, as (left, upper,
+            right, lower).
+    """
+
+    def __init__(self, song_title, artist_name, colors, display, song_length, album_image):
+        """
+        Draw the base layer.
+
+        Args:
+            song_title (str): The title of the song.
+            artist_name (str): The name of the artist.
+            colors (list): A list of two color objects.
+            display (tuple): The dimensions of the display.
+            song_length (int): The length of the song in milliseconds.
+            album_image (Image): The album image.
+        """
+        self.song_length = song_length
+        self.colors = colors
+
+        # Get display dimensions
+        width = int(display[0])
+        height = int(display[1])
+        top = height // 6 + album_image.height
+
+        # Set the font for text
+        self.font = ImageFont.truetype("./fonts/Rubik.ttf", 40)
+
+        # Create a new image with the specified dimensions and background color
+        base = Image.new('RGB', (width, height), colors[0].rgb)
+
+        # Paste the album image onto the controller image
+        base.paste(album_image, (width // 2 - album_image.width // 2, height // 6))
+
+        # Modify the fill color of specified paths in an SVG and convert it to an image
+        pause_button = fill_with_secondary_color(colors[1].rgb, 200, 200)
+
+        # Paste the pause button image onto the controller image
+        base.paste(pause_button,
+                   (width // 2 - pause_button.width // 2, top + 250),
+                   mask=pause_button)
+
+        # Draw the song length text
+        draw_shadowed_text(ImageDraw.Draw(base), (width - width//6 + 100, top + 190),
+                           format_time(song_length), self.font, colors[1].rgb)
+
+        # Generate text image with song title and artist name, and paste it
+        text = generate_centered_text_image(song_title, artist_name, colors, display)
+        base.paste(text, (width // 2 - text.width // 2, top + 100), mask=text)
+
+        # The bar below the pause button, and the elapsed time on its left
+        self.bar = (width//6, top + 210, width - width//6 + 100, top + 215)
+        self.elapsed_position = (width//6 - 120, top + 190)
+
+        # The rectangle covering both, shadow included
+        _, upper, _, lower = self.font.getbbox("00:00")
+        self.dirty_box = (self.elapsed_position[0],
+                          min(self.elapsed_position[1] + upper, self.bar[1]),
+                          self.bar[2] + 1,
+                          max(self.elapsed_position[1] + lower + 2, self.bar[3] + 1))
+
+        self.base = base
+        self.frame = base.copy()
+
+    def render(self, progress_ms=None):
+        """
+        Draw the elapsed time and the bar.
+
+        Args:
+            progress_ms (int, optional): The position in the song, in milliseconds.
+                If not given, "00:00" and a full bar are drawn, like a paused player.
+
+        Returns:
+            Image: The wallpaper. It is drawn again by the next call, so it must be
+                saved or copied before.
+        """
+        self.frame.paste(self.base.crop(self.dirty_box), self.dirty_box[:2])
+        draw = ImageDraw.Draw(self.frame)
+        secondary = self.colors[1].rgb
+
+        if progress_ms is None:
+            draw.rectangle(self.bar, fill=secondary)
+            progress_ms = 0
+        else:
+            progress_ms = max(0, min(progress_ms, self.song_length or 0))
+            # The remaining part of the bar is halfway between the two colors
+            remaining = tuple((a + b) // 2 for a, b in zip(self.colors[0].rgb, secondary))
+            draw.rectangle(self.bar, fill=remaining)
+
+            left, upper, right, lower = self.bar
+            if self.song_length:
+                filled = left + round((right - left) * progress_ms / self.song_length)
+                if filled > left:
+                    draw.rectangle((left, upper, filled, lower), fill=secondary)
+
+        draw_shadowed_text(draw, self.elapsed_position, format_time(progress_ms), self.font,
+                           secondary)
+        return self.frame
+
+
+def format_time(milliseconds):
+    """
+    Format a duration as minutes and seconds.
+
+    Args:
+        milliseconds (int): The duration in milliseconds.
+
+    Returns:
+        str: The duration, e.g. "03:07".
+    """
+    minutes = int(milliseconds / 60000)
+    seconds = int((milliseconds % 60000) / 1000)
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def draw_shadowed_text(draw, position, text, font, color):
+    """
+    Draw a text with a black shadow, one pixel down and right.
+
+    Args:
+        draw (ImageDraw): The draw object of the image.
+        position (tuple): Where to draw the text.
+        text (str): The text.
+        font (ImageFont): The font.
+        color (tuple): The color of the text.
+    """
+    draw.text((position[0] + 1, position[1] + 1), text, font=font, fill=(0, 0, 0))
+    draw.text(position, text, font=font, fill=color)
 
 
 
@@ -102,11 +180,16 @@ def fill_with_secondary_color(color, width, height):
     """
     Modifies the fill color of specified paths in an SVG and converts it to PNG.
 
+    The conversion happens in memory, so that concurrent renders don't share
+    any intermediate file.
+
     Args:
         color: A tuple representing the desired color (RGB values).
         width: The desired output image width.
         height: The desired output image height.
-        svg_filename: The filename of the SVG file to modify.
+
+    Returns:
+        Image: The pause button, as an RGBA image.
     """
 
     with open("src/img/pause-button.svg", 'rb') as f:  # Open in binary mode
@@ -120,15 +203,12 @@ def fill_with_secondary_color(color, width, height):
         if 'fill' in element.attrib:
             element.attrib['fill'] = f"#{color[0]:02x}{color[1]:02x}{color[2]:02x}"
 
-    #save the modified svg
-    with open("ImageCache/modified_pause-button.svg", 'wb') as f:
-        f.write(etree.tostring(svg))
+    #convert the modified svg to a png image
+    png_data = svg2png(bytestring=etree.tostring(svg),
+                       output_width=width, output_height=height,
+                       background_color="transparent")
 
-    #convert the svg to a png image
-    svg2png(url="ImageCache/modified_pause-button.svg",
-            write_to="ImageCache/pause-button.png",
-            output_width=width, output_height=height,
-            background_color="transparent")
+    return Image.open(io.BytesIO(png_data)).convert("RGBA")
 
 
 
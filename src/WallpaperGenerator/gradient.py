@@ -6,7 +6,8 @@ from PIL import Image, ImageDraw
 #pylint: disable=import-error, too-many-arguments, too-many-positional-arguments
 from utils.images import generate_text_image, find_darkest_color, paste_and_save_album_image
 
-def generate_gradient_image(colors, display, album_image_width, song_title, artist_name, image):
+def generate_gradient_image(colors, display, album_image_width, song_title, artist_name, image,
+                            output_path=None, centered=None, background=None):
     """
     Generate a gradient image based on the colors of the album image.
     
@@ -17,19 +18,29 @@ def generate_gradient_image(colors, display, album_image_width, song_title, arti
         song_title (str): The title of the current song.
         artist_name (str): The name of the artist.
         image (PIL.Image): The album cover image.
+        output_path (str, optional): Where to save the final image.
+        centered (bool, optional): Use the centered gradient instead of the standard one.
+            Chosen at random if not given.
+        background (PIL.Image, optional): The gradient already created for these colors
+            and this variant, if available (see `create_gradient_background`).
+            It is left untouched.
 
     Returns:
         None: The function saves the final image to the disk instead of returning it.
     """
     # Randomly decide between standard or centered gradient
-    if random.choice([True, False]):
-        # Generate standard gradient background
-        bg = create_standard_gradient(colors, display)
+    if centered is None:
+        centered = random.choice([True, False])
+
+    if background is None:
+        bg = create_gradient_background(colors, display, album_image_width, centered)
+    else:
+        bg = background.copy()
+
+    if not centered:
         # Generate text to overlay on the gradient
         text = generate_text_image(song_title, artist_name, colors, display)
     else:
-        # Generate centered gradient background
-        bg = create_centered_gradient(colors, display, album_image_width)
         # Generate text with the darkest color
         text = generate_text_image(
             song_title, artist_name,
@@ -39,7 +50,48 @@ def generate_gradient_image(colors, display, album_image_width, song_title, arti
         )
 
     # Paste the album image and save the final image
-    paste_and_save_album_image(bg, image, display, text)
+    paste_and_save_album_image(bg, image, display, text, output_path)
+
+def create_gradient_background(colors, display, album_image_width, centered, ellipses=300):
+    """
+    Create the gradient of one of the two variants.
+
+    Args:
+        colors (list): A list of two color objects with RGB values.
+        display (tuple): A tuple containing the display's width and height (width, height).
+        album_image_width (int): The width of the album cover image.
+        centered (bool): Create the centered gradient instead of the standard one.
+        ellipses (int, optional): The number of ellipses of the centered gradient.
+            Defaults to 300.
+
+    Returns:
+        PIL.Image: The generated gradient image.
+    """
+    if centered:
+        return create_centered_gradient(colors, display, album_image_width, ellipses)
+    return create_standard_gradient(colors, display)
+
+
+def create_placeholder_gradient(colors, size):
+    """
+    Create a vertical gradient between two colors without drawing it line by line.
+
+    Pillow builds a 256 pixels gradient mask, stretched to the requested size, and
+    blends two solid images with it, so even a large gradient takes a few milliseconds.
+
+    Args:
+        colors (list): A list of two color objects with RGB values.
+        size (tuple): The width and height of the image.
+
+    Returns:
+        PIL.Image: The generated gradient image.
+    """
+    width, height = int(size[0]), int(size[1])
+    mask = Image.linear_gradient('L').resize((width, height))
+    first = Image.new('RGB', (width, height), tuple(colors[0].rgb))
+    second = Image.new('RGB', (width, height), tuple(colors[1].rgb))
+    return Image.composite(second, first, mask)
+
 
 def create_standard_gradient(colors, display):
     """
@@ -70,7 +122,7 @@ def create_standard_gradient(colors, display):
     return gradient
 
 
-def create_centered_gradient(colors, display, album_image_width):
+def create_centered_gradient(colors, display, album_image_width, ellipses=300):
     """
     Create a radial gradient centered on the screen, with ellipses expanding outwards.
     
@@ -78,12 +130,13 @@ def create_centered_gradient(colors, display, album_image_width):
         colors (list): A list of two color objects with RGB values.
         display (tuple): A tuple containing the display's width and height (width, height).
         album_image_width (int): The width of the album cover image.
+        ellipses (int, optional): The number of ellipses on a square display.
+            Defaults to 300.
 
     Returns:
         PIL.Image: The generated centered gradient image.
     """
     width, height = int(display[0]), int(display[1])
-    ellipses = 300
     min_dim = min(width, height)
 
     gradient = Image.new('RGB', (width, height))
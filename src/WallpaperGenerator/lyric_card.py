@@ -4,10 +4,14 @@ Module for generating lyric card images.
 #pylint: disable=import-error, no-member
 
 from PIL import Image, ImageDraw, ImageFont
+from utils.images import save_final_image
+from utils.lrc import line_at, next_change
 from utils.lyric_finder import LyricFinderClient
 
 
-def create_lyric_image(display, artist_name, song_name, colors, cover_image):
+#pylint: disable=too-many-arguments, too-many-positional-arguments
+def create_lyric_image(display, artist_name, song_name, colors, cover_image, lyric=None,
+                       output_path=None, resample=Image.LANCZOS):
     """
     Create a lyric card image with the provided text and colors.
 
@@ -16,12 +20,18 @@ def create_lyric_image(display, artist_name, song_name, colors, cover_image):
 
     Args:
         display (tuple): A tuple containing the display's width and height (width, height).
-        text (str): The text to be displayed on the lyric card.
+        artist_name (str): The name of the artist.
+        song_name (str): The title of the song.
         colors (list): A list of two colors used to create the background.
+        cover_image (PIL.Image): The album cover image.
+        lyric (str, optional): The part of the lyrics to show. If not given,
+            the lyrics are looked up on Genius.
+        output_path (str, optional): Where to save the final image.
+        resample (int, optional): The filter used to fit the lyrics.
+            Defaults to `Image.LANCZOS`.
     """
     width = int(display[0])
     height = int(display[1])
-    lf = LyricFinderClient()
 
     # Create a color background using the dominant color
     background_color = colors[0].rgb
@@ -30,12 +40,15 @@ def create_lyric_image(display, artist_name, song_name, colors, cover_image):
     background_image = Image.new('RGB', (width, height), background_color)
 
     # Get the relevant lyrics for the song
-    lyric = lf.get_lyric(artist_name + " " + song_name)
+    if lyric is None:
+        lf = LyricFinderClient()
+        lyric = lf.get_lyric(artist_name + " " + song_name)
+        lyric = lf.find_most_relevant_part(lyric) if lyric else None
 
-    if not lyric:
-        return None
+        if not lyric:
+            return None
 
-    lyric = lf.find_most_relevant_part(lyric).upper()
+        lyric = lyric.upper()
 
     paste_album_image(background_image, cover_image)
 
@@ -49,7 +62,7 @@ def create_lyric_image(display, artist_name, song_name, colors, cover_image):
     #paste the text on the image on x,y position
     background_image.paste(text, (x, y), mask = text)
 
-    lyric_box = generate_lyric_box(display, lyric, colors)
+    lyric_box = generate_lyric_box(display, lyric, colors, resample)
 
     #coordinates to place the lyric box on the right side of the image, without going out of bounds
     x = background_image.width // 2 + (background_image.width // 2 - lyric_box.width) // 2
@@ -58,7 +71,7 @@ def create_lyric_image(display, artist_name, song_name, colors, cover_image):
     #paste the lyric box on the image
     background_image.paste(lyric_box, (x, y), mask = lyric_box)
 
-    background_image.save("ImageCache/finalImage.png")
+    save_final_image(background_image, output_path)
 
     return background_image
 
@@ -123,7 +136,7 @@ def generate_header_text_image(song_name, artist_name, colors, display):
 
     return cropped
 
-def generate_lyric_box(display, lyric, colors):
+def generate_lyric_box(display, lyric, colors, resample=Image.LANCZOS):
     """
     Generate a text image with the song title and artist name, centered on the display.
     
@@ -132,6 +145,7 @@ def generate_lyric_box(display, lyric, colors):
         artistName (str): The name of the artist of the currently playing song.
         colors (list): A list of two color objects.
         display (tuple): The dimensions of the display.
+        resample (int, optional): The filter used if the text must be shrunk to fit.
         
     Returns:
         Image: A new image with the song title and artist name, centered on the display."""
@@ -164,6 +178,145 @@ def generate_lyric_box(display, lyric, colors):
     #if the text is larger than half the display, resize it to fit
     if cropped.width > width // 2:
         cropped = cropped.resize((width // 2 - width // 100,
-                                  cropped.height), Image.LANCZOS)
+                                  cropped.height), resample)
 
     return cropped
+
+
+class SyncedLyricCard:
+    """
+    A lyric card showing the line sung at the playback position.
+
+    The background, the cover and the header are drawn once into a base layer, and the
+    text of every line is rendered once per track. Showing another line only restores
+    the rectangle of the previous one from the base layer and pastes the new one.
+
+    Attributes:
+        lines (list): The synced lines, as (time in milliseconds, text) tuples.
+        base (Image): The card without any line.
+        frame (Image): The card with the line shown last.
+        layers (dict): The text layer of every line, keyed by text (None if empty).
+        index (int): The index of the line shown, -1 before the first one,
+            None if nothing was drawn yet.
+        dirty_box (tuple): The rectangle of the line shown, or None.
+    """
+
+    #pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(self, display, artist_name, song_name, colors, cover_image, lines):
+        """
+        Draw the base layer and render the lines.
+
+        Args:
+            display (tuple): A tuple containing the display's width and height (width, height).
+            artist_name (str): The name of the artist.
+            song_name (str): The title of the song.
+            colors (list): A list of two colors used to create the background.
+            cover_image (PIL.Image): The album cover image.
+            lines (list): The synced lines, see `utils.lrc.parse_lrc`.
+        """
+        width = int(display[0])
+        height = int(display[1])
+        self.lines = lines
+
+        base = Image.new('RGB', (width, height), colors[0].rgb)
+        paste_album_image(base, cover_image)
+
+        text = generate_header_text_image(song_name, artist_name, colors, display)
+        x = base.width // 6 + cover_image.width // 2 - text.width // 2
+        y = base.height // 2 + cover_image.height // 2 + text.height // 2
+        base.paste(text, (x, y), mask=text)
+
+        font = ImageFont.truetype("./fonts/Rubik.ttf", 40)
+        color = contrasting_text_color(colors[0].rgb)
+        self.layers = {}
+        for _, words in lines:
+            if words not in self.layers:
+                self.layers[words] = generate_line_layer(words.upper(), font, color,
+                                                         width // 2 - width // 100)
+
+        self.base = base
+        self.frame = base.copy()
+        self.index = None
+        self.dirty_box = None
+
+    def render(self, position_ms):
+        """
+        Show the line sung at a position.
+
+        Args:
+            position_ms (int): The position in the song, in milliseconds.
+
+        Returns:
+            Image: The card, or None if the line shown didn't change. It is drawn again
+                by the next call, so it must be saved or copied before.
+        """
+        index = line_at(self.lines, position_ms)
+        if index == self.index:
+            return None
+        self.index = index
+
+        if self.dirty_box:
+            self.frame.paste(self.base.crop(self.dirty_box), self.dirty_box[:2])
+            self.dirty_box = None
+
+        layer = self.layers.get(self.lines[index][1]) if index >= 0 else None
+        if layer is not None:
+            # On the right side of the image, like the lyric box of the static card
+            x = self.frame.width // 2 + (self.frame.width // 2 - layer.width) // 2
+            y = self.frame.height // 2 - layer.height // 2
+            self.frame.paste(layer, (x, y), mask=layer)
+            self.dirty_box = (x, y, x + layer.width, y + layer.height)
+
+        return self.frame
+
+    def next_change(self, position_ms):
+        """
+        Find when the line shown changes.
+
+        Args:
+            position_ms (int): The position in the song, in milliseconds.
+
+        Returns:
+            int: The time of the next line in milliseconds, or None after the last one.
+        """
+        return next_change(self.lines, position_ms)
+
+
+def contrasting_text_color(color):
+    """
+    Choose black or white, whichever is readable on a background color.
+
+    Args:
+        color (tuple): The RGB background color.
+
+    Returns:
+        tuple: The RGB text color.
+    """
+    if (color[0]*0.299 + color[1]*0.587 + color[2]*0.114) > 186:
+        return (0, 0, 0)
+    return (255, 255, 255)
+
+
+def generate_line_layer(line, font, color, max_width):
+    """
+    Render a line of lyrics on a transparent layer as large as the text.
+
+    Args:
+        line (str): The line.
+        font (ImageFont): The font.
+        color (tuple): The RGB text color.
+        max_width (int): The maximum width; longer lines are squeezed to fit.
+
+    Returns:
+        Image: The layer, or None if the line is empty.
+    """
+    if not line.strip():
+        return None
+
+    left, top, right, bottom = font.getbbox(line, stroke_width=2)
+    layer = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    ImageDraw.Draw(layer).text((-left, -top), line, font=font, fill=color, stroke_width=2)
+
+    if layer.width > max_width:
+        layer = layer.resize((max_width, layer.height), Image.LANCZOS)
+    return layer
@@ -1,25 +1,49 @@
 """
 Module to generate wallpapers based on song details.
+
+The mode modules are imported the first time their mode is rendered, so that starting
+the program doesn't pay for the dependencies of modes that are never used
+(cairosvg for the controller, the lyrics client for the lyric card, ...).
 """
 
 import os
-import io
+import random
+import threading
 
 #pylint: disable=import-error, no-member
 from PIL import Image
-import colorgram
-
 
 from utils import images
-from utils.cache import CacheManager
+from utils.cache import AlbumCache, CacheManager
+from utils.cancellation import RenderCancelled, checkpoint
+from utils.lrc import parse_lrc
+from utils.metrics import RENDER_TIME
+from utils.profiling import RenderProfiler
+from utils.quality import QualityController
+from utils.tracing import tracer
+
+#pylint: disable=import-outside-toplevel
+
+# The palette is extracted from the smallest variant of the cover at least this wide
+PALETTE_WIDTH = 64
+
+# Where the placeholder shown while a wallpaper is rendered is saved
+PLACEHOLDER_PATH = "ImageCache/placeholder.png"
+
+# The placeholder is saved this many times smaller than the display: the wallpaper
+# backends stretch it, and a smooth gradient loses nothing when upscaled
+PLACEHOLDER_SCALE = 8
+
+# Where the frames of the live progress of the controller mode are saved. They are
+# stored as BMP: encoding a full frame takes a few milliseconds, against tens for a PNG
+PROGRESS_PATH = "ImageCache/progress.bmp"
 
+# Where the frames of the synced lyric card are saved, as BMP for the same reason
+SYNCED_LYRIC_PATH = "ImageCache/synced_lyric.bmp"
 
-from WallpaperGenerator.album_image import create_album_image as cai
-from WallpaperGenerator.gradient import generate_gradient_image as csi
-from WallpaperGenerator.blurred import create_blurred_image as cbi
-from WallpaperGenerator.waveform import create_waveform_image as cwi
-from WallpaperGenerator.controller import create_controller_image as cci
-from WallpaperGenerator.lyric_card import create_lyric_image as cli
+# The stages of a render whose time doesn't depend on its quality, left out of the
+# durations the quality controller sees
+UNSCALED_STAGES = ("download", "palette", "lyrics")
 
 class WallpaperGenerator:
     """
@@ -31,21 +55,163 @@ class WallpaperGenerator:
         display (list): The dimensions of the display.
         current_album_id (dict): Details of the song currently being displayed.
         CacheManager (CacheManager): The cache manager for managing cached image data.
+        album_cache (AlbumCache): The palettes, covers and backgrounds derived from a cover,
+            shared by the tracks of an album.
+        cover_index (CoverIndex): Maps the image URLs to cover IDs, so that the same
+            artwork under different URLs shares the album cache. Loaded on first use.
+        lyric_resolver (LyricResolver): Looks up the lyrics in background. Started on
+            first use; never shared, so that the lookups of another generator don't
+            queue ahead of the ones of this one.
+        profiler (RenderProfiler): Opt-in cProfile/tracemalloc hooks around the renders.
+        output_path (str): Where the generated wallpapers are saved.
+        current_image_path (str): The image of the wallpaper currently shown.
+        pending_lyric (str): ID of the song whose lyric card is waiting for the lyrics.
+        current_recipe (dict): What is needed to render the current wallpaper again
+            (see `make_recipe`), or None if it can't be rendered again.
+        current_images (list): The sizes of the cover of the current song, if known.
+        placeholders (bool): Whether `generate_placeholder` creates placeholders.
+        controller_layer (tuple): The song ID, the display and the `ControllerLayer` of the
+            last controller wallpaper rendered, kept to redraw its progress
+            (see `render_progress`).
+        lyric_library (LyricLibrary): The local lyrics (`<artist> - <title>.lrc`/`.txt`),
+            checked before Genius; the synced lyric card reads the `.lrc` files.
+            Opened on first use.
+        synced_card (tuple): The song ID, the display and the `SyncedLyricCard` of the
+            last synced lyric card rendered (see `render_synced_lyric`).
+        quality (QualityController): The quality of the renders of every mode, adapted
+            to the render budget.
+        background_cached (bool): Whether the last render took its background from the
+            album cache, in which case its duration is not given to `quality`.
+        shared (WallpaperGenerator): The generator whose cover index and lyric library
+            are used, or None if this one has its own.
+        resources (dict): The cover index and the lyrics created so far, by name.
+        read_only (bool): Whether the cover index and the lyric library are only read.
+        measured (bool): Whether the durations of the renders are given to
+            `RENDER_TIME` and `quality`.
     """
 
-    def __init__(self):
+    #pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(self, lyric_deadline=3, display=None, output_path=None, placeholders=True,
+                 lyrics_dir="lyrics", render_budget=None, shared=None, read_only=False,
+                 measured=True):
         """
         Initialize a new instance of the WallpaperGenerator class.
 
         Fetches the display dimensions and initializes the cache manager.
+
+        Parameters:
+            lyric_deadline (float, optional): Seconds to wait for the lyrics before
+                falling back to another mode. Defaults to 3.
+            display (list, optional): The dimensions of the display (width, height).
+                Detected with xrandr if not given.
+            output_path (str, optional): Where the wallpapers are saved.
+                Defaults to `images.FINAL_IMAGE_PATH`.
+            placeholders (bool, optional): Create a placeholder to show while the
+                wallpapers are rendered. Defaults to True.
+            lyrics_dir (str, optional): The folder of the local lyrics.
+                Defaults to "lyrics".
+            render_budget (float, optional): The time a render should take, in seconds;
+                the modes over it are rendered at a lower quality. Defaults to None,
+                always full quality.
+            shared (WallpaperGenerator, optional): A generator whose cover index and
+                lyric library are reused, e.g. to render in background next to it. It
+                closes them; `lyrics_dir` is then ignored.
+            read_only (bool, optional): Never write the cover index nor refresh the
+                lyric library, e.g. in processes rendering next to each other (see
+                `CoverIndex.take_added`). Defaults to False.
+            measured (bool, optional): Give the durations of the renders to the
+                `RENDER_TIME` metric and to the quality controller. False for the
+                background renders, which would skew the measurements of the
+                wallpapers shown. Defaults to True.
         """
-        self.display = os.popen("xrandr").read().split("\n")[2].split()[0].split("x")
+        self.display = display or self.detect_display()
+        self.output_path = output_path or images.FINAL_IMAGE_PATH
+        self.current_image_path = None
         self.current_album_id = None
         self.current_artist = None
         self.current_song = None
         self.current_song_id = None
         self.current_mode = None
         self.cache_manager = CacheManager()
+        self.album_cache = AlbumCache()
+        # The cover index and the lyrics read files and start threads: they are only
+        # created when a mode needs them, like the renderers are only imported then
+        self.shared = shared
+        self.lyric_deadline = lyric_deadline
+        self.lyrics_dir = lyrics_dir
+        self.read_only = read_only
+        self.measured = measured
+        self.resources = {}
+        self.resources_lock = threading.RLock()
+        self.profiler = RenderProfiler.from_environment()
+        self.pending_lyric = None
+        self.current_recipe = None
+        self.current_images = None
+        self.placeholders = placeholders
+        self.controller_layer = None
+        self.synced_card = None
+        self.quality = QualityController(render_budget)
+        self.background_cached = False
+
+    def resource(self, name, create):
+        """
+        Get a resource of the generator, creating it on first use.
+
+        Parameters:
+            name (str): The name of the resource.
+            create (callable): The function creating it, called without arguments.
+
+        Returns:
+            The resource.
+        """
+        with self.resources_lock:
+            if name not in self.resources:
+                self.resources[name] = create()
+            return self.resources[name]
+
+    @property
+    def cover_index(self):
+        """CoverIndex: Maps the image URLs to cover IDs, see the class attributes."""
+        if self.shared:
+            return self.shared.cover_index
+
+        def create():
+            from utils.cover_index import CoverIndex
+            return CoverIndex(persist=not self.read_only)
+
+        return self.resource("cover_index", create)
+
+    @property
+    def lyric_library(self):
+        """LyricLibrary: The local lyrics, see the class attributes."""
+        if self.shared:
+            return self.shared.lyric_library
+
+        def create():
+            from utils.lyric_library import LyricLibrary
+            return LyricLibrary(self.lyrics_dir,
+                                refresh_interval=None if self.read_only else 30)
+
+        return self.resource("lyric_library", create)
+
+    @property
+    def lyric_resolver(self):
+        """LyricResolver: Looks up the lyrics in background, see the class attributes."""
+        def create():
+            from utils.lyric_resolver import LyricResolver
+            return LyricResolver(deadline=self.lyric_deadline, library=self.lyric_library)
+
+        return self.resource("lyric_resolver", create)
+
+    @staticmethod
+    def detect_display():
+        """
+        Detect the dimensions of the display, using the first one listed by xrandr.
+
+        Returns:
+            list: The width and the height of the display, as strings.
+        """
+        return os.popen("xrandr").read().split("\n")[2].split()[0].split("x")
 
     def get_current_song(self):
         """
@@ -143,6 +309,159 @@ class WallpaperGenerator:
         """
         self.current_mode = mode
 
+    def set_song_details(self, song_details):
+        """
+        Set album, title, ID, artist and cover sizes of the currently playing song at once.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL).
+        """
+        self.set_current_album(song_details['image_url'])
+        self.set_current_song(song_details['song_title'])
+        self.set_current_song_id(song_details['song_id'])
+        self.set_current_artist(song_details['artist_name'])
+        self.current_images = song_details.get('images')
+
+    def get_current_image_path(self):
+        """
+        Get the path of the image of the wallpaper currently shown.
+
+        Returns:
+            str: The path of the image, or None if no wallpaper was generated yet.
+        """
+        return self.current_image_path
+
+    def set_current_image_path(self, path):
+        """
+        Set the path of the image of the wallpaper currently shown.
+
+        Parameters:
+            path (str): The path of the image.
+        """
+        self.current_image_path = path
+
+    def get_current_recipe(self):
+        """
+        Get the recipe of the wallpaper currently shown.
+
+        Returns:
+            dict: The recipe, or None if the current wallpaper was not rendered by this
+                generator in the current mode (e.g. it came from the render cache).
+        """
+        recipe = self.current_recipe
+        if (recipe is None or recipe["song_id"] != self.current_song_id
+                or recipe["mode"] != self.current_mode):
+            return None
+        return recipe
+
+    def set_current_recipe(self, recipe):
+        """
+        Set the recipe of the wallpaper currently shown.
+
+        Parameters:
+            recipe (dict): The recipe, e.g. of a favorite.
+        """
+        self.current_recipe = recipe
+
+    def make_recipe(self, mode, colors, **extra):
+        """
+        Build the recipe of a wallpaper of the current song.
+
+        A recipe holds everything a mode needs besides the cover itself, so that the
+        wallpaper can be rendered again at any resolution without extracting the
+        palette or looking up the lyrics again.
+
+        Parameters:
+            mode (str): The wallpaper mode.
+            colors (list): The colors of the wallpaper, or None if the mode has none.
+            **extra: The details specific to the mode (gradient variant, lyric).
+
+        Returns:
+            dict: The recipe.
+        """
+        # The perceptual hash of the smallest variant identifies the cover
+        thumbnail_url = images.pick_image(self.current_images, 0, self.get_current_album())
+        recipe = {
+            "mode": mode,
+            "song_id": self.get_current_song_id(),
+            "song_title": self.get_current_song(),
+            "artist_name": self.get_current_artist(),
+            "image_url": self.get_current_album(),
+            "images": self.current_images,
+            "cover_hash": self.get_cover_id(thumbnail_url),
+            "palette": [[*color.rgb, color.proportion] for color in colors] if colors else None,
+        }
+        recipe.update(extra)
+        return recipe
+
+    def render_recipe(self, recipe):
+        """
+        Render a wallpaper from its recipe, at the current display size.
+
+        The state of the generator (current song, mode, image) is left untouched.
+
+        Parameters:
+            recipe (dict): The recipe, see `make_recipe`.
+
+        Returns:
+            str: The path of the rendered wallpaper.
+
+        Raises:
+            ValueError: If the mode of the recipe can't be rendered from a recipe.
+        """
+        import colorgram
+
+        mode = recipe["mode"]
+        display = self.get_display()
+        url = recipe["image_url"]
+        variants = recipe.get("images")
+
+        with tracer.span("render", mode=mode, recipe=True):
+            thumbnail_url = images.pick_image(variants, 0, url)
+            if self.get_cover_id(thumbnail_url) != recipe["cover_hash"]:
+                print(f"The cover of {recipe['song_title']} changed since it was saved")
+
+            colors = [colorgram.Color(*color) for color in recipe["palette"] or []]
+
+            checkpoint("compose")
+            match mode:
+                case "albumImage":
+                    from WallpaperGenerator.album_image import create_album_image as cai
+
+                    text = images.generate_text_image(recipe["song_title"],
+                                                      recipe["artist_name"], colors, display)
+                    cai(display, self.setup_album_image(display, url, variants), text, colors,
+                        self.output_path)
+                case "gradient":
+                    from WallpaperGenerator.gradient import generate_gradient_image as csi
+
+                    image = self.setup_album_image(display, url, variants)
+                    csi(colors, display, image.width, recipe["song_title"],
+                        recipe["artist_name"], image, self.output_path,
+                        centered=recipe["centered"])
+                case "blurred":
+                    from WallpaperGenerator.blurred import create_blurred_image as cbi
+
+                    cbi(images.decode_cover(self.cache_manager.get(url)), display,
+                        output_path=self.output_path)
+                case "controllerImage":
+                    from WallpaperGenerator.controller import create_controller_image as cci
+
+                    cci(recipe["song_title"], recipe["artist_name"], colors, display,
+                        recipe["song_length"], self.setup_album_image(display, url, variants),
+                        self.output_path)
+                case "lyric":
+                    from WallpaperGenerator.lyric_card import create_lyric_image as cli
+
+                    cli(display, recipe["artist_name"], recipe["song_title"], colors,
+                        self.setup_album_image(display, url, variants), recipe["lyric"],
+                        self.output_path)
+                case _:
+                    raise ValueError(f"Can't render the {mode} mode from a recipe")
+
+        return self.output_path
+
     def check_song_id(self, song_id):
         """
         Check if the provided song ID is the same as the currently playing song.
@@ -165,12 +484,45 @@ class WallpaperGenerator:
         """
         return self.display
 
-    def get_colors(self, image_url):
+    def get_cover_id(self, image_url):
+        """
+        Get the ID of the artwork of an image, shared by all its URLs.
+
+        The image is only downloaded to be hashed the first time its URL is seen.
+
+        Parameters:
+            image_url (str): The URL of the image.
+
+        Returns:
+            str: The ID of the cover.
+        """
+        cover_id = self.cover_index.get(image_url)
+        if cover_id is None:
+            cover_id = self.cover_index.cover_id(image_url, self.cache_manager.get(image_url))
+        return cover_id
+
+    def get_colors(self, image_url, variants=None):
         """
         Extract the most common colors from an image.
 
         Uses the colorgram library to extract the most 
-        dominant colors from the image.
+        dominant colors from the image. The colors are computed once per cover,
+        on its smallest variant: a thumbnail is enough for the palette.
+
+        Parameters:
+            image_url (str): The URL of the image to process.
+            variants (list, optional): The sizes of the cover returned by Spotify.
+
+        Returns:
+            list: A list of the two most dominant colors in the image.
+        """
+        image_url = images.pick_image(variants, PALETTE_WIDTH, image_url)
+        return self.album_cache.get((self.get_cover_id(image_url), "palette"),
+                                    lambda: self.extract_colors(image_url))
+
+    def extract_colors(self, image_url):
+        """
+        Extract the two most dominant colors of an image, see `get_colors`.
 
         Parameters:
             image_url (str): The URL of the image to process.
@@ -178,9 +530,14 @@ class WallpaperGenerator:
         Returns:
             list: A list of the two most dominant colors in the image.
         """
-        image = Image.open(io.BytesIO(self.cache_manager.get(image_url)))
+        import colorgram
+
+        data = self.cache_manager.get(image_url)
+        checkpoint("palette")
+        image = images.decode_cover(data, (PALETTE_WIDTH, PALETTE_WIDTH))
 
-        colors = colorgram.extract(image, 6)
+        with tracer.span("palette"):
+            colors = colorgram.extract(image, 6)
 
         if len(colors) < 2:
             return [colors[0], colors[0]]
@@ -190,28 +547,183 @@ class WallpaperGenerator:
                 return [colors[0], colors[i]]
         return [colors[0], colors[1]]
 
-    def setup_album_image(self, display, image_url):
+    def setup_album_image(self, display, image_url, variants=None):
         """
         Create a resized album image for wallpaper.
 
         This method resizes the album cover to fit the display size and centers it.
-        Used in albumImage, controllerImage, and gradient modes.
+        Used in albumImage, controllerImage, and gradient modes. The resized cover is
+        shared by the tracks of the album, so it must not be modified. It is made from
+        the smallest variant of the cover that is at least as wide, so that smaller
+        displays download and decode smaller images.
 
         Parameters:
             display (list): The dimensions of the display.
             image_url (str): The URL of the album image.
+            variants (list, optional): The sizes of the cover returned by Spotify.
 
         Returns:
             Image: The resized album image to fit the display.
         """
         width = int(int(display[0]) / 5)
-        image = Image.open(io.BytesIO(self.cache_manager.get(image_url)))
+        image_url = self.album_image_url(display, image_url, variants)
+        # Keyed by URL: covers that only look alike must not share their image
+        return self.album_cache.get((image_url, "cover", width),
+                                    lambda: self.resize_album_image(image_url, width))
+
+    @staticmethod
+    def album_image_url(display, image_url, variants=None):
+        """
+        Get the variant of the cover used by `setup_album_image` on a display.
+
+        Parameters:
+            display (list): The dimensions of the display.
+            image_url (str): The URL of the album image.
+            variants (list, optional): The sizes of the cover returned by Spotify.
+
+        Returns:
+            str: The URL of the variant.
+        """
+        return images.pick_image(variants, int(int(display[0]) / 5), image_url)
+
+    def resize_album_image(self, image_url, width):
+        """
+        Resize the album cover to the given width, see `setup_album_image`.
+
+        Parameters:
+            image_url (str): The URL of the album image.
+            width (int): The width of the resized cover.
+
+        Returns:
+            Image: The resized album image.
+        """
+        image = images.decode_cover(self.cache_manager.get(image_url), (width, width))
 
         wpercent = width / float(image.size[0])
         hsize = int((float(image.size[1]) * float(wpercent)))
 
         return image.resize((width, hsize), Image.LANCZOS)
 
+    def generate_placeholder(self, song_details, palette=None):
+        """
+        Create a placeholder for the wallpaper of a song, to show while it is rendered.
+
+        The placeholder is a gradient between the two colors of the palette, which is
+        cached for the covers already seen, and otherwise extracted from the smallest
+        variant of the cover (the render needs it anyway). It takes a few milliseconds,
+        so the wallpaper of the previous song doesn't stay on screen for the whole render.
+
+        The state of the generator (current song, mode, image) is left untouched.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL).
+            palette (list, optional): The palette of a recipe, see `make_recipe`.
+                Defaults to the palette of the cover.
+
+        Returns:
+            str: The path of the placeholder, or None if placeholders are disabled.
+        """
+        if not self.placeholders:
+            return None
+
+        import colorgram
+        from WallpaperGenerator.gradient import create_placeholder_gradient
+
+        with tracer.span("placeholder"):
+            if palette:
+                colors = [colorgram.Color(*color) for color in palette]
+            else:
+                colors = self.get_colors(song_details['image_url'],
+                                         song_details.get('images'))
+
+            display = self.get_display()
+            size = (max(1, int(display[0]) // PLACEHOLDER_SCALE),
+                    max(1, int(display[1]) // PLACEHOLDER_SCALE))
+            image = create_placeholder_gradient(colors, size)
+
+            os.makedirs(os.path.dirname(PLACEHOLDER_PATH), exist_ok=True)
+            image.save(PLACEHOLDER_PATH, compress_level=1)
+
+        return PLACEHOLDER_PATH
+
+    def generate(self, mode, song_details, spotify_client=None):
+        """
+        Generate a wallpaper in the given mode.
+
+        Parameters:
+            mode (str): The wallpaper mode.
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL).
+            spotify_client (SpotifyClient, optional): The client used by the waveform mode.
+
+        Returns:
+            bool: False if the wallpaper could not be generated in this mode
+                (e.g. the lyrics are not available yet), True otherwise.
+
+        Raises:
+            RenderCancelled: If the render was cancelled (see `utils.cancellation`).
+                The song is then forgotten, so that it can be rendered again.
+        """
+        self.background_cached = False
+        with tracer.span("render", mode=mode) as span, \
+                self.profiler.profile(song_details['song_title'], mode):
+            try:
+                match mode:
+                    case "albumImage":
+                        self.generate_album_image(song_details)
+                    case "gradient":
+                        self.generate_gradient(song_details)
+                    case "blurred":
+                        self.generate_blurred(song_details)
+                    case "waveform":
+                        self.generate_waveform(spotify_client, song_details)
+                    case "controllerImage":
+                        self.generate_controller(song_details)
+                    case "lyric":
+                        if not self.generate_lyric(song_details):
+                            return False
+                    case "syncedLyric":
+                        if not self.generate_synced_lyric(song_details):
+                            return False
+                    case _:
+                        print(f"Unknown mode: {mode}")
+                        return False
+            except RenderCancelled:
+                self.set_current_song_id(None)
+                raise
+
+        if self.measured:
+            RENDER_TIME.labels(mode=mode).observe(span["duration"])
+            # A background from the album cache says nothing about the speed of the renders
+            if not self.background_cached:
+                self.quality.record(mode,
+                                    span["duration"] - tracer.time_in(span, UNSCALED_STAGES))
+        self.set_current_image_path(self.output_path)
+        return True
+
+    def cached_background(self, key, create):
+        """
+        Get a background from the album cache, remembering whether it was cached.
+
+        Parameters:
+            key (tuple): The key of the background, see `AlbumCache.get`.
+            create (callable): The function rendering the background.
+
+        Returns:
+            Image: The background, shared by the renders.
+        """
+        created = False
+
+        def render():
+            nonlocal created
+            created = True
+            return create()
+
+        background = self.album_cache.get(key, render)
+        self.background_cached = not created
+        return background
+
     def generate_album_image(self, song_details):
         """
         Generate an album image based on the provided song details.
@@ -227,29 +739,24 @@ class WallpaperGenerator:
         if self.check_song_id(song_details['song_id']):
             return
 
-        image_url = song_details['image_url']
-        self.set_current_album(image_url)
+        self.set_song_details(song_details)
 
-        song_title = song_details['song_title']
-        self.set_current_song(song_title)
-
-        song_id = song_details['song_id']
-        self.set_current_song_id(song_id)
-
-        artist_name = song_details['artist_name']
-        self.set_current_artist(artist_name)
-
-        colors = self.get_colors(self.get_current_album())
+        colors = self.get_colors(self.get_current_album(), self.current_images)
 
         image = self.setup_album_image(self.get_display(),
-                                       self.get_current_album())
+                                       self.get_current_album(),
+                                       self.current_images)
 
         text = images.generate_text_image(self.get_current_song(),
                                           self.get_current_artist(),
                                           colors,
                                           self.get_display())
 
-        cai(self.get_display(), image, text, colors)
+        checkpoint("compose")
+        from WallpaperGenerator.album_image import create_album_image as cai
+
+        cai(self.get_display(), image, text, colors, self.output_path)
+        self.current_recipe = self.make_recipe("albumImage", colors)
 
     def generate_gradient(self, song_details):
         """
@@ -265,35 +772,46 @@ class WallpaperGenerator:
         if self.check_song_id(song_details['song_id']):
             return
 
-        image_url = song_details['image_url']
-        self.set_current_album(image_url)
-
-        song_title = song_details['song_title']
-        self.set_current_song(song_title)
-
-        song_id = song_details['song_id']
-        self.set_current_song_id(song_id)
-
-        artist_name = song_details['artist_name']
-        self.set_current_artist(artist_name)
+        self.set_song_details(song_details)
 
-        colors = self.get_colors(self.get_current_album())
+        colors = self.get_colors(self.get_current_album(), self.current_images)
 
         image = self.setup_album_image(self.get_display(),
-                                       self.get_current_album())
+                                       self.get_current_album(),
+                                       self.current_images)
+
+        checkpoint("compose")
+        from WallpaperGenerator.gradient import generate_gradient_image as csi
+        from WallpaperGenerator.gradient import create_gradient_background
+
+        centered = random.choice([True, False])
+        quality = self.quality.level("gradient")
+        # Keyed on the variant of the cover drawn, so the largest one is not downloaded
+        image_url = self.album_image_url(self.get_display(), self.get_current_album(),
+                                         self.current_images)
+        background = self.cached_background(
+            (self.get_cover_id(image_url), "gradient", centered,
+             *self.get_display(), image.width, quality.name),
+            lambda: create_gradient_background(colors, self.get_display(), image.width, centered,
+                                               quality.ellipses))
 
         csi(colors,
             self.get_display(),
             image.width,
             self.get_current_song(),
             self.get_current_artist(),
-            image)
+            image,
+            self.output_path,
+            centered=centered,
+            background=background)
+        self.current_recipe = self.make_recipe("gradient", colors, centered=centered)
 
     def generate_blurred(self, song_details):
         """
         Generate a blurred wallpaper based on the provided song details.
 
         This method generates a blurred wallpaper using the album artwork.
+        The cover is shown at its own size, so the largest variant is always used.
 
         Parameters:
             song_details (dict): A dictionary containing details of the song
@@ -303,21 +821,27 @@ class WallpaperGenerator:
         if self.check_song_id(song_details['song_id']):
             return
 
-        image_url = song_details['image_url']
-        self.set_current_album(image_url)
+        self.set_song_details(song_details)
 
-        song_title = song_details['song_title']
-        self.set_current_song(song_title)
+        # The blurred background needs the cover at full resolution
+        cover_image = images.decode_cover(self.cache_manager.get(self.get_current_album()))
 
-        song_id = song_details['song_id']
-        self.set_current_song_id(song_id)
+        checkpoint("compose")
+        from WallpaperGenerator.blurred import create_blurred_image as cbi
+        from WallpaperGenerator.blurred import create_blurred_background
 
-        artist_name = song_details['artist_name']
-        self.set_current_artist(artist_name)
+        # The blurred wallpaper has no text, the whole image is shared by the album
+        quality = self.quality.level("blurred")
+        background = self.cached_background(
+            (self.get_cover_id(self.get_current_album()), "blurred", *self.get_display(),
+             quality.name),
+            lambda: create_blurred_background(cover_image, self.get_display(),
+                                              scale=quality.blur_scale,
+                                              resample=quality.resample))
 
-        cover_image = Image.open(io.BytesIO(self.cache_manager.get(self.get_current_album())))
-
-        cbi(cover_image, self.get_display())
+        cbi(cover_image, self.get_display(), output_path=self.output_path,
+            background=background)
+        self.current_recipe = self.make_recipe("blurred", None)
 
     def generate_waveform(self, spotify_client, song_details):
         """
@@ -333,29 +857,28 @@ class WallpaperGenerator:
         if self.check_song_id(song_details['song_id']):
             return
 
-        image_url = song_details['image_url']
-        self.set_current_album(image_url)
-
-        song_title = song_details['song_title']
-        self.set_current_song(song_title)
-
-        song_id = song_details['song_id']
-        self.set_current_song_id(song_id)
-
-        artist_name = song_details['artist_name']
-        self.set_current_artist(artist_name)
+        self.set_song_details(song_details)
 
         audio_analysis = spotify_client.get_audio_analysis(
             self.get_current_song_id())
 
-        colors = self.get_colors(self.get_current_album())
+        colors = self.get_colors(self.get_current_album(), self.current_images)
 
+        checkpoint("compose")
+        from WallpaperGenerator.waveform import create_waveform_image as cwi
+
+        quality = self.quality.level("waveform")
         cwi(audio_analysis,
             self.get_display(),
             self.get_current_song(),
             self.get_current_artist(),
-            colors)
+            colors,
+            self.output_path,
+            bars=quality.waveform_bars,
+            resample=quality.resample)
 
+        # The audio analysis is not kept, so waveforms can't be rendered again
+        self.current_recipe = None
         return
 
     def generate_controller(self, song_details):
@@ -371,67 +894,286 @@ class WallpaperGenerator:
         if self.check_song_id(song_details['song_id']):
             return
 
-        image_url = song_details['image_url']
-        self.set_current_album(image_url)
-
-        song_title = song_details['song_title']
-        self.set_current_song(song_title)
-
-        song_id = song_details['song_id']
-        self.set_current_song_id(song_id)
-
-        artist_name = song_details['artist_name']
-        self.set_current_artist(artist_name)
+        self.set_song_details(song_details)
 
         song_length = song_details['song_length']
-        colors = self.get_colors(self.get_current_album())
+        colors = self.get_colors(self.get_current_album(), self.current_images)
 
 
         album_image = self.setup_album_image(self.display,
-                                             self.get_current_album())
+                                             self.get_current_album(),
+                                             self.current_images)
 
 
-        cci(self.get_current_song(),
-            self.get_current_artist(),
-            colors,
-            self.get_display(),
-            song_length,
-            album_image)
+        checkpoint("compose")
+        from WallpaperGenerator.controller import ControllerLayer
+
+        layer = ControllerLayer(self.get_current_song(),
+                                self.get_current_artist(),
+                                colors,
+                                self.get_display(),
+                                song_length,
+                                album_image)
+        images.save_final_image(layer.render(), self.output_path)
+        self.controller_layer = (self.get_current_song_id(), tuple(self.get_display()), layer)
+        self.current_recipe = self.make_recipe("controllerImage", colors,
+                                               song_length=song_length)
 
         return
 
-    def generate_lyric(self, song_details):
+    def render_progress(self, song_details, progress_ms):
+        """
+        Draw the playback position on the controller wallpaper of a song.
+
+        Only the elapsed time and the bar are drawn again, on the controller rendered
+        last; if it was not rendered by this generator (e.g. it came from the render
+        cache), it is rebuilt once from the cached palette and cover.
+
+        The state of the generator (current song, mode, image) is left untouched.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL, length).
+            progress_ms (int): The position in the song, in milliseconds.
+
+        Returns:
+            str: The path of the frame.
+        """
+        from WallpaperGenerator.controller import ControllerLayer
+
+        display = self.get_display()
+        key = (song_details['song_id'], tuple(display))
+        if self.controller_layer is None or self.controller_layer[:2] != key:
+            colors = self.get_colors(song_details['image_url'], song_details.get('images'))
+            album_image = self.setup_album_image(display, song_details['image_url'],
+                                                 song_details.get('images'))
+            layer = ControllerLayer(song_details['song_title'], song_details['artist_name'],
+                                    colors, display, song_details['song_length'], album_image)
+            self.controller_layer = (*key, layer)
+
+        with tracer.span("progress"):
+            frame = self.controller_layer[2].render(progress_ms)
+            os.makedirs(os.path.dirname(PROGRESS_PATH), exist_ok=True)
+            frame.save(PROGRESS_PATH)
+
+        return PROGRESS_PATH
+
+    def generate_lyric(self, song_details, deadline=None):
         """
         Generate a lyric card wallpaper based on the provided song details.
 
         This method generates a lyric card wallpaper using the album artwork.
+        The lyrics are resolved in background: if they are not available within
+        the deadline, nothing is generated and the song is remembered, so that
+        `upgrade_lyric` can render the card once they arrive.
 
         Parameters:
             song_details (dict): A dictionary containing details of the song
                 (title, artist, image URL).
+            deadline (float, optional): Seconds to wait for the lyrics.
+                Defaults to the resolver deadline.
+
+        Returns:
+            bool: True if the lyric card was generated, False otherwise.
         """
         if self.check_song_id(song_details['song_id']):
-            return
-
-        image_url = song_details['image_url']
-        self.set_current_album(image_url)
+            return True
 
-        song_title = song_details['song_title']
-        self.set_current_song(song_title)
+        try:
+            with tracer.span("lyrics"):
+                lyric = self.lyric_resolver.resolve(song_details['song_id'],
+                                                    song_details['artist_name'],
+                                                    song_details['song_title'],
+                                                    deadline)
+        except TimeoutError:
+            self.pending_lyric = song_details['song_id']
+            return False
 
-        song_id = song_details['song_id']
-        self.set_current_song_id(song_id)
+        if not lyric:
+            return False
 
-        artist_name = song_details['artist_name']
-        self.set_current_artist(artist_name)
+        self.set_song_details(song_details)
 
-        colors = self.get_colors(self.get_current_album())
+        colors = self.get_colors(self.get_current_album(), self.current_images)
 
         cover_image = self.setup_album_image(self.get_display(),
-                                            self.get_current_album())
+                                            self.get_current_album(),
+                                            self.current_images)
+
+        checkpoint("compose")
+        from WallpaperGenerator.lyric_card import create_lyric_image as cli
 
         cli(self.get_display(),
             self.get_current_artist(),
             self.get_current_song(),
             colors,
-            cover_image)
+            cover_image,
+            lyric,
+            self.output_path,
+            resample=self.quality.level("lyric").resample)
+        self.current_recipe = self.make_recipe("lyric", colors, lyric=lyric)
+
+        return True
+
+    def load_synced_lyrics(self, song_details):
+        """
+        Load the time-synced lyrics of a song from the lyric library.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist).
+
+        Returns:
+            list: The synced lines (see `utils.lrc.parse_lrc`), or None if the song has none.
+        """
+        path = self.lyric_library.find(song_details['artist_name'],
+                                       song_details['song_title'], extensions=(".lrc",))
+        if path is None:
+            return None
+
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = parse_lrc(f.read())
+        return lines or None
+
+    def synced_lyric_card(self, song_details, lines=None):
+        """
+        Get the synced lyric card of a song, building it if it is not the last one built.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL).
+            lines (list, optional): The synced lines, loaded from the lyric library
+                if not given.
+
+        Returns:
+            SyncedLyricCard: The card, or None if the song has no synced lyrics.
+        """
+        from WallpaperGenerator.lyric_card import SyncedLyricCard
+
+        key = (song_details['song_id'], tuple(self.get_display()))
+        if self.synced_card is not None and self.synced_card[:2] == key:
+            return self.synced_card[2]
+
+        lines = lines or self.load_synced_lyrics(song_details)
+        if not lines:
+            return None
+
+        colors = self.get_colors(song_details['image_url'], song_details.get('images'))
+        cover_image = self.setup_album_image(self.get_display(), song_details['image_url'],
+                                             song_details.get('images'))
+        checkpoint("compose")
+        card = SyncedLyricCard(self.get_display(), song_details['artist_name'],
+                               song_details['song_title'], colors, cover_image, lines)
+        self.synced_card = (*key, card)
+        return card
+
+    def generate_synced_lyric(self, song_details):
+        """
+        Generate a lyric card showing the line sung at the playback position.
+
+        The lines come from the LRC file of the song in the lyric library; the card is
+        then kept, so that `render_synced_lyric` can follow the playback.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL, playback position).
+
+        Returns:
+            bool: True if the card was generated, False if the song has no synced lyrics.
+        """
+        if self.check_song_id(song_details['song_id']):
+            return True
+
+        lines = self.load_synced_lyrics(song_details)
+        if not lines:
+            return False
+
+        self.set_song_details(song_details)
+
+        card = self.synced_lyric_card(song_details, lines)
+        # A new card always draws its first frame
+        card.index = None
+        images.save_final_image(card.render(song_details.get('progress_ms') or 0),
+                                self.output_path)
+
+        # The card changes with the playback, so the recipe would not be the wallpaper
+        self.current_recipe = None
+        return True
+
+    def render_synced_lyric(self, song_details, progress_ms, redraw=False):
+        """
+        Show the line sung at a position on the synced lyric card of a song.
+
+        The state of the generator (current song, mode, image) is left untouched.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                (title, artist, image URL).
+            progress_ms (int): The position in the song, in milliseconds.
+            redraw (bool, optional): Save a frame even if the line didn't change, e.g.
+                when the wallpaper on screen came from the render cache. Defaults to False.
+
+        Returns:
+            tuple: The path of the new frame (None if the line didn't change, or the song
+                has no synced lyrics) and the time of the next line in milliseconds
+                (None after the last one).
+        """
+        card = self.synced_lyric_card(song_details)
+        if card is None:
+            return None, None
+
+        if redraw:
+            card.index = None
+
+        with tracer.span("synced_lyric"):
+            frame = card.render(progress_ms)
+            if frame is not None:
+                os.makedirs(os.path.dirname(SYNCED_LYRIC_PATH), exist_ok=True)
+                frame.save(SYNCED_LYRIC_PATH)
+
+        return (SYNCED_LYRIC_PATH if frame is not None else None,
+                card.next_change(progress_ms))
+
+    def upgrade_lyric(self, song_details):
+        """
+        Replace a fallback wallpaper with the lyric card, once the lyrics arrive.
+
+        Nothing happens unless the lyrics of the given song were still pending when
+        its wallpaper was generated. A pending lookup for a song that is no longer
+        playing is forgotten.
+
+        Parameters:
+            song_details (dict): A dictionary containing details of the song
+                currently playing.
+
+        Returns:
+            bool: True if the lyric card was generated, False otherwise.
+        """
+        if self.pending_lyric is None:
+            return False
+
+        if self.pending_lyric != song_details['song_id']:
+            self.pending_lyric = None
+            return False
+
+        if not self.lyric_resolver.is_ready(self.pending_lyric):
+            return False
+
+        self.pending_lyric = None
+
+        # The fallback wallpaper was generated for this song, force a new one
+        self.set_current_song_id(None)
+        if not self.generate_lyric(song_details, deadline=0):
+            self.set_current_song_id(song_details['song_id'])
+            return False
+
+        self.set_current_mode("lyric")
+        self.set_current_image_path(self.output_path)
+        return True
+
+    def close(self):
+        """Release the resources used by the generator; the shared ones are left open."""
+        with self.resources_lock:
+            for name in ("lyric_resolver", "lyric_library"):
+                if name in self.resources:
+                    self.resources.pop(name).close()
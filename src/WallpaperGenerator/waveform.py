@@ -6,7 +6,9 @@ Module for generating a waveform image based on the audio analysis data from the
 from PIL import Image, ImageDraw
 import utils.images
 
-def create_waveform_image(audio_analysis, display, artist_name, song_title, colors):
+#pylint: disable=too-many-arguments, too-many-positional-arguments
+def create_waveform_image(audio_analysis, display, artist_name, song_title, colors,
+                          output_path=None, bars=100, resample=Image.LANCZOS):
     """
     Create and save a waveform image based on the audio analysis data,
     overlaying the song title, artist name, and cover image.
@@ -19,12 +21,15 @@ def create_waveform_image(audio_analysis, display, artist_name, song_title, colo
         song_title (str): The title of the song.
         colors (list): List of two colors, 
             where the first is for the background and the second is for the waveform.
+        output_path (str, optional): Where to save the final image.
+        bars (int, optional): The number of bars of the waveform. Defaults to 100.
+        resample (int, optional): The resampling filter. Defaults to `Image.LANCZOS`.
 
     Returns:
         None: The function saves the generated image to the 'ImageCache/finalImage.png' file.
     """
     # Extract normalized loudness data from audio analysis
-    loudness = extract_loudness_data(audio_analysis, audio_analysis['track']['duration'])
+    loudness = extract_loudness_data(audio_analysis, audio_analysis['track']['duration'], bars)
 
     width, height = int(display[0]), int(display[1])
 
@@ -32,7 +37,7 @@ def create_waveform_image(audio_analysis, display, artist_name, song_title, colo
     loudness = [loud * 0.75 for loud in loudness]
 
     # Generate waveform image based on loudness data
-    waveform_image = generate_waveform_image(loudness, (width, height), colors)
+    waveform_image = generate_waveform_image(loudness, (width, height), colors, resample)
 
     # Generate text image with the song title and artist name
     text_image = utils.images.generate_text_image(
@@ -49,7 +54,7 @@ def create_waveform_image(audio_analysis, display, artist_name, song_title, colo
     final_image.paste(text_image, (0, 0), mask=text_image)
 
     # Save the final image
-    final_image.save('ImageCache/finalImage.png')
+    utils.images.save_final_image(final_image, output_path)
 
 
 def extract_loudness_data(audio_analysis, duration, sample_points=100):
@@ -83,14 +88,15 @@ def extract_loudness_data(audio_analysis, duration, sample_points=100):
     return [level / max_loudness for level in loudness_levels]
 
 
-def generate_waveform_image(levels, display_dimensions, colors):
+def generate_waveform_image(levels, display_dimensions, colors, resample=Image.LANCZOS):
     """
     Generate a waveform image based on the normalized loudness levels.
 
     Args:
-        levels (list): List of normalized loudness levels.
+        levels (list): List of normalized loudness levels, one per bar.
         display_dimensions (tuple): Dimensions of the display (width, height).
         colors (list): List containing two RGB color objects: background color and waveform color.
+        resample (int, optional): The resampling filter. Defaults to `Image.LANCZOS`.
 
     Returns:
         PIL.Image: The generated waveform image.
@@ -102,10 +108,13 @@ def generate_waveform_image(levels, display_dimensions, colors):
     image = Image.new('RGB', (width, height), colors[0].rgb)
 
     # Create waveform schema for the loudness levels (upper and lower halves)
-    schema = [(int(i / 100 * width),
+    count = len(levels)
+    schema = [(int(i / count * width),
                int((1/2 + level/2) * height)) for i, level in enumerate(levels)]
-    inverted_schema = [(int(i / 100 * width),
+    inverted_schema = [(int(i / count * width),
                         int((1/2 - level/2) * height)) for i, level in enumerate(levels)]
+    # The bars keep their share of the width whatever their number
+    bar_width = 16 * 100 // count
 
     # Normalize the schema to fit the screen's height
     schema = [(x, int(y * (base_height / height))) for x, y in schema]
@@ -119,16 +128,18 @@ def generate_waveform_image(levels, display_dimensions, colors):
 
         if abs(start_point[1] - inverted_schema[i][1]) < 32:
             draw.rounded_rectangle(
-                [inverted_schema[i][0], height / 2 - 16, start_point[0] + 16, height / 2 + 16],
+                [inverted_schema[i][0], height / 2 - 16, start_point[0] + bar_width,
+                 height / 2 + 16],
                 fill=colors[1].rgb, radius=8
             )
         else:
             draw.rounded_rectangle(
-                [inverted_schema[i][0], inverted_schema[i][1], start_point[0] + 16, start_point[1]],
+                [inverted_schema[i][0], inverted_schema[i][1], start_point[0] + bar_width,
+                 start_point[1]],
                 fill=colors[1].rgb, radius=8
             )
 
     # Resize the waveform image to 60% of its original size for better presentation
-    resized_image = image.resize((int(width * 0.6), int(height * 0.6)), Image.LANCZOS)
+    resized_image = image.resize((int(width * 0.6), int(height * 0.6)), resample)
 
     return resized_image
@@ -0,0 +1,114 @@
+"""
+Benchmark for the decoding of cover art.
+
+Compares a full decode followed by a resize with the draft (reduced scale) decode of
+`images.decode_cover`, for the sizes the renderers need: the palette thumbnail and the
+cover pasted on 1080p, 1440p and 4k displays (a fifth of the display width).
+
+Usage:
+    python src/benchmarks/cover_decode.py [--covers DIR] [--repeat N]
+
+The corpus is a directory of `.jpg` covers, e.g. downloaded from the Spotify URLs
+(640px). If no directory is given, synthetic 640px JPEG covers are used.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#pylint: disable=import-error, wrong-import-position
+from PIL import Image
+
+from renderers import synthetic_cover
+from utils.images import decode_cover
+
+TARGETS = {
+    "palette": 64,
+    "cover 1080p": 1920 // 5,
+    "cover 1440p": 2560 // 5,
+    "cover 4k": 3840 // 5,
+}
+
+
+def load_covers(directory):
+    """
+    Load the covers of the corpus.
+
+    Args:
+        directory (str): The directory containing the `.jpg` covers, or None.
+
+    Returns:
+        dict: The encoded covers, keyed by file name.
+    """
+    if not directory:
+        return {f"synthetic-{seed}": synthetic_cover(seed=seed) for seed in range(5)}
+
+    covers = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".jpg", ".jpeg")):
+            with open(os.path.join(directory, name), 'rb') as f:
+                covers[name] = f.read()
+    return covers
+
+
+def full_decode(data, width):
+    """Decode the cover at full resolution, then resize it."""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image.resize((width, width), Image.LANCZOS)
+
+
+def draft_decode(data, width):
+    """Decode the cover at the largest reduced scale, then resize it."""
+    return decode_cover(data, (width, width)).resize((width, width), Image.LANCZOS)
+
+
+def measure(function, data, width, repeat):
+    """
+    Measure the median time of a decode function.
+
+    Args:
+        function (callable): The decode function.
+        data (bytes): The encoded cover.
+        width (int): The target width.
+        repeat (int): How many times the timing should be repeated.
+
+    Returns:
+        float: The median time in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data, width)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--covers", help="directory with .jpg covers")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per cover")
+    args = parser.parse_args()
+
+    covers = load_covers(args.covers)
+    if not covers:
+        parser.error(f"no .jpg covers in {args.covers}")
+
+    print(f"{len(covers)} covers, median over {args.repeat} runs\n")
+    print(f"{'target':<16}{'full (ms)':>12}{'draft (ms)':>12}{'speedup':>10}")
+    for label, width in TARGETS.items():
+        full = statistics.mean(measure(full_decode, data, width, args.repeat)
+                               for data in covers.values())
+        draft = statistics.mean(measure(draft_decode, data, width, args.repeat)
+                                for data in covers.values())
+        print(f"{label:<16}{full:>12.2f}{draft:>12.2f}{full / draft:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark for the extraction of lyrics from Genius song pages.
+
+Compares the full BeautifulSoup parse used before with the streaming
+`LyricsContainerParser`, reporting parse time and peak memory for every fixture.
+
+Usage:
+    python src/benchmarks/lyric_extraction.py [--fixtures DIR] [--repeat N]
+
+Fixtures are Genius song pages saved as `.html` files. If no directory is given,
+a synthetic page with the same layout is used.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#pylint: disable=import-error, wrong-import-position
+from utils.lyric_finder import extract_lyrics, CHUNK_SIZE
+
+
+def synthetic_page():
+    """
+    Build a page that mimics the layout of a Genius song page.
+
+    Returns:
+        str: The HTML of the page.
+    """
+    head = "<html><head>" + "<script>var x = 1;</script>" * 12000 + "</head><body>"
+    verse = "<a href='/x'><span>Some line of the song</span></a><br/>" * 8
+    containers = "".join(
+        f'<div data-lyrics-container="true" class="Lyrics__Container-sc-1ynbvzw-1 kUgSbL">'
+        f'[{section}]<br/>{verse}</div>'
+        for section in ("Verse 1", "Chorus", "Verse 2", "Chorus", "Bridge", "Chorus")
+    )
+    footer = '<div class="LyricsFooter__Container-sc-x">Footer</div>'
+    tail = "<div class='RightSidebar'>" + "<p>comment</p>" * 30000 + "</div></body></html>"
+    return head + containers + footer + tail
+
+
+def load_fixtures(directory):
+    """
+    Load the saved HTML pages from a directory.
+
+    Args:
+        directory (str): The directory containing the `.html` fixtures.
+
+    Returns:
+        dict: The page content, keyed by file name.
+    """
+    if not directory:
+        return {"synthetic": synthetic_page()}
+
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def full_parse(html):
+    """Extract the lyrics by building the whole BeautifulSoup tree."""
+    #pylint: disable=import-outside-toplevel
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    lyrics_divs = soup.find_all("div", {"class": "Lyrics__Container-sc-1ynbvzw-1"})
+    return "\n".join(div.get_text(separator="\n").strip() for div in lyrics_divs)
+
+
+def streaming_parse(html):
+    """Extract the lyrics feeding the page in chunks, as `retrieve_lyric` does."""
+    return extract_lyrics(html[i:i + CHUNK_SIZE] for i in range(0, len(html), CHUNK_SIZE))
+
+
+def measure(function, html, repeat):
+    """
+    Measure the parse time and the peak memory of an extraction function.
+
+    Args:
+        function (callable): The extraction function.
+        html (str): The page to parse.
+        repeat (int): How many times the timing should be repeated.
+
+    Returns:
+        tuple: The median time in milliseconds and the peak memory in KiB.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(html)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    function(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), peak / 1024
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--fixtures", help="directory with saved Genius pages")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per fixture")
+    args = parser.parse_args()
+
+    extractors = {"streaming": streaming_parse}
+    try:
+        #pylint: disable=import-outside-toplevel, unused-import
+        import bs4  # noqa: F401
+        extractors["bs4"] = full_parse
+    except ImportError:
+        print("BeautifulSoup not installed, skipping the full parse baseline\n")
+
+    print(f"{'fixture':<30}{'parser':<12}{'time (ms)':>12}{'peak (KiB)':>14}")
+    for name, html in load_fixtures(args.fixtures).items():
+        for label, function in extractors.items():
+            elapsed, peak = measure(function, html, args.repeat)
+            print(f"{name:<30}{label:<12}{elapsed:>12.2f}{peak:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark for the local lyric library.
+
+Reports the time to index a library from scratch, to refresh it when nothing or a
+single file changed, and the time of exact, fuzzy and missing lookups.
+
+Usage:
+    python src/benchmarks/lyric_library.py [--library DIR] [--files N] [--repeat N]
+
+If no library is given, a synthetic one with N empty files (default 100000) is
+created in a temporary directory, with one folder of `Artist - Title.lrc` files per
+artist.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#pylint: disable=import-error, wrong-import-position
+from utils.lyric_library import LyricLibrary
+
+SONGS_PER_ARTIST = 50
+
+
+def synthetic_library(directory, files):
+    """
+    Create a library of empty lyric files.
+
+    Args:
+        directory (str): The folder of the library.
+        files (int): The number of files.
+
+    Returns:
+        list: The (artist, title) of every song.
+    """
+    songs = []
+    for index in range(files):
+        artist = f"Artist {index // SONGS_PER_ARTIST}"
+        title = f"Song number {index} (Remastered)"
+        folder = os.path.join(directory, artist)
+        os.makedirs(folder, exist_ok=True)
+        extension = ".lrc" if index % 2 else ".txt"
+        with open(os.path.join(folder, f"{artist} - {title}{extension}"), "w",
+                  encoding="utf-8"):
+            pass
+        songs.append((artist, title))
+    return songs
+
+
+def timed(function, *args):
+    """
+    Call a function and time it.
+
+    Returns:
+        tuple: The result and the time in milliseconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--library", help="directory with lyric files")
+    parser.add_argument("--files", type=int, default=100000, help="size of the synthetic library")
+    parser.add_argument("--repeat", type=int, default=200, help="timed lookups per kind")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.library or os.path.join(scratch, "lyrics")
+        songs = [] if args.library else synthetic_library(directory, args.files)
+        library = LyricLibrary(directory, os.path.join(scratch, "index.db"))
+
+        folders, elapsed = timed(library.refresh)
+        print(f"{'full index':<24}{elapsed:>12.1f} ms ({folders} folders)")
+        _, elapsed = timed(library.refresh)
+        print(f"{'refresh, no change':<24}{elapsed:>12.1f} ms")
+        if songs:
+            with open(os.path.join(directory, "Artist 0", "Artist 0 - New song.lrc"), "w",
+                      encoding="utf-8"):
+                pass
+        folders, elapsed = timed(library.refresh)
+        print(f"{'refresh, one new file':<24}{elapsed:>12.1f} ms ({folders} folders)")
+
+        if not songs:
+            library.close()
+            return
+
+        queries = {
+            "exact": lambda artist, title: (artist, title),
+            # Spotify titles often differ from the file names
+            "fuzzy": lambda artist, title: (artist.upper(), title.replace("number", "nmber")
+                                            .replace(" (Remastered)", " - 2011 Remaster")),
+            "missing": lambda artist, title: (artist, "Unknown"),
+        }
+        print(f"\n{'lookup':<24}{'median (ms)':>12}{'max (ms)':>12}{'found':>8}")
+        for label, query in queries.items():
+            timings, found = [], 0
+            for artist, title in random.sample(songs, min(args.repeat, len(songs))):
+                path, elapsed = timed(library.find, *query(artist, title))
+                timings.append(elapsed)
+                found += path is not None
+            print(f"{label:<24}{statistics.median(timings):>12.3f}{max(timings):>12.3f}"
+                  f"{found:>8}")
+
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
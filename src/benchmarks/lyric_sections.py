@@ -0,0 +1,165 @@
+"""
+Benchmark for the choice of the part of the lyrics shown on the lyric card.
+
+Compares the previous `find_most_relevant_part`, which compiled its patterns on every
+call and scanned the lyric once per strategy, with the single-pass `LyricSections`
+tokenizer, both on the first lookup of a lyric and once its sections are cached.
+
+Usage:
+    python src/benchmarks/lyric_sections.py [--corpus DIR] [--repeat N]
+
+The corpus is a directory of `.txt` lyrics, e.g. the local lyric library. If no
+directory is given, synthetic lyrics with the Genius section headers are used.
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#pylint: disable=import-error, wrong-import-position
+from utils.lyric_finder import LyricFinderClient, parse_sections
+
+
+def synthetic_corpus(count=200, seed=1):
+    """
+    Build lyrics with the layout of the Genius ones.
+
+    Args:
+        count (int, optional): The number of lyrics. Defaults to 200.
+        seed (int, optional): The seed of the random layouts. Defaults to 1.
+
+    Returns:
+        dict: The lyrics, keyed by name.
+    """
+    rng = random.Random(seed)
+    words = "love night baby heart fire dance rain time home light".split()
+    corpus = {}
+    for index in range(count):
+        sections = rng.choice([
+            ["Intro", "Verse 1", "Pre-Chorus", "Chorus", "Verse 2", "Chorus", "Bridge", "Chorus"],
+            ["Verse 1", "Verse 2", "Bridge", "Outro"],
+            ["Verse 1", "Verse 2"],
+            [],
+        ])
+        chorus = [" ".join(rng.choices(words, k=6)) for _ in range(4)]
+        parts = []
+        for section in sections or [None] * 4:
+            lines = chorus if section == "Chorus" else [
+                " ".join(rng.choices(words, k=7)) + rng.choice(["", ",", "!"])
+                for _ in range(rng.randint(4, 10))]
+            header = f"[{section}: Artist {index}]\n" if section else ""
+            parts.append(header + "\n".join(lines))
+        corpus[f"synthetic {index}"] = "\n\n".join(parts)
+    return corpus
+
+
+def load_corpus(directory):
+    """
+    Load the lyrics of a directory.
+
+    Args:
+        directory (str): The directory containing the `.txt` lyrics.
+
+    Returns:
+        dict: The lyrics, keyed by file name.
+    """
+    if not directory:
+        return synthetic_corpus()
+
+    corpus = {}
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.lower().endswith(".txt"):
+                with open(os.path.join(root, name), 'r', encoding='utf-8',
+                          errors='replace') as f:
+                    corpus[name] = f.read()
+    return corpus
+
+
+def previous_most_relevant_part(client, lyric):
+    """The previous `find_most_relevant_part`, one regex scan per strategy."""
+    chorus_pattern = re.compile(r'\[Chorus[^\]]*?\](.*?)(?=\[|\n\n|$)',
+                                re.IGNORECASE | re.DOTALL)
+    match = chorus_pattern.search(lyric)
+    if match:
+        return client.reduce_if_double(match.group(1).strip())
+
+    for kind in ("Bridge", "Verse"):
+        pattern = re.compile(rf'\[{kind}.*?\](.*?)(?:\[(?!{kind}).*?\]|\n\n|$)',
+                             re.IGNORECASE | re.DOTALL)
+        match = pattern.search(lyric)
+        if match:
+            return client.reduce_if_double(match.group(1).strip())
+
+    clean_lyric = re.sub(r'[^\w\s]', '', lyric).lower()
+    phrase_counts = {}
+    for phrase in clean_lyric.split('\n'):
+        phrase_counts[phrase] = phrase_counts.get(phrase, 0) + 1
+    sorted_phrases = sorted(phrase_counts, key=phrase_counts.get, reverse=True)
+    if len(sorted_phrases) >= 2:
+        return client.reduce_if_double(sorted_phrases[0] + '\n' + sorted_phrases[1])
+    return None
+
+
+def measure(function, corpus, repeat):
+    """
+    Measure the time an extraction takes on every lyric of the corpus.
+
+    Args:
+        function (callable): The extraction, called with a lyric.
+        corpus (dict): The lyrics.
+        repeat (int): How many times every lyric is timed.
+
+    Returns:
+        tuple: The median and the mean time per lyric in microseconds, and the results.
+    """
+    timings = []
+    results = {}
+    for name, lyric in corpus.items():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[name] = function(lyric)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings), statistics.mean(timings), results
+
+
+def main():
+    """Run the benchmark and print a report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--corpus", help="directory with .txt lyrics")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per lyric")
+    args = parser.parse_args()
+
+    client = LyricFinderClient()
+    corpus = load_corpus(args.corpus)
+
+    def first_lookup(lyric):
+        parse_sections.cache_clear()
+        return client.find_most_relevant_part(lyric)
+
+    extractors = {
+        "previous": lambda lyric: previous_most_relevant_part(client, lyric),
+        "sections": first_lookup,
+        "sections, cached": client.find_most_relevant_part,
+    }
+
+    print(f"{len(corpus)} lyrics\n")
+    print(f"{'extraction':<20}{'median (us)':>14}{'mean (us)':>12}{'same part':>12}")
+    baseline = None
+    for label, function in extractors.items():
+        median, mean, results = measure(function, corpus, args.repeat)
+        baseline = baseline or results
+        same = sum(results[name] == baseline[name] for name in corpus)
+        print(f"{label:<20}{median:>14.1f}{mean:>12.1f}{same:>12}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Benchmark suite for the wallpaper renderers.
+
+Drives every mode on a synthetic 640px cover (the size served by Spotify) at several
+display resolutions, and reports wall time, peak memory and a per-stage breakdown
+(palette, cover, text, render, encode) as JSON. Every case runs in a fresh process,
+so that the peak RSS of one case doesn't hide the others.
+
+Usage:
+    python src/benchmarks/renderers.py [--modes gradient,blurred] [--resolutions 1080p,4k]
+                                       [--repeat N] [--output results.json]
+                                       [--baseline baseline.json] [--threshold 0.1]
+
+With `--baseline`, every case slower than the baseline by more than `--threshold`
+is flagged as a regression and the script exits with status 1.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_PATH)
+
+#pylint: disable=import-error, wrong-import-position, no-member
+import PIL
+from PIL import Image, ImageDraw
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+    "8k": (7680, 4320),
+}
+
+MODES = ["albumImage", "gradient", "centeredGradient", "blurred",
+         "controllerImage", "lyric", "waveform"]
+
+STUB_SONG = {
+    "song_title": "Benchmark Song",
+    "artist_name": "The Synthetic Band",
+    "image_url": "synthetic://cover",
+    "song_id": "benchmark",
+    "song_length": 215000,
+}
+
+STUB_LYRIC = "\n".join(["I KEEP ON RENDERING THE SAME OLD LINE",
+                        "AND EVERY FRAME IS JUST A LITTLE LATE",
+                        "I KEEP ON RENDERING THE SAME OLD LINE",
+                        "WAITING FOR THE WALLPAPER TO CHANGE"])
+
+
+def synthetic_cover(size=640, seed=42):
+    """
+    Create a cover with gradients, shapes and noise, encoded as JPEG like the real ones.
+
+    Args:
+        size (int, optional): The side of the cover in pixels. Defaults to 640.
+        seed (int, optional): The seed of the shapes. Defaults to 42.
+
+    Returns:
+        bytes: The JPEG data of the cover.
+    """
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L").resize((size, size))
+    cover = Image.merge("RGB", (gradient,
+                                gradient.rotate(90),
+                                Image.radial_gradient("L").resize((size, size))))
+
+    draw = ImageDraw.Draw(cover)
+    for _ in range(40):
+        x, y = rng.randrange(size), rng.randrange(size)
+        radius = rng.randrange(10, size // 4)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=color)
+
+    noise = Image.effect_noise((size, size), 40).convert("RGB")
+    cover = Image.blend(cover, noise, 0.15)
+
+    buffer = io.BytesIO()
+    cover.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def synthetic_audio_analysis(duration=215.0, segments=900, seed=42):
+    """
+    Create an audio analysis with the fields used by the waveform mode.
+
+    Args:
+        duration (float, optional): The duration of the song in seconds.
+        segments (int, optional): The number of segments.
+        seed (int, optional): The seed of the loudness values.
+
+    Returns:
+        dict: The audio analysis.
+    """
+    rng = random.Random(seed)
+    length = duration / segments
+    return {
+        "track": {"duration": duration},
+        "segments": [{"start": i * length,
+                      "duration": length,
+                      "loudness_max": rng.uniform(-30, 0)} for i in range(segments)],
+    }
+
+
+class Stages:
+    """
+    Accumulates the time spent in each stage of a render.
+
+    The time spent saving images is always accounted to the `encode` stage,
+    even when the save happens inside the renderer.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self._original_save = Image.Image.save
+
+    def add(self, name, elapsed):
+        """Add `elapsed` seconds to a stage."""
+        self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def run(self, name, function, *args, **kwargs):
+        """Run a function, accounting its time to a stage (minus the encode time)."""
+        encode_before = self.timings.get("encode", 0)
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.add(name, elapsed - (self.timings.get("encode", 0) - encode_before))
+        return result
+
+    def __enter__(self):
+        stages = self
+        original_save = self._original_save
+
+        def timed_save(image, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_save(image, *args, **kwargs)
+            finally:
+                stages.add("encode", time.perf_counter() - start)
+
+        Image.Image.save = timed_save
+        return self
+
+    def __exit__(self, *exc_info):
+        Image.Image.save = self._original_save
+
+
+def decode_cover(data):
+    """Fully decode a cover from its encoded data."""
+    cover = Image.open(io.BytesIO(data))
+    cover.load()
+    return cover
+
+
+def current_rss():
+    """Get the current resident set size of the process, in bytes."""
+    with open("/proc/self/statm", 'r', encoding='utf-8') as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def render_once(mode, display, generator, output_path):
+    """
+    Render a mode once, going through the same steps as `WallpaperGenerator`.
+
+    Args:
+        mode (str): The mode to render.
+        display (list): The dimensions of the display.
+        generator (WallpaperGenerator): A generator whose cache holds the synthetic cover.
+        output_path (str): Where the renderer saves the image.
+
+    Returns:
+        dict: The time spent in each stage, in milliseconds.
+    """
+    #pylint: disable=import-outside-toplevel, too-many-locals
+    from utils import images
+
+    url = STUB_SONG["image_url"]
+    title, artist = STUB_SONG["song_title"], STUB_SONG["artist_name"]
+
+    with Stages() as stages:
+        if mode != "blurred":
+            colors = stages.run("palette", generator.get_colors, url)
+
+        if mode in ("albumImage", "gradient", "centeredGradient", "controllerImage", "lyric"):
+            cover = stages.run("cover", generator.setup_album_image, display, url)
+
+        match mode:
+            case "albumImage":
+                from WallpaperGenerator import album_image
+                text = stages.run("text", images.generate_text_image,
+                                  title, artist, colors, display)
+                stages.run("render", album_image.create_album_image,
+                           display, cover, text, colors, output_path)
+            case "gradient" | "centeredGradient":
+                from WallpaperGenerator import gradient
+                stages.run("render", gradient.generate_gradient_image,
+                           colors, display, cover.width, title, artist, cover,
+                           output_path, centered=mode == "centeredGradient")
+            case "blurred":
+                from WallpaperGenerator import blurred
+                cover = stages.run("cover", decode_cover, generator.cache_manager.get(url))
+                stages.run("render", blurred.create_blurred_image,
+                           cover, display, output_path=output_path)
+            case "controllerImage":
+                from WallpaperGenerator import controller
+                stages.run("render", controller.create_controller_image,
+                           title, artist, colors, display, STUB_SONG["song_length"],
+                           cover, output_path)
+            case "lyric":
+                from WallpaperGenerator import lyric_card
+                stages.run("render", lyric_card.create_lyric_image,
+                           display, artist, title, colors, cover, STUB_LYRIC, output_path)
+            case "waveform":
+                from WallpaperGenerator import waveform
+                stages.run("render", waveform.create_waveform_image,
+                           synthetic_audio_analysis(), display, artist, title, colors,
+                           output_path)
+
+    return {name: elapsed * 1000 for name, elapsed in stages.timings.items()}
+
+
+def run_case(mode, resolution, repeat):
+    """
+    Benchmark a mode at a resolution. Runs in its own process.
+
+    Args:
+        mode (str): The mode to render.
+        resolution (str): The name of the resolution.
+        repeat (int): How many renders are timed.
+
+    Returns:
+        dict: Median wall time, median time per stage and peak memory.
+    """
+    #pylint: disable=import-outside-toplevel
+    from WallpaperGenerator.wallpaper_generator import WallpaperGenerator
+
+    # Fonts and icons are looked up relative to the main directory
+    os.chdir(os.path.dirname(SRC_PATH))
+
+    width, height = RESOLUTIONS[resolution]
+    display = [str(width), str(height)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, "finalImage.png")
+        generator = WallpaperGenerator(display=display, output_path=output_path)
+        generator.cache_manager.cache[STUB_SONG["image_url"]] = synthetic_cover()
+
+        start_rss = current_rss()
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stages = render_once(mode, display, generator, output_path)
+            runs.append(((time.perf_counter() - start) * 1000, stages))
+        generator.close()
+
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return {
+        "wall_ms": statistics.median(wall for wall, _ in runs),
+        "stages_ms": {name: statistics.median(stages.get(name, 0) for _, stages in runs)
+                      for name in runs[0][1]},
+        "peak_rss_mb": peak_rss / 2**20,
+        "peak_rss_delta_mb": (peak_rss - start_rss) / 2**20,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare the results with a baseline.
+
+    Args:
+        results (dict): The results of this run.
+        baseline (dict): The results of the baseline run.
+        threshold (float): The relative slowdown tolerated, e.g. 0.1 for 10%.
+
+    Returns:
+        list: The names of the cases slower than the baseline beyond the threshold.
+    """
+    regressions = []
+    for case, result in results.items():
+        reference = baseline.get(case)
+        if not reference:
+            continue
+
+        ratio = result["wall_ms"] / reference["wall_ms"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{case:<28}{reference['wall_ms']:>12.1f}{result['wall_ms']:>12.1f}"
+              f"{(ratio - 1) * 100:>+10.1f}%  {status}")
+        if status != "ok":
+            regressions.append(case)
+
+    return regressions
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help="comma-separated modes to benchmark")
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS),
+                        help="comma-separated resolutions (1080p, 1440p, 4k, 8k)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed renders per case")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown flagged as regression (default: 0.1)")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    resolutions = args.resolutions.lower().split(",")
+
+    results = {}
+    print(f"{'case':<28}{'wall (ms)':>12}{'peak (MiB)':>12}  stages (ms)")
+    for resolution in resolutions:
+        for mode in modes:
+            case = f"{mode}/{resolution}"
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                try:
+                    result = executor.submit(run_case, mode, resolution, args.repeat).result()
+                except (OSError, ImportError) as e:
+                    print(f"{case:<28}skipped: {e}")
+                    continue
+
+            results[case] = result
+            stages = ", ".join(f"{name} {elapsed:.1f}"
+                               for name, elapsed in result["stages_ms"].items())
+            print(f"{case:<28}{result['wall_ms']:>12.1f}{result['peak_rss_mb']:>12.1f}  {stages}")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+
+        print(f"\n{'case':<28}{'baseline':>12}{'current':>12}{'change':>11}")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,177 +2,582 @@
 The main module that initializes the application components and starts the necessary threads.
 
 This module sets up the configuration, initializes the Spotify client and the wallpaper
-generator, and starts two separate threads: one for monitoring the music and changing
-the wallpaper, and another for handling user input via the CLI.
-It waits for the CLI thread to finish and then stops the wallpaper thread.
+generator, and starts three separate threads: one for monitoring the music, one for
+changing the wallpaper, and another for handling user input via the CLI. They
+communicate through an event bus (see `utils.events`).
+It waits for the CLI thread to finish and then stops the other threads.
 
+Run with `--startup-profile` to print how long the imports and the initialization
+of every component took.
 """
 
+import time
+IMPORT_START = time.perf_counter()
 
+#pylint: disable=wrong-import-position
 import threading
-import time
 import random
 import sys
 
 from utils.spotify import SpotifyClient
+from utils.backends import create_backend
+from utils.cancellation import checkpoint
 from utils.command_line_interface import CommandLineInterface as CLI
 from utils.config import ConfigManager
+from utils.events import (EventBus, ModesChanged, PlaybackPaused, ProgressChanged, RenderDone,
+                          SaveRequested, TrackChanged)
 from utils.handler import Handler
+from utils.idle_prerender import IdlePrerenderer
+from utils.metrics import TIME_TO_PLACEHOLDER, TIME_TO_WALLPAPER, start_metrics_server
+from utils.play_history import PlayHistory
+from utils.render_cache import RenderCache
+from utils.render_worker import RenderWorker
+from utils.tracing import tracer
 from WallpaperGenerator.wallpaper_generator import WallpaperGenerator
+IMPORT_END = time.perf_counter()
+
+
+class StartupProfile:
+    """
+    Records how long every step of the startup took.
+
+    Attributes:
+        steps (list): The steps, as (name, seconds) tuples.
+    """
+
+    def __init__(self):
+        self.steps = [("imports", IMPORT_END - IMPORT_START)]
+        self.last = time.perf_counter()
+
+    def step(self, name):
+        """
+        Record the time elapsed since the previous step.
+
+        Parameters:
+            name (str): The name of the step that just finished.
+        """
+        now = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        """Print the duration of every step and the total."""
+        print("Startup profile:")
+        for name, elapsed in self.steps:
+            print(f"  {name:<22}{elapsed * 1000:>9.1f} ms")
+        total = sum(elapsed for _, elapsed in self.steps)
+        print(f"  {'total':<22}{total * 1000:>9.1f} ms")
+
 
 def main():
     """
     The main function that initializes the application components and starts the necessary threads.
     
     This function sets up the configuration, initializes the Spotify client and the wallpaper 
-    generator, and starts two separate threads: one for monitoring the music and changing 
-    the wallpaper, and another for handling user input via the CLI. 
-    It waits for the CLI thread to finish and then stops the wallpaper thread.
+    generator, and starts three separate threads: one for monitoring the music, one for
+    changing the wallpaper, and another for handling user input via the CLI. 
+    It waits for the CLI thread to finish and then stops the other threads.
     """
+    startup = StartupProfile()
+
     # Initialize configuration
     config_manager = ConfigManager('creds.txt')
+    startup.step("config")
     # Initialize Spotify client
     spotify_client = SpotifyClient(
         client_id=config_manager.get('client_id'),
         client_secret=config_manager.get('client_secret'),
         username=config_manager.get('spot_username'),
     )
-
-    # Initialize wallpaper generator
-    wallpaper_generator = WallpaperGenerator()
-
-    handler = Handler()
+    startup.step("spotify client")
+
+    # Initialize wallpaper generator, on the display of creds.txt if set (e.g. headless)
+    display = config_manager.get('display')
+    # How long a render should take, in milliseconds; slower modes lower their quality
+    render_budget = float(config_manager.get('render_budget', 0)) / 1000
+    wallpaper_generator = WallpaperGenerator(
+        lyric_deadline=float(config_manager.get('lyric_deadline', 3)),
+        display=display.lower().split("x") if display else None,
+        placeholders=config_manager.get('placeholder', 'true').lower() != 'false',
+        lyrics_dir=config_manager.get('lyrics_dir', 'lyrics'),
+        render_budget=render_budget or None,
+    )
+    startup.step("wallpaper generator")
+
+    handler = Handler(create_backend(config_manager.get('wallpaper_backend', 'auto'),
+                                     command=config_manager.get('wallpaper_command'),
+                                     sink=config_manager.get('wallpaper_sink')))
+    startup.step("handler")
+
+    history = PlayHistory()
+    # The size of the render cache in MB; the least played songs are evicted first
+    render_cache = RenderCache(
+        max_bytes=float(config_manager.get('render_cache_size', 1024)) * 1024 * 1024 or None,
+        history=history)
+    # The most played tracks are rendered in background while idle, 0 to disable.
+    # Nothing waits for these renders: their lyrics get the whole Genius timeout
+    prerenderer = IdlePrerenderer(
+        WallpaperGenerator(lyric_deadline=10, display=wallpaper_generator.get_display(),
+                           output_path="ImageCache/prerender/idle.png",
+                           placeholders=False, shared=wallpaper_generator, measured=False),
+        render_cache, history, count=int(config_manager.get('prerender_count', 20)))
+    # How long a track must play before its wallpaper is rendered, in milliseconds
+    debounce = float(config_manager.get('render_debounce', 0)) / 1000
+    # Seconds between two frames of the live progress of the controller mode, 0 to disable
+    progress_interval = float(config_manager.get('controller_progress', 0))
+
+    # Optional metrics endpoint, on localhost only
+    if config_manager.get('metrics_port'):
+        start_metrics_server(int(config_manager.get('metrics_port')))
+    startup.step("render cache, history, metrics")
+
+    if "--startup-profile" in sys.argv:
+        startup.report()
 
     # Flag for thread communication
     stop_event = threading.Event()  # Signal for the thread to stop
+    bus = EventBus()
     modes = ["gradient",
              "blurred",
              #"waveform", THANKS SPOTIFY FOR SHUTTING DOWN THE AUDIO ANALYSIS ENDPOINT
              "albumImage",
              "controllerImage",
              "lyric"]
-    # Thread for monitoring music and generating wallpaper
+    # Subscribe before any thread starts, so that no event is missed
+    events = bus.subscribe(TrackChanged, ProgressChanged, PlaybackPaused, ModesChanged,
+                           RenderDone, SaveRequested)
+
+    # Thread for monitoring music
+    poll_thread = threading.Thread(
+        target=poll_playback,
+        args=(spotify_client, bus, stop_event)
+    )
+
+    # Thread for generating the wallpapers
     wallpaper_thread = threading.Thread(
-        target=change_wallpaper_periodically,
-        args=(spotify_client, wallpaper_generator, stop_event, modes, handler)
+        target=change_wallpaper_on_events,
+        args=(spotify_client, wallpaper_generator, stop_event, modes, handler, render_cache,
+              bus, events, debounce, progress_interval, history, prerenderer)
     )
 
     # Thread for the CLI
     cli_thread = threading.Thread(
         target=start_cli,
-        args=(spotify_client, wallpaper_generator, stop_event, modes)
+        args=(spotify_client, wallpaper_generator, stop_event, modes, bus)
     )
 
-    # Start both threads
+    # Start the threads
+    poll_thread.start()
     wallpaper_thread.start()
     cli_thread.start()
 
     # Wait for the CLI thread to finish
     cli_thread.join()
 
-    # Once the CLI is done, signal the wallpaper thread to stop
+    # Once the CLI is done, signal the other threads to stop
     stop_event.set()
+    poll_thread.join()
     wallpaper_thread.join()
 
     handler.restore_wallpaper()
+    handler.close()
+    prerenderer.close()
+    wallpaper_generator.close()
+    history.close()
 
     print("Program terminated")
 
 
-def change_wallpaper_periodically(spotify_client, wallpaper_generator, stop_event, modes, handler):
+def poll_playback(spotify_client, bus, stop_event, interval=1):
     """
-    Periodically change the wallpaper based on the currently playing song on Spotify.
-    
-    This function runs in a separate thread. It continuously checks the current song playing on
-    Spotify, generates a new wallpaper based on a random mode (gradient, blurred, etc.),
-    and updates the desktop wallpaper.
-    
+    Periodically check the song playing on Spotify, and publish its changes.
+
+    This function runs in a separate thread. It publishes `TrackChanged` when a song
+    starts playing (a new track, or the same one after a pause), `ProgressChanged` when
+    the position in the song jumps, and `PlaybackPaused` when the playback stops.
+
     Parameters:
     - spotify_client (SpotifyClient): The client used to fetch the currently playing song.
-    - wallpaper_generator (WallpaperGenerator): The generator used to create new wallpapers.
+    - bus (EventBus): The bus where the changes are published.
     - stop_event (threading.Event): A signal to stop the thread when set.
-    - modes (list): A list of available modes for generating wallpapers.
-    - handler (Handler): The handler used for managing wallpapers and tracking song changes.
+    - interval (float, optional): The time between two polls, in seconds.
     """
-    old_modes = modes.copy()
+    song_id, playing = None, False
+    anchor = None  # The last position reported, as (progress_ms, time.perf_counter())
     while not stop_event.is_set():
         try:
-            song_details = spotify_client.get_current_song()
-            handler.load_favorites()
+            with tracer.span("poll") as poll_span:
+                song_details = spotify_client.get_current_song()
+        except IOError as e:
+            print(f"Error polling Spotify: {e}")
+            sys.exit(1)
 
-            if not song_details or song_details["playing"] is False:
-                handler.restore_wallpaper()
-                handler.change_status(False)
-                time.sleep(1)
-                continue
+        if not song_details or song_details["playing"] is False:
+            if playing:
+                bus.publish(PlaybackPaused())
+            playing = False
+        elif not playing or song_details["song_id"] != song_id:
+            song_id, playing = song_details["song_id"], True
+            change = TrackChanged(song_details, poll_span)
+            anchor = (song_details.get("progress_ms") or 0, change.detected_at)
+            bus.publish(change)
+        elif song_details.get("progress_ms") is not None:
+            # A position more than 2 seconds away from the expected one is a seek
+            now = time.perf_counter()
+            expected = anchor[0] + (now - anchor[1]) * 1000
+            if abs(song_details["progress_ms"] - expected) > 2000:
+                anchor = (song_details["progress_ms"], now)
+                bus.publish(ProgressChanged(song_id, song_details["progress_ms"], now))
+
+        # Wait time before checking the song again
+        stop_event.wait(interval)
+
+
+#pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals, too-many-branches
+def change_wallpaper_on_events(spotify_client, wallpaper_generator, stop_event, modes, handler,
+                               render_cache, bus, events, debounce=0, progress_interval=0,
+                               history=None, prerenderer=None):
+    """
+    Change the wallpaper as soon as the playback, the modes or the favorites change.
+
+    This function runs in a separate thread, and reacts to the events published by the
+    poller (`TrackChanged`, `PlaybackPaused`), the CLI (`ModesChanged`, `SaveRequested`)
+    and the render worker (`RenderDone`). It owns the enabled modes and the state of the
+    wallpaper on screen, so no other thread modifies them.
+
+    The wallpapers are rendered by a `RenderWorker`, so events are handled during a render:
+    when a newer track starts, or the playback stops, the render of the previous one is
+    cancelled at its next stage. Between events, it checks once a second whether the
+    lyrics of a late lyric card arrived. Live wallpapers are drawn again while on screen:
+    the playback position of the controller every `progress_interval` seconds, and the
+    line of the synced lyric card each time it changes.
 
-            if song_details["playing"] is False:
-                time.sleep(1)
-                continue
+    Every track shown is recorded once in the play history, and while the wallpaper is
+    idle (paused, or the wallpaper of the song playing is on screen), the most played
+    tracks are rendered in background, until the playback changes.
 
-            if handler.is_paused() is False and song_details["playing"]:
+    Parameters:
+    - spotify_client (SpotifyClient): The client used by the waveform mode.
+    - wallpaper_generator (WallpaperGenerator): The generator used to create new wallpapers.
+    - stop_event (threading.Event): A signal to stop the thread when set.
+    - modes (list): The modes enabled when the program starts.
+    - handler (Handler): The handler used for managing wallpapers and tracking song changes.
+    - render_cache (RenderCache): The cache of the wallpapers already rendered.
+    - bus (EventBus): The bus where the render worker publishes the wallpapers shown.
+    - events (Subscription): The events to react to.
+    - debounce (float, optional): How long a track must play before its wallpaper
+      is rendered, in seconds.
+    - progress_interval (float, optional): The time between two frames of the live
+      progress of the controller mode, in seconds; 0 disables it.
+    - history (PlayHistory, optional): Where the tracks played are recorded.
+    - prerenderer (IdlePrerenderer, optional): Renders the most played tracks while idle.
+    """
+    modes = tuple(modes)
+    worker = RenderWorker(render_change, debounce)
+    playing = None  # The TrackChanged of the song playing, None when paused
+    shown = None    # The RenderDone of the wallpaper on screen
+    anchor = None   # The last known position, as (progress_ms, time.perf_counter())
+    next_frame = 0  # When to draw the next frame of the live wallpaper
+    redraw = True   # Whether the next frame must be drawn even if unchanged
+    recorded = None  # The TrackChanged last recorded in the history
+
+    def is_live():
+        return (playing and shown and shown.song_id == playing.song_details["song_id"]
+                and (shown.mode == "syncedLyric"
+                     or (progress_interval and shown.mode == "controllerImage")))
+
+    def render(change):
+        if prerenderer:
+            prerenderer.cancel()
+        handler.change_song(change.song_details["song_id"])
+        worker.submit(change.song_details["song_id"], change.song_details, modes,
+                      spotify_client, wallpaper_generator, handler, render_cache, bus,
+                      change.poll_span, change.detected_at)
+
+    while not stop_event.is_set():
+        timeout = 1
+        if is_live():
+            timeout = min(1, max(0.01, next_frame - time.perf_counter()))
+        event = events.get(timeout=timeout)
+        match event:
+            case TrackChanged(song_details=song_details):
+                handler.favorites.refresh()
                 handler.change_status(True)
-                if handler.same_song(song_details["song_id"]):
-                    handler.change_song(song_details["song_id"])
+                playing = event
+                anchor = (song_details.get("progress_ms") or 0, event.detected_at)
+                # After a pause, the wallpaper of the song is shown again if it was ready
+                if (shown and shown.song_id == song_details["song_id"]
+                        and handler.same_song(shown.song_id) and not worker.is_busy()):
+                    handler.set_wallpaper(shown.path)
+                    next_frame, redraw = 0, True
+                else:
+                    render(event)
+
+            case ProgressChanged():
+                if playing and playing.song_details["song_id"] == event.song_id:
+                    anchor = (event.progress_ms, event.detected_at)
+                    next_frame = 0
+
+            case PlaybackPaused():
+                if prerenderer:
+                    prerenderer.cancel()
+                # Render the song again when the playback resumes, if it was not done
+                if worker.cancel():
+                    handler.change_song(None)
+                handler.restore_wallpaper()
+                handler.change_status(False)
+                playing = None
+
+            case ModesChanged():
+                modes = event.modes
+                if playing:
+                    render(TrackChanged(playing.song_details))
+
+            case RenderDone():
+                shown = event
+                next_frame, redraw = 0, True
+                # Once per play: not again for new modes or after a pause
+                if (history and playing and playing is not recorded
+                        and playing.song_details["song_id"] == event.song_id):
+                    recorded = playing
+                    history.record(playing.song_details, event.mode, event.render_time)
+
+            case SaveRequested():
+                try:
+                    event.reply.set_result(save_favorite(shown, handler.favorites))
+                except OSError as e:
+                    event.reply.set_exception(e)
+
+            # Once the lyrics of a late lyric card arrive, replace the fallback wallpaper
+            case None:
+                if (playing and not worker.is_busy()
+                        and wallpaper_generator.upgrade_lyric(playing.song_details)):
+                    render_cache.put(playing.song_details["song_id"], "lyric",
+                                     wallpaper_generator.get_display(),
+                                     wallpaper_generator.get_current_image_path())
                     handler.set_wallpaper()
+                    shown = RenderDone(playing.song_details["song_id"], "lyric",
+                                       wallpaper_generator.get_current_image_path(),
+                                       wallpaper_generator.get_current_recipe())
+                elif (prerenderer and not worker.is_busy()
+                      and (not playing or (shown and shown.song_id
+                                           == playing.song_details["song_id"]))):
+                    prerenderer.start(modes)
+
+        # Next frame of the live wallpaper on screen
+        if is_live() and time.perf_counter() >= next_frame and not worker.is_busy():
+            now = time.perf_counter()
+            position = int(anchor[0] + (now - anchor[1]) * 1000)
+            try:
+                if shown.mode == "controllerImage":
+                    next_frame = now + progress_interval
+                    handler.set_wallpaper(wallpaper_generator.render_progress(
+                        playing.song_details, position), quiet=True)
+                else:
+                    path, next_line = wallpaper_generator.render_synced_lyric(
+                        playing.song_details, position, redraw)
+                    # Wake up when the next line starts
+                    next_frame = now + ((next_line - position) / 1000
+                                        if next_line is not None else 1)
+                    if path:
+                        handler.set_wallpaper(path, quiet=True)
+                redraw = False
+            except IOError as e:
+                print(f"Error drawing the live wallpaper: {e}")
+
+    if prerenderer:
+        prerenderer.cancel()
+    worker.close()
+
+
+def render_change(song_details, modes, spotify_client, wallpaper_generator, handler,
+                  render_cache, bus, poll_span, change_start):
+    """
+    Render and show the wallpaper of a track change; runs in the render worker.
 
-            # If the song changed, or if the song was previously paused and is now playing
-            if not handler.same_song(song_details["song_id"]) or old_modes != modes:
-                handler.change_song(song_details["song_id"])
-                handler.change_status(True)
-                old_modes = modes
-                wallpaper_generator.set_current_album(song_details["song_id"])
+    Publishes `RenderDone` once the wallpaper is on screen.
 
-                if song_details["song_id"] in handler.favorites:
-                    # Choose from the favorites with the same albumID
-                    path = f"src/savedConfigs/{song_details['song_id']}"
-                    path += f"-{handler.favorites[song_details['song_id']]}.png"
-                    handler.set_wallpaper(path)
-                    time.sleep(1)
-                    continue
+    Parameters:
+    - song_details (dict): The details of the song.
+    - modes (tuple): The modes enabled.
+    - spotify_client (SpotifyClient): The client used to fetch the currently playing song.
+    - wallpaper_generator (WallpaperGenerator): The generator used to create new wallpapers.
+    - handler (Handler): The handler used for managing wallpapers and tracking song changes.
+    - render_cache (RenderCache): The cache of the wallpapers already rendered.
+    - bus (EventBus): The bus where `RenderDone` is published.
+    - poll_span (dict): The poll that detected the track change, or None.
+    - change_start (float): When the track change was detected (`time.perf_counter()`).
+    """
+    wallpaper_generator.set_current_album(song_details["song_id"])
+    # Every submitted change is rendered, even for the song rendered last (new modes)
+    wallpaper_generator.set_current_song_id(None)
+
+    tracer.begin_change(song_details["song_id"], song_details["song_title"],
+                        adopt=(poll_span,) if poll_span else ())
+    try:
+        shown = update_wallpaper(song_details, modes, spotify_client,
+                                 wallpaper_generator, handler, render_cache, change_start)
+    except IOError as e:
+        print(f"Error generating wallpaper: {e}")
+        return
+    finally:
+        tracer.end_change()
+    # Only the changes that put a wallpaper on screen count
+    if shown:
+        render_time = time.perf_counter() - change_start
+        TIME_TO_WALLPAPER.observe(render_time)
+        bus.publish(RenderDone(song_details["song_id"], wallpaper_generator.get_current_mode(),
+                               wallpaper_generator.get_current_image_path(),
+                               wallpaper_generator.get_current_recipe(), render_time))
+
+
+#pylint: disable=too-many-arguments, too-many-positional-arguments
+def update_wallpaper(song_details, modes, spotify_client, wallpaper_generator, handler,
+                     render_cache, change_start=None):
+    """
+    Show the wallpaper of a song that just started playing.
 
-                # Choose a random mode
-                mode = random.choice(modes)
+    The wallpaper is taken from the favorites or from the render cache if possible,
+    otherwise it is generated in a random mode among the enabled ones. While it is
+    rendered, a placeholder made from the palette of the cover is shown.
 
-                wallpaper_generator.set_current_mode(mode)
+    Parameters:
+    - song_details (dict): The details of the song.
+    - modes (list): A list of available modes for generating wallpapers.
+    - spotify_client (SpotifyClient): The client used to fetch the currently playing song.
+    - wallpaper_generator (WallpaperGenerator): The generator used to create new wallpapers.
+    - handler (Handler): The handler used for managing wallpapers and tracking song changes.
+    - render_cache (RenderCache): The cache of the wallpapers already rendered.
+    - change_start (float, optional): When the track change was detected
+      (`time.perf_counter()`), to time the placeholder.
 
+    Returns:
+    - bool: True if the wallpaper was set, False if no enabled mode could render it.
+    """
+    favorite = handler.favorites.get(song_details["song_id"])
+    if favorite:
+        path = favorite.get("path")
+        if not path:
+            recipe = favorite["recipe"]
+            if not render_cache.contains(recipe["song_id"], "favorite",
+                                         wallpaper_generator.get_display()):
+                show_placeholder(song_details, wallpaper_generator, handler, change_start,
+                                 recipe["palette"])
+            path = favorite_path(recipe, wallpaper_generator, render_cache)
+        wallpaper_generator.set_song_details(song_details)
+        wallpaper_generator.set_current_mode(favorite["mode"])
+        wallpaper_generator.set_current_recipe(favorite.get("recipe"))
+        wallpaper_generator.set_current_image_path(path)
+        checkpoint("apply")
+        handler.set_wallpaper(path)
+        return True
+
+    # Choose a random mode
+    mode = random.choice(modes)
+
+    wallpaper_generator.set_current_mode(mode)
+
+    # Reuse the wallpaper if this song was already rendered in this mode
+    cached_path = render_cache.get(song_details["song_id"], mode,
+                                   wallpaper_generator.get_display())
+    if cached_path:
+        wallpaper_generator.set_song_details(song_details)
+        wallpaper_generator.set_current_image_path(cached_path)
+        checkpoint("apply")
+        handler.set_wallpaper(cached_path)
+        return True
+
+    show_placeholder(song_details, wallpaper_generator, handler, change_start)
+
+    # If the mode can't be generated right now (e.g. the lyrics are late),
+    # fall back to another enabled mode
+    if not wallpaper_generator.generate(mode, song_details, spotify_client):
+        fallback_modes = [m for m in modes if m != mode]
+        if not fallback_modes:
+            return False
+
+        mode = random.choice(fallback_modes)
+        wallpaper_generator.set_current_mode(mode)
+        wallpaper_generator.generate(mode, song_details, spotify_client)
+
+    render_cache.put(song_details["song_id"], mode,
+                     wallpaper_generator.get_display(),
+                     wallpaper_generator.get_current_image_path())
+    checkpoint("apply")
+    handler.set_wallpaper()
+    return True
+
+
+def show_placeholder(song_details, wallpaper_generator, handler, change_start=None, palette=None):
+    """
+    Show a placeholder while the wallpaper of a song is rendered.
 
+    Parameters:
+    - song_details (dict): The details of the song.
+    - wallpaper_generator (WallpaperGenerator): The generator used to create the placeholder.
+    - handler (Handler): The handler used for managing wallpapers.
+    - change_start (float, optional): When the track change was detected.
+    - palette (list, optional): The palette of a recipe. Defaults to the palette of the cover.
+    """
+    path = wallpaper_generator.generate_placeholder(song_details, palette)
+    if path:
+        checkpoint("apply")
+        handler.set_wallpaper(path)
+        if change_start is not None:
+            TIME_TO_PLACEHOLDER.observe(time.perf_counter() - change_start)
 
-                match mode:
-                    case "albumImage":
-                        # Create an album image object
-                        wallpaper_generator.generate_album_image(song_details)
 
-                    case "gradient":
-                        # Create a gradient wallpaper
-                        wallpaper_generator.generate_gradient(song_details)
+def favorite_path(recipe, wallpaper_generator, render_cache):
+    """
+    Get the wallpaper of a favorite saved as a recipe, rendering it if needed.
 
-                    case "blurred":
-                        # Create a blurred wallpaper
-                        wallpaper_generator.generate_blurred(song_details)
+    The rendered favorites are kept in the render cache, under the "favorite" mode.
 
-                    case "waveform":
-                        # Create a waveform wallpaper
-                        wallpaper_generator.generate_waveform(spotify_client, song_details)
+    Parameters:
+    - recipe (dict): The recipe of the favorite.
+    - wallpaper_generator (WallpaperGenerator): The generator used to render the recipe.
+    - render_cache (RenderCache): The cache of the wallpapers already rendered.
 
-                    case "controllerImage":
-                        # Create a controller image
-                        wallpaper_generator.generate_controller(song_details)
+    Returns:
+    - str: The path of the wallpaper.
+    """
+    display = wallpaper_generator.get_display()
+    path = render_cache.get(recipe["song_id"], "favorite", display)
+    if not path:
+        path = render_cache.put(recipe["song_id"], "favorite", display,
+                                wallpaper_generator.render_recipe(recipe))
+    return path
 
-                    case "lyric":
-                        # Create a lyric wallpaper
-                        wallpaper_generator.generate_lyric(song_details)
 
-                handler.set_wallpaper()
+def save_favorite(shown, favorites):
+    """
+    Save the wallpaper on screen as the favorite of its song.
 
-            # Wait time before updating the wallpaper again
-            time.sleep(1)
-        except IOError as e:
-            print(f"Error generating wallpaper: {e}")
-            sys.exit(1)
+    The recipe of the wallpaper is saved, so that it can be rendered again at any
+    resolution; if it has none (e.g. it came from the render cache), the image itself
+    is copied in the 'savedConfigs' folder.
+
+    Parameters:
+    - shown (RenderDone): The wallpaper on screen, or None.
+    - favorites (FavoritesIndex): The index of the favorite wallpapers.
+
+    Returns:
+    - bool: True if the favorite was saved, False if there is no wallpaper to save.
 
+    Raises:
+    - OSError: If the favorite can't be written.
+    """
+    if shown is None:
+        return False
+
+    if shown.recipe:
+        favorites.add_recipe(shown.song_id, shown.recipe)
+    else:
+        favorites.add(shown.song_id, shown.mode, shown.path)
+    return True
 
-def start_cli(spotify_client, wallpaper_generator, stop_event, modes):
+
+def start_cli(spotify_client, wallpaper_generator, stop_event, modes, bus):
     """
     Start the CLI for controlling the application and changing settings.
     
@@ -183,9 +588,10 @@ def start_cli(spotify_client, wallpaper_generator, stop_event, modes):
     - spotify_client (SpotifyClient): The client used to interact with Spotify.
     - wallpaper_generator (WallpaperGenerator): The generator used for creating wallpapers.
     - stop_event (threading.Event): A signal to stop the thread when set.
-    - modes (list): A list of available modes for generating wallpapers.
+    - modes (list): The modes enabled when the program starts.
+    - bus (EventBus): The bus where the commands are published.
     """
-    cli = CLI(spotify_client, wallpaper_generator, modes, stop_event)
+    cli = CLI(spotify_client, wallpaper_generator, modes, stop_event, bus)
     cli.run()
 
 
@@ -0,0 +1,252 @@
+"""
+Offline pre-rendering of wallpapers for a list of tracks.
+
+Reads a JSON or CSV list of songs and renders every requested mode for every track
+through a pool of processes. The wallpapers are stored in the render cache (with
+`--target favorites`, as favorites too), so that they are ready before the songs are played.
+With `--favorites`, the favorites saved as recipes are rendered again instead, e.g.
+after a change of resolution.
+
+Usage:
+    python src/prerender.py tracks.json [--modes gradient,blurred] [--workers N]
+                            [--display 1920x1080] [--target cache|favorites]
+    python src/prerender.py --favorites [--workers N] [--display 1920x1080]
+
+Every track needs the `song_title`, `artist_name`, `image_url`, `song_id` and
+`song_length` fields (`title`, `artist`, `id` and `length` are accepted too).
+An interrupted run can simply be started again: wallpapers already stored are skipped.
+
+While the program runs, `utils.idle_prerender.IdlePrerenderer` does the same in
+background for the most played tracks of the play history, whenever the wallpaper is idle.
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.cover_index import CoverIndex
+from utils.favorites import FavoritesIndex
+from utils.idle_prerender import PRERENDER_MODES
+from utils.lyric_library import LyricLibrary
+from utils.render_cache import RenderCache, store_file
+from WallpaperGenerator.wallpaper_generator import WallpaperGenerator
+
+
+FIELD_ALIASES = {
+    "title": "song_title",
+    "artist": "artist_name",
+    "id": "song_id",
+    "length": "song_length",
+}
+
+# The generator of the worker process, created by `init_worker`
+_generator = None
+
+
+def load_tracks(path):
+    """
+    Load the list of tracks from a JSON or CSV file.
+
+    A JSON file can contain either a list of tracks or an object with a `tracks` list.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        list: The song details of every track.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = json.load(f)
+            if isinstance(rows, dict):
+                rows = rows.get("tracks", [])
+
+    tracks = []
+    for row in rows:
+        song_details = {FIELD_ALIASES.get(key.strip(), key.strip()): value
+                        for key, value in row.items()}
+        song_details["song_length"] = int(song_details.get("song_length") or 0)
+        tracks.append(song_details)
+
+    return tracks
+
+
+def init_worker(display, lyric_deadline):
+    """
+    Create the wallpaper generator of a worker process.
+
+    Every worker renders to its own file, so that they never overwrite each other, and
+    only reads the cover index and the lyric library: the covers it sees are merged in
+    the index by the main process (see `render_task`), and the library is refreshed
+    once before the workers start.
+
+    Args:
+        display (list): The dimensions of the display (width, height).
+        lyric_deadline (float): Seconds to wait for the lyrics.
+    """
+    #pylint: disable=global-statement
+    global _generator
+    _generator = WallpaperGenerator(lyric_deadline=lyric_deadline,
+                                    display=display,
+                                    output_path=f"ImageCache/prerender/{os.getpid()}.png",
+                                    read_only=True)
+
+
+def render_task(song_details, mode, destination):
+    """
+    Render a track in a mode and store the wallpaper. Runs in a worker process.
+
+    Args:
+        song_details (dict): The details of the track.
+        mode (str): The wallpaper mode.
+        destination (str): Where to store the wallpaper.
+
+    Returns:
+        tuple: The recipe of the wallpaper, or None if it is not available in this mode
+            (e.g. no lyrics were found), and the covers seen, to merge in the cover index.
+    """
+    # Every task is a new render, even for the same song
+    _generator.set_current_song_id(None)
+    _generator.set_current_mode(mode)
+    if not _generator.generate(mode, song_details):
+        return None, _generator.cover_index.take_added()
+
+    store_file(_generator.get_current_image_path(), destination, move=True)
+    return _generator.get_current_recipe(), _generator.cover_index.take_added()
+
+
+def render_recipe_task(recipe, destination):
+    """
+    Render a favorite from its recipe and store the wallpaper. Runs in a worker process.
+
+    Args:
+        recipe (dict): The recipe of the favorite.
+        destination (str): Where to store the wallpaper.
+
+    Returns:
+        tuple: The recipe, and the covers seen, see `render_task`.
+    """
+    store_file(_generator.render_recipe(recipe), destination, move=True)
+    return recipe, _generator.cover_index.take_added()
+
+
+def parse_display(value):
+    """
+    Parse a display size written as WIDTHxHEIGHT.
+
+    Args:
+        value (str): The display size, e.g. "1920x1080".
+
+    Returns:
+        list: The width and the height, as strings like the ones read from xrandr.
+    """
+    width, height = value.lower().split("x")
+    return [str(int(width)), str(int(height))]
+
+
+def main():
+    """Render the requested modes for every track in the list."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("tracks", nargs="?", help="JSON or CSV file with the list of tracks")
+    parser.add_argument("--favorites", action="store_true",
+                        help="render again the favorites saved as recipes, instead of tracks")
+    parser.add_argument("--modes", default=",".join(PRERENDER_MODES),
+                        help="comma-separated modes to render (default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--display", type=parse_display,
+                        help="display size as WIDTHxHEIGHT (default: detected with xrandr)")
+    parser.add_argument("--target", choices=["cache", "favorites"], default="cache",
+                        help="store the wallpapers in the render cache or as favorites")
+    parser.add_argument("--lyric-deadline", type=float, default=30,
+                        help="seconds to wait for the lyrics of a track")
+    args = parser.parse_args()
+
+    if bool(args.tracks) == args.favorites:
+        parser.error("give either a list of tracks or --favorites")
+
+    modes = [mode for mode in args.modes.replace(" ", "").split(",") if mode]
+    invalid_modes = [mode for mode in modes if mode not in PRERENDER_MODES]
+    if invalid_modes:
+        parser.error(f"invalid modes: {', '.join(invalid_modes)}")
+    if args.target == "favorites" and len(modes) != 1:
+        parser.error("favorites can only be saved in a single mode")
+
+    display = args.display or WallpaperGenerator.detect_display()
+    render_cache = RenderCache()
+    favorites = FavoritesIndex()
+
+    # Favorites are saved as recipes, their wallpapers go in the render cache
+    def destination(song_id, mode):
+        if args.target == "favorites" or args.favorites:
+            mode = "favorite"
+        return render_cache.get_path(song_id, mode, display)
+
+    # Every task is (function, arguments, song ID, title, mode);
+    # the destination is the last argument
+    if args.favorites:
+        tasks = [(render_recipe_task, (recipe, destination(song_id, recipe["mode"])),
+                  song_id, recipe["song_title"], recipe["mode"])
+                 for song_id, recipe in favorites.recipes().items()]
+    else:
+        tasks = [(render_task, (track, mode, destination(track["song_id"], mode)),
+                  track["song_id"], track["song_title"], mode)
+                 for track in load_tracks(args.tracks) for mode in modes]
+    if args.target == "favorites" and not args.favorites:
+        # A favorite is done once its recipe is saved: a run interrupted after its
+        # wallpaper was written, but before the recipe was, renders it again
+        saved = favorites.recipes()
+        pending = [task for task in tasks if task[2] not in saved]
+    else:
+        pending = [task for task in tasks if not os.path.exists(task[1][-1])]
+    print(f"{len(tasks)} wallpapers requested, {len(tasks) - len(pending)} already rendered")
+
+    # The workers only read the cover index and the lyric library
+    cover_index = CoverIndex()
+    if "lyric" in modes and not args.favorites:
+        library = LyricLibrary()
+        library.refresh()
+        library.close()
+
+    rendered = skipped = failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(display, args.lyric_deadline)) as executor:
+        futures = {executor.submit(function, *arguments): (song_id, title, mode)
+                   for function, arguments, song_id, title, mode in pending}
+        try:
+            for future in as_completed(futures):
+                song_id, title, mode = futures[future]
+                try:
+                    recipe, covers = future.result()
+                    cover_index.merge(covers)
+                    if recipe:
+                        rendered += 1
+                        if args.target == "favorites" and not args.favorites:
+                            favorites.add_recipe(song_id, recipe)
+                    else:
+                        skipped += 1
+                        print(f"Skipped {title} ({mode}): not available")
+                #pylint: disable=broad-exception-caught
+                except Exception as e:
+                    failed += 1
+                    print(f"Error rendering {title} ({mode}): {e}")
+
+                done = rendered + skipped + failed
+                print(f"[{done}/{len(pending)}] {title} - {mode}")
+        except KeyboardInterrupt:
+            executor.shutdown(wait=True, cancel_futures=True)
+            print("Interrupted, run the same command again to resume")
+
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {rendered}, skipped {skipped}, failed {failed} in {elapsed:.1f}s "
+          f"({rendered / elapsed if elapsed else 0:.2f} renders/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Tests for the local lyric library: the variants of the artists and the titles that a
+lookup must still find, and the ones it must not.
+
+Usage:
+    python -m pytest src/tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#pylint: disable=import-error, wrong-import-position
+from utils.lyric_library import LyricLibrary
+
+FILES = [
+    "Queen - Bohemian Rhapsody.lrc",
+    "Queen - Bohemian Rhapsody.txt",
+    "Queen - Don't Stop Me Now.txt",
+    "Beyoncé - Halo.lrc",
+    "Simon & Garfunkel - The Sound of Silence.txt",
+    "Daft Punk/Harder, Better, Faster, Stronger.lrc",
+    "Fleetwood Mac - Everywhere.lrc",
+]
+
+
+@pytest.fixture(name="library")
+def fixture_library(tmp_path):
+    """A library of the `FILES`, indexed once."""
+    directory = tmp_path / "lyrics"
+    for name in FILES:
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("", encoding="utf-8")
+    library = LyricLibrary(str(directory), str(tmp_path / "index.db"), refresh_interval=None)
+    library.refresh()
+    yield library
+    library.close()
+
+
+def found(library, artist, title):
+    """The name of the file found for a song, relative to the library, or None."""
+    path = library.find(artist, title)
+    return os.path.relpath(path, library.directory) if path else None
+
+
+@pytest.mark.parametrize("artist, title, expected", [
+    # Exact, and the `.lrc` preferred to the `.txt`
+    ("Queen", "Bohemian Rhapsody", "Queen - Bohemian Rhapsody.lrc"),
+    # Case, accents, punctuation and versions
+    ("QUEEN", "Don't Stop Me Now - Remastered 2011", "Queen - Don't Stop Me Now.txt"),
+    ("Beyonce", "Halo", "Beyoncé - Halo.lrc"),
+    ("Simon and Garfunkel", "The Sound Of Silence (Live)",
+     "Simon & Garfunkel - The Sound of Silence.txt"),
+    ("Daft Punk", "Harder Better Faster Stronger",
+     os.path.join("Daft Punk", "Harder, Better, Faster, Stronger.lrc")),
+    # Typos in the title, in the artist, and in both
+    ("Queen", "Bohemian Rapsody", "Queen - Bohemian Rhapsody.lrc"),
+    ("Qeen", "Bohemian Rhapsody", "Queen - Bohemian Rhapsody.lrc"),
+    ("Fleetwod Mac", "Everywere", "Fleetwood Mac - Everywhere.lrc"),
+    ("Smon & Garfunkle", "The Sound of Silense", "Simon & Garfunkel - The Sound of Silence.txt"),
+])
+def test_find_variants(library, artist, title, expected):
+    """The variants of a song find its file."""
+    assert found(library, artist, title) == expected
+
+
+@pytest.mark.parametrize("artist, title", [
+    ("Queen", "Radio Ga Ga"),
+    ("Beyoncé", "Crazy in Love"),
+    ("Metallica", "Bohemian Rhapsody"),
+    ("Unknown Artist", "Unknown Title"),
+])
+def test_find_missing(library, artist, title):
+    """Other songs, even of the same artist or with the same title, find nothing."""
+    assert found(library, artist, title) is None
+
+
+def test_find_extensions(library):
+    """The order of the extensions decides between the files of the same song."""
+    assert found(library, "Queen", "Bohemian Rhapsody") == "Queen - Bohemian Rhapsody.lrc"
+    assert (os.path.basename(library.find("Queen", "Bohemian Rhapsody", (".txt", ".lrc")))
+            == "Queen - Bohemian Rhapsody.txt")
+    assert library.find("Beyonce", "Halo", (".txt",)) is None
+
+
+def test_removed_files(library):
+    """Removed files are no longer found once the library is refreshed."""
+    os.remove(os.path.join(library.directory, "Fleetwood Mac - Everywhere.lrc"))
+    library.refresh()
+    assert found(library, "Fleetwood Mac", "Everywhere") is None
+    assert found(library, "Fleetwod Mac", "Everywere") is None
@@ -0,0 +1,389 @@
+"""
+Module with the backends that put the generated wallpapers on screen.
+
+Every backend applies an image and restores the original wallpaper, skips the changes
+that would not change anything, and records how long its changes take. The backend is
+chosen with `wallpaper_backend` in creds.txt:
+
+- `auto` (default): the first backend available among GNOME, swaybg and feh
+- `gnome`: GSettings, see `utils.wallpaper_setter`
+- `swaybg`, `feh`: the wallpaper tools of wlroots compositors and X11 window managers
+- `command`: any command, given with `wallpaper_command` (`{path}` is the image)
+- `file`: copies every wallpaper to `wallpaper_sink`, for render servers
+- `null`: only records the changes, for benchmarks and CI
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+
+from utils.metrics import BACKEND_APPLY_TIME
+from utils.render_cache import store_file
+from utils.wallpaper_setter import GSettingsSetter, change_key, to_uri
+
+# The GNOME settings read at startup, as (name, schema, key)
+GNOME_PROBE = [
+    ('color-scheme', 'org.gnome.desktop.interface', 'color-scheme'),
+    ('picture-uri', 'org.gnome.desktop.background', 'picture-uri'),
+    ('picture-uri-dark', 'org.gnome.desktop.background', 'picture-uri-dark'),
+]
+
+# Marks the original wallpaper as the last one applied
+RESTORED = "restored"
+
+
+def probe_settings(probe):
+    """
+    Read several gsettings keys with a single subprocess.
+
+    Args:
+        probe (list): The settings to read, as (name, schema, key) tuples.
+
+    Returns:
+        dict: The values of the settings that could be read, keyed by name.
+    """
+    script = "; ".join(f"printf '%s=%s\\n' {name} \"$(gsettings get {schema} {key})\""
+                       for name, schema, key in probe)
+    try:
+        output = subprocess.run(["sh", "-c", script], capture_output=True, text=True,
+                                check=False, timeout=10).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+
+    settings = {}
+    for line in output.splitlines():
+        name, _, value = line.partition("=")
+        if value:
+            settings[name] = value.strip()
+    return settings
+
+
+class WallpaperBackend:
+    """
+    Base class of the wallpaper backends.
+
+    Subclasses implement `set_image` and, if they can, `restore_original`; the base
+    class deduplicates the changes and measures their latency.
+
+    Attributes:
+        name (str): The name of the backend, as used in the configuration.
+        last_applied: The key of the last change, see `change_key`, or `RESTORED`.
+        changes (int): How many changes were applied.
+        total_latency (float): The time spent applying them, in seconds.
+        last_latency (float): The time spent applying the last one, in seconds.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.last_applied = None
+        self.changes = 0
+        self.total_latency = 0
+        self.last_latency = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls):
+        """
+        Check if the backend can run in the current session.
+
+        Returns:
+            bool: True if the backend can be used.
+        """
+        return True
+
+    def apply(self, path, force=False):
+        """
+        Show an image as wallpaper, unless it is already shown.
+
+        Args:
+            path (str): The image to show.
+            force (bool, optional): Apply the change even if it looks like a duplicate.
+                Defaults to False.
+
+        Returns:
+            bool: True if the wallpaper was changed, False if the change was skipped.
+        """
+        key = change_key(to_uri(path))
+        with self.lock:
+            if key == self.last_applied and not force:
+                return False
+            self.timed(self.set_image, os.path.abspath(path))
+            self.last_applied = key
+            return True
+
+    def restore(self):
+        """
+        Restore the original wallpaper, unless it is already shown.
+
+        Returns:
+            bool: True if the wallpaper was changed, False if the change was skipped.
+        """
+        with self.lock:
+            if self.last_applied in (None, RESTORED):
+                return False
+            self.timed(self.restore_original)
+            self.last_applied = RESTORED
+            return True
+
+    def timed(self, function, *args):
+        """Run a change, recording its latency."""
+        start = time.perf_counter()
+        try:
+            function(*args)
+        finally:
+            self.last_latency = time.perf_counter() - start
+            self.total_latency += self.last_latency
+            self.changes += 1
+            BACKEND_APPLY_TIME.labels(backend=self.name).observe(self.last_latency)
+
+    def mean_latency(self):
+        """
+        Get the mean latency of the changes.
+
+        Returns:
+            float: The mean latency in seconds, 0 if nothing was applied yet.
+        """
+        return self.total_latency / self.changes if self.changes else 0
+
+    def describe(self):
+        """
+        Describe the backend and its latency.
+
+        Returns:
+            str: A human readable description.
+        """
+        return (f"Wallpaper backend: {self.name}, {self.changes} changes, "
+                f"last {self.last_latency * 1000:.1f} ms, "
+                f"mean {self.mean_latency() * 1000:.1f} ms")
+
+    def set_image(self, path):
+        """
+        Show an image as wallpaper.
+
+        Args:
+            path (str): The absolute path of the image.
+        """
+        raise NotImplementedError
+
+    def restore_original(self):
+        """Restore the wallpaper shown before the script started, if the backend can."""
+
+    def close(self):
+        """Release the resources of the backend."""
+
+
+class GnomeBackend(WallpaperBackend):
+    """
+    A backend that sets the GNOME wallpaper through GSettings.
+
+    Attributes:
+        setter (GSettingsSetter): The setter of the key matching the color scheme.
+        original_wallpaper (str): The wallpaper set when the script started.
+    """
+
+    name = "gnome"
+
+    def __init__(self):
+        super().__init__()
+        settings = probe_settings(GNOME_PROBE)
+        key = 'picture-uri-dark' if 'dark' in settings.get('color-scheme', '') else 'picture-uri'
+
+        self.setter = GSettingsSetter(key)
+        self.original_wallpaper = settings.get(key)
+        if not self.original_wallpaper:
+            raise EnvironmentError("Can't read the GNOME wallpaper settings")
+
+    @classmethod
+    def is_available(cls):
+        return shutil.which("gnome-session") is not None
+
+    def set_image(self, path):
+        self.setter.apply(path, force=True)
+
+    def restore_original(self):
+        self.setter.apply(self.original_wallpaper, force=True)
+
+
+class CommandBackend(WallpaperBackend):
+    """
+    A backend that runs a command to set the wallpaper.
+
+    Attributes:
+        command (list): The command, where `{path}` is replaced by the image.
+        persistent (bool): Whether the command keeps running to show the wallpaper
+            (like swaybg); the previous process is then stopped after every change.
+        restore_command (list): The command restoring the original wallpaper, or None.
+        process (subprocess.Popen): The running process of a persistent command.
+    """
+
+    name = "command"
+
+    def __init__(self, command, persistent=False, restore_command=None):
+        """
+        Initialize the backend.
+
+        Args:
+            command (list or str): The command, where `{path}` is replaced by the image.
+            persistent (bool, optional): Whether the command keeps running. Defaults to False.
+            restore_command (list, optional): The command restoring the original wallpaper.
+        """
+        super().__init__()
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        if not any("{path}" in arg for arg in self.command):
+            self.command.append("{path}")
+        self.persistent = persistent
+        self.restore_command = restore_command
+        self.process = None
+
+    def set_image(self, path):
+        command = [arg.replace("{path}", path) for arg in self.command]
+        if not self.persistent:
+            subprocess.run(command, check=False)
+            return
+
+        # Start the new process before stopping the old one, so there's no blank frame
+        previous = self.process
+        self.process = subprocess.Popen(command)  #pylint: disable=consider-using-with
+        self.stop(previous)
+
+    def restore_original(self):
+        if self.persistent:
+            self.stop(self.process)
+            self.process = None
+        if self.restore_command:
+            subprocess.run(self.restore_command, check=False)
+
+    @staticmethod
+    def stop(process):
+        """Stop a persistent process, if it is running."""
+        if process is not None and process.poll() is None:
+            process.terminate()
+            process.wait()
+
+    def close(self):
+        if self.persistent:
+            self.stop(self.process)
+            self.process = None
+
+
+class SwaybgBackend(CommandBackend):
+    """A backend for wlroots compositors (sway, Hyprland, ...), using swaybg."""
+
+    name = "swaybg"
+
+    def __init__(self):
+        super().__init__(["swaybg", "--mode", "fill", "--image", "{path}"], persistent=True)
+
+    @classmethod
+    def is_available(cls):
+        return bool(os.environ.get("WAYLAND_DISPLAY")) and shutil.which("swaybg") is not None
+
+
+class FehBackend(CommandBackend):
+    """A backend for X11 window managers, using feh; the original is restored from ~/.fehbg."""
+
+    name = "feh"
+
+    def __init__(self):
+        fehbg = os.path.expanduser("~/.fehbg")
+        super().__init__(["feh", "--no-fehbg", "--bg-fill", "{path}"],
+                         restore_command=["sh", fehbg] if os.path.exists(fehbg) else None)
+
+    @classmethod
+    def is_available(cls):
+        return bool(os.environ.get("DISPLAY")) and shutil.which("feh") is not None
+
+
+class FileSinkBackend(WallpaperBackend):
+    """
+    A backend that copies every wallpaper to a file, without touching the desktop.
+
+    Attributes:
+        sink (str): Where the wallpapers are copied.
+    """
+
+    name = "file"
+
+    def __init__(self, sink="ImageCache/wallpaper.png"):
+        """
+        Initialize the backend.
+
+        Args:
+            sink (str, optional): Where the wallpapers are copied.
+                Defaults to "ImageCache/wallpaper.png".
+        """
+        super().__init__()
+        self.sink = sink
+
+    def set_image(self, path):
+        store_file(path, self.sink)
+
+
+class NullBackend(WallpaperBackend):
+    """
+    A backend that only records the changes, for benchmarks and tests.
+
+    Attributes:
+        history (list): The changes, as (time, path) tuples; the path is None for restores.
+    """
+
+    name = "null"
+
+    def __init__(self):
+        super().__init__()
+        self.history = []
+
+    def set_image(self, path):
+        self.history.append((time.time(), path))
+
+    def restore_original(self):
+        self.history.append((time.time(), None))
+
+
+# The backends tried, in order, when the backend is `auto`
+AUTO_BACKENDS = [GnomeBackend, SwaybgBackend, FehBackend]
+
+BACKENDS = {backend.name: backend for backend in AUTO_BACKENDS + [FileSinkBackend, NullBackend]}
+
+
+def create_backend(name="auto", command=None, sink=None):
+    """
+    Create a wallpaper backend.
+
+    Args:
+        name (str, optional): The name of the backend, or "auto" to detect it.
+            Defaults to "auto".
+        command (str, optional): The command of the `command` backend.
+        sink (str, optional): The file written by the `file` backend.
+
+    Returns:
+        WallpaperBackend: The backend.
+
+    Raises:
+        EnvironmentError: If no backend is available, or the backend can't be created.
+        ValueError: If the name is unknown.
+    """
+    name = (name or "auto").lower()
+
+    if name == "auto":
+        for backend in AUTO_BACKENDS:
+            if backend.is_available():
+                return backend()
+        raise EnvironmentError("Environment not supported")
+
+    if name == "command":
+        if not command:
+            raise ValueError("The command backend needs wallpaper_command")
+        return CommandBackend(command)
+
+    if name == "file":
+        return FileSinkBackend(sink) if sink else FileSinkBackend()
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown wallpaper backend: {name} "
+                         f"(available: auto, command, {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
@@ -3,8 +3,16 @@ A module that provides a class to manage a cache with a maximum size
 and time-to-live (TTL) for the cached items.
 
 """
-from cachetools import TTLCache
+import threading
+
+from cachetools import LRUCache, TTLCache
 import requests
+#pylint: disable=import-error
+from PIL import Image
+
+from utils.cancellation import checkpoint
+from utils.metrics import CACHE_HITS, CACHE_MISSES
+from utils.tracing import tracer
 
 class CacheManager:
     """
@@ -44,10 +52,14 @@ class CacheManager:
             The value associated with the given key.
         """
         try:
-            return self.cache[key]
+            value = self.cache[key]
         except KeyError:
+            CACHE_MISSES.labels(cache="cover").inc()
             return self.set(key)
 
+        CACHE_HITS.labels(cache="cover").inc()
+        return value
+
     def set(self, key):
         """
         Fetches the content associated with the given key and adds it to the cache. 
@@ -57,8 +69,10 @@ class CacheManager:
         Returns:
             The fetched content.
         """
-        response = requests.get(key, timeout=5)
-        response.raise_for_status()
+        checkpoint("fetch")
+        with tracer.span("download", url=key):
+            response = requests.get(key, timeout=5)
+            response.raise_for_status()
 
         self.cache[key] = response.content
 
@@ -77,3 +91,69 @@ class CacheManager:
         Clears all items from the cache.
         """
         self.cache.clear()
+
+
+def image_size(value):
+    """Estimate the memory used by a cached value: the pixels of images, 1 for the rest."""
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    return 1
+
+
+class AlbumCache:
+    """
+    A class that caches the work derived from a cover, shared by all the tracks using it.
+
+    Every track of an album has the same cover, so its palette, the resized cover and
+    the backgrounds built from them are computed once and reused, and only the layers
+    that depend on the track (title, lyrics, ...) are rendered again.
+
+    Images are shared between the renders: callers must copy them before drawing on them.
+
+    Args:
+        max_bytes (int, optional): The memory used by the cached images, in bytes.
+            Defaults to 256 MiB.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        """
+        Initializes the AlbumCache object.
+        Args:
+            max_bytes (int, optional): The memory used by the cached images, in bytes.
+                Defaults to 256 MiB.
+        """
+        self.cache = LRUCache(max_bytes, getsizeof=image_size)
+        self.lock = threading.Lock()
+
+    def get(self, key, create):
+        """
+        Retrieves the value associated with the given key, creating it if needed.
+        Args:
+            key (tuple): The key, starting with the cover the value is derived from
+                (e.g. `(image_url, "palette")`).
+            create (callable): The function computing the value, called without arguments.
+        Returns:
+            The value associated with the given key.
+        """
+        with self.lock:
+            value = self.cache.get(key)
+        if value is not None:
+            CACHE_HITS.labels(cache="album").inc()
+            return value
+
+        CACHE_MISSES.labels(cache="album").inc()
+        value = create()
+        with self.lock:
+            try:
+                self.cache[key] = value
+            except ValueError:
+                # Too large to be cached
+                pass
+        return value
+
+    def clear(self):
+        """
+        Clears all items from the cache.
+        """
+        with self.lock:
+            self.cache.clear()
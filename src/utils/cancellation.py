@@ -0,0 +1,119 @@
+"""
+Module for cancelling the renders of the tracks that are no longer playing.
+
+Every render runs with a `CancelToken`, made active on its thread with `activate`.
+The stages of the pipeline call `checkpoint` before starting (cover download, palette
+extraction, composition, PNG encode, wallpaper change): once the token is cancelled,
+the next checkpoint raises `RenderCancelled` and the rest of the render is skipped.
+Outside of a render, `checkpoint` does nothing, so the same code runs unchanged in
+the pre-renderer and the benchmarks.
+"""
+
+from contextlib import contextmanager
+import threading
+
+_local = threading.local()
+
+
+class RenderCancelled(Exception):
+    """
+    Raised by `checkpoint` when the active render was cancelled.
+
+    Attributes:
+        stage (str): The stage that was about to start.
+    """
+
+    def __init__(self, stage):
+        super().__init__(f"Render cancelled before the {stage} stage")
+        self.stage = stage
+
+
+class CancelToken:
+    """
+    A class that tells a render whether it is still wanted.
+
+    Attributes:
+        song_id (str): The ID of the song being rendered, for the messages.
+    """
+
+    def __init__(self, song_id=None):
+        """
+        Initialize the token.
+
+        Args:
+            song_id (str, optional): The ID of the song being rendered.
+        """
+        self.song_id = song_id
+        self.event = threading.Event()
+
+    def cancel(self):
+        """Cancel the render; it stops at its next checkpoint."""
+        self.event.set()
+
+    def is_cancelled(self):
+        """
+        Check if the render was cancelled.
+
+        Returns:
+            bool: True if the render was cancelled.
+        """
+        return self.event.is_set()
+
+    def wait(self, timeout):
+        """
+        Wait until the render is cancelled, at most `timeout` seconds.
+
+        Args:
+            timeout (float): The time to wait in seconds.
+
+        Returns:
+            bool: True if the render was cancelled.
+        """
+        return self.event.wait(timeout)
+
+    def check(self, stage):
+        """
+        Stop the render if it was cancelled.
+
+        Args:
+            stage (str): The stage that is about to start.
+
+        Raises:
+            RenderCancelled: If the render was cancelled.
+        """
+        if self.event.is_set():
+            raise RenderCancelled(stage)
+
+
+@contextmanager
+def activate(token):
+    """
+    Make a token the active one of the current thread for the enclosed block.
+
+    Args:
+        token (CancelToken): The token of the render.
+
+    Yields:
+        CancelToken: The token.
+    """
+    previous = getattr(_local, "token", None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def checkpoint(stage):
+    """
+    Stop the render running on the current thread if it was cancelled.
+
+    Args:
+        stage (str): The stage that is about to start.
+
+    Raises:
+        RenderCancelled: If the active token was cancelled.
+    """
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.check(stage)
@@ -5,6 +5,9 @@ Module for the Command Line Interface (CLI) of the SpotifySyncWall program.
 import os
 import sys
 
+from utils.events import ModesChanged, SaveRequested
+from utils.tracing import tracer
+
 class CommandLineInterface:
     """
     Command Line Interface for the SpotifySyncWall program.
@@ -19,12 +22,15 @@ class CommandLineInterface:
     wallpaper_generator : WallpaperGenerator
         The wallpaper generator object.
     modes : list
-        The list of available modes for wallpaper generation.
+        The modes enabled for wallpaper generation.
     stop_event : threading.Event
         The event used to signal when to stop the program.
+    bus : EventBus
+        The bus where the commands are published for the wallpaper thread.
     """
 
-    def __init__(self, spotify_client, wallpaper_generator, modes, stop_event):
+    #pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(self, spotify_client, wallpaper_generator, modes, stop_event, bus):
         """
         Initialize the CLI object with required components.
 
@@ -35,14 +41,17 @@ class CommandLineInterface:
         wallpaper_generator : WallpaperGenerator
             The wallpaper generator object.
         modes : list
-            The list of available modes for wallpaper generation.
+            The modes enabled when the program starts.
         stop_event : threading.Event
             The stop event used to signal termination.
+        bus : EventBus
+            The bus where the commands are published.
         """
         self.spotify_client = spotify_client
         self.wallpaper_generator = wallpaper_generator
-        self.modes = modes
+        self.modes = list(modes)
         self.stop_event = stop_event
+        self.bus = bus
 
     def run(self):
         """
@@ -84,6 +93,14 @@ class CommandLineInterface:
                 self.show_config()
                 input("Press Enter to continue...")
 
+            if command.split(" ")[0] == "profile":
+                self.configure_profiling(command.split()[1:])
+                input("Press Enter to continue...")
+
+            if command.split(" ")[0] == "trace":
+                self.show_traces(command.split()[1:])
+                input("Press Enter to continue...")
+
 
     def modify_modes(self):
         """
@@ -99,6 +116,7 @@ class CommandLineInterface:
         print("\t4. Album Image")
         print("\t5. Controller Image")
         print("\t6. Lyric card")
+        print("\t7. Synced lyric card")
 
         choice = input("Choose modes (comma-separated): ")
         selected_modes = choice.replace(" ", "").split(",")
@@ -117,13 +135,15 @@ class CommandLineInterface:
                 case "5":
                     new_modes.append("controllerImage")
                 case "6":
-                    new_modes.append("lyricCard")
+                    new_modes.append("lyric")
+                case "7":
+                    new_modes.append("syncedLyric")
                 case _:
                     print(f"Invalid mode: {mode}")
 
         if new_modes:
-            self.modes.clear()
-            self.modes.extend(new_modes)
+            self.modes = new_modes
+            self.bus.publish(ModesChanged(tuple(new_modes)))
             print(f"New modes set: {self.modes}")
         else:
             print("No valid modes selected.")
@@ -140,28 +160,34 @@ class CommandLineInterface:
         print("\tsettings - Change the wallpaper generation modes.")
         print("\tsave - Save the current configuration to favorites.")
         print("\tshow - Display the current wallpaper configuration.")
+        print("\ttrace [N] - Show the stage timings of the last N track changes.")
+        print("\ttrace export [PATH] - Save the timings as a Chrome trace (chrome://tracing).")
+        print("\tprofile [cprofile|tracemalloc|all|off] [every N] - Profile the renders.")
         print("\texit - Exit the program.")
 
     def save_config(self):
         """
         Save the current wallpaper configuration.
 
-        Copies the current wallpaper from the cache and stores it in the
-        'savedConfigs' folder with a name based on the song's ID and mode.
+        Asks the wallpaper thread to save the wallpaper on screen in the favorites
+        (see `save_favorite` in main), replacing the previous favorite of the song,
+        and waits for the answer.
 
         Returns:
         --------
         bool
             True if the configuration was saved successfully, False otherwise.
         """
+        request = SaveRequested()
+        self.bus.publish(request)
         try:
-            #get the current song ID and mode
-            song_id = self.wallpaper_generator.get_current_album()
-            mode = self.wallpaper_generator.get_current_mode()
-
-            #copy the current wallpaper to the savedConfigs folder
-            os.system(f"cp ImageCache/finalImage.png src/savedConfigs/{song_id}-{mode}.png")
+            if not request.reply.result(timeout=10):
+                print("No wallpaper to save yet.")
+                return False
             return True
+        except TimeoutError:
+            print("The wallpaper thread didn't answer, try again.")
+            return False
         except OSError as e:
             print(f"Error saving configuration: {e}")
             return False
@@ -176,3 +202,59 @@ class CommandLineInterface:
         print(f"""\t{self.wallpaper_generator.get_current_song()} by\
  {self.wallpaper_generator.get_current_artist()} in mode:\
  {self.wallpaper_generator.get_current_mode()}""")
+
+    def show_traces(self, args):
+        """
+        Display the stage-by-stage latency of the last track changes, or export them.
+
+        Parameters:
+        -----------
+        args : list
+            The arguments of the command: either the number of track changes to show
+            (5 by default), or 'export' followed by an optional path.
+        """
+        if args and args[0] == "export":
+            path = args[1] if len(args) > 1 else "ImageCache/trace.json"
+            tracer.export_chrome_trace(path)
+            print(f"Trace saved to {path}")
+            return
+
+        count = int(args[0]) if args and args[0].isdigit() else 5
+        changes = tracer.last_changes(count)
+        if not changes:
+            print("No track changes recorded yet.")
+            return
+
+        for change in changes:
+            total = "in progress"
+            if change["end"] is not None:
+                total = f"{(change['end'] - change['start']) * 1000:.0f} ms"
+            print(f"{change['song_title']} ({change['song_id']}): {total}")
+            for stage, elapsed in tracer.breakdown(change).items():
+                print(f"\t{stage:<16}{elapsed:>10.1f} ms")
+
+    def configure_profiling(self, args):
+        """
+        Turn the profiling of the renders on or off, and show its configuration.
+
+        Parameters:
+        -----------
+        args : list
+            The arguments of the command: the tools to use ('cprofile', 'tracemalloc',
+            'all' or 'off'), optionally followed by 'every N' to profile one render
+            every N. Without arguments, the configuration is only shown.
+        """
+        profiler = self.wallpaper_generator.profiler
+
+        if args and args[0] in ("cprofile", "tracemalloc", "all", "off"):
+            profiler.configure(use_cprofile=args[0] in ("cprofile", "all"),
+                               use_tracemalloc=args[0] in ("tracemalloc", "all"))
+
+        if "every" in args:
+            index = args.index("every") + 1
+            if index < len(args) and args[index].isdigit():
+                profiler.configure(every=int(args[index]))
+            else:
+                print("Usage: profile [cprofile|tracemalloc|all|off] [every N]")
+
+        print(profiler.describe())
@@ -32,7 +32,8 @@ class ConfigManager:
         Load configuration settings from the file.
 
         This method reads the configuration file, assuming it contains key-value pairs
-        separated by an '=' sign on each line.
+        separated by an '=' sign on each line. Blank lines and lines starting with '#'
+        are ignored, and spaces around keys and values are stripped.
 
         Returns:
             dict: A dictionary containing the loaded configuration settings.
@@ -40,8 +41,10 @@ class ConfigManager:
         with open(self.config_file, 'r', encoding='utf-8') as file:
             config = {}
             for line in file:
-                key, value = line.strip().split('=')
-                config[key] = value
+                if not line.strip() or line.startswith('#'):
+                    continue
+                key, value = line.strip().split('=', 1)
+                config[key.strip()] = value.strip()
         return config
 
     def get(self, key, default=None):
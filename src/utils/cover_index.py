@@ -0,0 +1,232 @@
+"""
+Module that recognizes the same cover art served under different URLs.
+
+A single and its album, or the regional releases of an album, often share their artwork
+under different image URLs. Covers are identified by a perceptual hash (dHash) and
+their colors, so that identical or nearly identical images map to the same canonical
+cover ID, and the work derived from a cover (its palette, its backgrounds) is done
+once for all of them.
+"""
+
+import io
+import json
+import os
+import threading
+
+#pylint: disable=import-error
+from PIL import Image
+
+
+def fingerprint(data, size=8):
+    """
+    Compute the difference hash and the colors of an image.
+
+    The image is shrunk to (size + 1) x size gray pixels, and every bit of the hash tells
+    whether a pixel is brighter than its right neighbour. The hash ignores colors, and
+    is the same for every flat or smooth image, so the mean color of the four quarters
+    of the image is kept with it. JPEG covers are decoded at a reduced scale (about
+    64px), so this costs a fraction of a full decode.
+
+    Args:
+        data (bytes): The encoded image.
+        size (int, optional): The side of the hash grid; the hash has size * size bits.
+            Defaults to 8.
+
+    Returns:
+        tuple: The hash (int), and the colors (a tuple of 12 channel values, the RGB of
+            the top-left, top-right, bottom-left and bottom-right quarters).
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (64, 64))
+    image = image.convert("RGB")
+    pixels = list(image.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(size):
+        for column in range(size):
+            left = pixels[row * (size + 1) + column]
+            right = pixels[row * (size + 1) + column + 1]
+            value = value << 1 | (left > right)
+
+    colors = tuple(channel for pixel in image.resize((2, 2), Image.BOX).getdata()
+                   for channel in pixel)
+    return value, colors
+
+
+class CoverIndex:
+    """
+    A class that maps image URLs to canonical cover IDs, persisted on disk.
+
+    Two images are the same cover if their hashes differ by at most `threshold` bits
+    and the colors of their quarters by at most `color_tolerance`.
+
+    Attributes:
+        path (str): The JSON file where the index is stored.
+        threshold (int): The maximum number of different bits between the hashes
+            of two images of the same cover.
+        color_tolerance (int): The maximum difference of a color channel between the
+            quarters of two images of the same cover.
+        urls (dict): The cover ID of every image URL seen so far.
+        covers (dict): The hash and the colors of every cover ID, see `fingerprint`.
+        persist (bool): Whether new URLs are written to disk; if not, they are kept
+            in `added` (see `take_added`).
+        added (dict): The URLs seen since the last `take_added`, when not persisted.
+    """
+
+    # Indexes written before the colors were part of the covers are rebuilt
+    VERSION = 2
+
+    def __init__(self, path="ImageCache/cover_index.json", threshold=4, color_tolerance=32,
+                 persist=True):
+        """
+        Initialize the index, loading it from disk.
+
+        Args:
+            path (str, optional): The JSON file where the index is stored.
+                Defaults to "ImageCache/cover_index.json".
+            threshold (int, optional): The maximum Hamming distance between the hashes
+                of two images of the same cover. Defaults to 4 (out of 64 bits).
+            color_tolerance (int, optional): The maximum difference of a color channel
+                (0-255) between the quarters of two images of the same cover.
+                Defaults to 32.
+            persist (bool, optional): Write the new URLs to disk. Defaults to True; pass
+                False when several processes share the file, and `merge` their URLs
+                in one of them.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.color_tolerance = color_tolerance
+        self.persist = persist
+        self.urls = {}
+        self.covers = {}
+        self.added = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def get(self, image_url):
+        """
+        Get the ID of the cover of a URL already seen, without the image.
+
+        Args:
+            image_url (str): The URL of the image.
+
+        Returns:
+            str: The ID of the cover, or None if the URL was never seen.
+        """
+        with self.lock:
+            return self.urls.get(image_url)
+
+    def cover_id(self, image_url, data):
+        """
+        Get the canonical ID of a cover.
+
+        Args:
+            image_url (str): The URL of the image.
+            data (bytes): The encoded image, hashed if the URL was never seen.
+
+        Returns:
+            str: The ID of the cover, shared by all the URLs of the same artwork.
+        """
+        with self.lock:
+            if image_url in self.urls:
+                return self.urls[image_url]
+
+        cover = fingerprint(data)
+
+        with self.lock:
+            cover_id = self.add(image_url, cover)
+            if self.persist:
+                self.save()
+            else:
+                self.added[image_url] = cover
+        return cover_id
+
+    def add(self, image_url, cover):
+        """
+        Map a URL to the cover matching its fingerprint, or to a new one; hold the lock.
+
+        Args:
+            image_url (str): The URL of the image.
+            cover (tuple): The hash and the colors of the image, see `fingerprint`.
+
+        Returns:
+            str: The ID of the cover.
+        """
+        cover_id = self.find(*cover)
+        if cover_id is None:
+            value, colors = cover
+            cover_id = f"{value:016x}-{bytes(colors).hex()}"
+            self.covers[cover_id] = cover
+        self.urls[image_url] = cover_id
+        return cover_id
+
+    def take_added(self):
+        """
+        Get the URLs seen since the last call, when the index is not persisted.
+
+        Returns:
+            dict: The hash and the colors of every new URL, keyed by URL.
+        """
+        with self.lock:
+            added, self.added = self.added, {}
+        return added
+
+    def merge(self, covers):
+        """
+        Add the URLs seen by another index (see `take_added`), and save the index.
+
+        Args:
+            covers (dict): The hash and the colors of every URL, keyed by URL.
+        """
+        with self.lock:
+            covers = {image_url: cover for image_url, cover in covers.items()
+                      if image_url not in self.urls}
+            for image_url, cover in covers.items():
+                self.add(image_url, tuple(cover))
+            if covers and self.persist:
+                self.save()
+
+    def find(self, value, colors):
+        """
+        Find the cover whose hash is the closest to the given one, among the covers
+        within the threshold and of the same colors.
+
+        Args:
+            value (int): The hash of an image.
+            colors (tuple): The colors of its quarters, see `fingerprint`.
+
+        Returns:
+            str: The ID of the cover, or None if no cover is close enough.
+        """
+        best_id, best_distance = None, self.threshold + 1
+        for cover_id, (cover_hash, cover_colors) in self.covers.items():
+            distance = (value ^ cover_hash).bit_count()
+            if distance < best_distance and all(
+                    abs(a - b) <= self.color_tolerance for a, b in zip(colors, cover_colors)):
+                best_id, best_distance = cover_id, distance
+        return best_id
+
+    def load(self):
+        """Load the index from disk, starting empty if it doesn't exist or is invalid."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get("version") != self.VERSION:
+                raise ValueError("outdated cover index")
+            self.covers = {cover_id: (int(value, 16), tuple(bytes.fromhex(colors)))
+                           for cover_id, (value, colors) in index["covers"].items()}
+            self.urls = {image_url: cover_id for image_url, cover_id in index["urls"].items()
+                         if cover_id in self.covers}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.urls, self.covers = {}, {}
+
+    def save(self):
+        """Write the index to disk atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.VERSION,
+                       "covers": {cover_id: [f"{value:016x}", bytes(colors).hex()]
+                                  for cover_id, (value, colors) in self.covers.items()},
+                       "urls": self.urls}, f)
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,180 @@
+"""
+Module with the events exchanged by the threads of the program, and the bus carrying them.
+
+The Spotify poller, the CLI and the wallpaper thread don't share mutable state: the
+poller publishes the playback changes, the CLI its commands, the render worker the
+wallpapers it shows, and the wallpaper thread reacts to them as soon as they arrive.
+"""
+
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import queue
+import threading
+import time
+
+
+@dataclass(frozen=True)
+class TrackChanged:
+    """
+    A song started playing: a new track, or the same one after a pause.
+
+    Attributes:
+        song_details (dict): The details of the song, see `SpotifyClient.get_current_song`.
+        poll_span (dict): The poll that detected the change, see `utils.tracing`.
+        detected_at (float): When the change was detected (`time.perf_counter()`).
+    """
+
+    song_details: dict
+    poll_span: dict = None
+    detected_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass(frozen=True)
+class ProgressChanged:
+    """
+    The position in the song playing jumped (the user seeked).
+
+    Attributes:
+        song_id (str): The ID of the song.
+        progress_ms (int): The new position, in milliseconds.
+        detected_at (float): When the position was read (`time.perf_counter()`).
+    """
+
+    song_id: str
+    progress_ms: int
+    detected_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass(frozen=True)
+class PlaybackPaused:
+    """The playback stopped, or nothing is playing anymore."""
+
+
+@dataclass(frozen=True)
+class ModesChanged:
+    """
+    The enabled wallpaper modes changed.
+
+    Attributes:
+        modes (tuple): The modes now enabled.
+    """
+
+    modes: tuple
+
+
+@dataclass(frozen=True)
+class RenderDone:
+    """
+    A wallpaper was put on screen.
+
+    Attributes:
+        song_id (str): The ID of the song.
+        mode (str): The mode of the wallpaper.
+        path (str): The image of the wallpaper.
+        recipe (dict): The recipe of the wallpaper, or None if it can't be rendered again.
+        render_time (float): The time from the track change to the wallpaper on screen,
+            in seconds, or None if it was not rendered for a track change.
+    """
+
+    song_id: str
+    mode: str
+    path: str
+    recipe: dict = None
+    render_time: float = None
+
+
+@dataclass(frozen=True)
+class SaveRequested:
+    """
+    The wallpaper on screen must be saved as favorite.
+
+    Attributes:
+        reply (Future): Resolved with True once the favorite is saved, False if there
+            is nothing to save.
+    """
+
+    reply: Future = field(default_factory=Future)
+
+
+class Subscription:
+    """
+    A queue of the events of some types, read by a single thread.
+
+    Attributes:
+        event_types (tuple): The types of the events received.
+    """
+
+    def __init__(self, event_types):
+        """
+        Initialize the subscription.
+
+        Args:
+            event_types (tuple): The types of the events received.
+        """
+        self.event_types = event_types
+        self.queue = queue.SimpleQueue()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next event.
+
+        Args:
+            timeout (float, optional): The time to wait in seconds. Waits forever if not given.
+
+        Returns:
+            The event, or None if none arrived in time.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """
+    A class that delivers the published events to the subscriptions of their type.
+
+    Publishing never blocks: every subscription has its own unbounded queue, and
+    events are delivered in the order they were published.
+    """
+
+    def __init__(self):
+        self.subscriptions = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, *event_types):
+        """
+        Start receiving the events of the given types.
+
+        Args:
+            *event_types (type): The types of the events to receive.
+
+        Returns:
+            Subscription: The queue of the events.
+        """
+        subscription = Subscription(event_types)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop receiving events.
+
+        Args:
+            subscription (Subscription): The subscription to close.
+        """
+        with self.lock:
+            self.subscriptions.remove(subscription)
+
+    def publish(self, event):
+        """
+        Deliver an event to the subscriptions of its type.
+
+        Args:
+            event: The event.
+        """
+        with self.lock:
+            for subscription in self.subscriptions:
+                if isinstance(event, subscription.event_types):
+                    subscription.queue.put(event)
@@ -0,0 +1,215 @@
+"""
+Module with the index of the favorite wallpapers saved in 'savedConfigs'.
+"""
+
+import json
+import os
+import threading
+
+from utils.render_cache import store_file
+
+
+class FavoritesIndex:
+    """
+    A class that indexes the favorite wallpapers by song ID.
+
+    Favorites are saved as recipes (see `WallpaperGenerator.make_recipe`): a few hundred
+    bytes of JSON instead of a full resolution image, rendered again on demand for the
+    current display. Wallpapers saved as images (by older versions, by hand or by the
+    waveform mode, which can't be rendered again) are still supported.
+
+    The index is kept in memory and persisted as `index.json` next to the wallpapers.
+    The folder is only rescanned when its modification time changes (a wallpaper was
+    added or removed by hand, or by another process), so checking for changes costs a
+    single `stat` and lookups don't depend on the number of favorites.
+
+    Every wallpaper is stored as `<song_id>-<mode>.png`; only the last '-' separates
+    the mode, so IDs containing '-' or '.' are parsed correctly.
+
+    Attributes:
+        directory (str): The folder of the favorite wallpapers.
+        entries (dict): The favorites, keyed by song ID, as {"mode": ..., "recipe": ...}
+            or, for the ones saved as images, {"mode": ..., "path": ...}.
+    """
+
+    def __init__(self, directory="src/savedConfigs"):
+        """
+        Initialize the index, loading it from the folder.
+
+        Args:
+            directory (str, optional): The folder of the favorite wallpapers.
+                Defaults to "src/savedConfigs".
+        """
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.entries = {}
+        self.mtime = None
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def __contains__(self, song_id):
+        with self.lock:
+            return song_id in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, song_id):
+        """
+        Get the favorite wallpaper of a song.
+
+        Args:
+            song_id (str): The ID of the song.
+
+        Returns:
+            dict: The mode and the recipe or the path of the wallpaper,
+                or None if the song has none.
+        """
+        with self.lock:
+            return self.entries.get(song_id)
+
+    def file_path(self, song_id, mode):
+        """
+        Get the path where the favorite wallpaper of a song is stored.
+
+        Args:
+            song_id (str): The ID of the song.
+            mode (str): The mode of the wallpaper.
+
+        Returns:
+            str: The path of the wallpaper.
+        """
+        return os.path.join(self.directory, f"{song_id}-{mode}.png")
+
+    def refresh(self):
+        """
+        Reload the index if the folder changed since the last time.
+
+        Returns:
+            bool: True if the index was reloaded.
+        """
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            os.makedirs(self.directory, exist_ok=True)
+            mtime = os.stat(self.directory).st_mtime_ns
+
+        with self.lock:
+            if mtime == self.mtime:
+                return False
+
+            stored = self.read_index()
+            names = set(os.listdir(self.directory))
+
+            # Forget the wallpapers that were deleted, add the ones copied by hand
+            entries = {song_id: entry for song_id, entry in stored.items()
+                       if "path" not in entry or os.path.basename(entry["path"]) in names}
+            known = {os.path.basename(entry["path"]) for entry in entries.values()
+                     if "path" in entry}
+            for name in names - known:
+                parsed = parse_filename(name)
+                if parsed:
+                    song_id, mode = parsed
+                    entries[song_id] = {"mode": mode,
+                                        "path": os.path.join(self.directory, name)}
+
+            self.entries = entries
+            if entries != stored:
+                self.write_index()
+            self.mtime = os.stat(self.directory).st_mtime_ns
+            return True
+
+    def recipes(self):
+        """
+        Get the favorites saved as recipes.
+
+        Returns:
+            dict: The recipes, keyed by song ID.
+        """
+        with self.lock:
+            return {song_id: entry["recipe"] for song_id, entry in self.entries.items()
+                    if "recipe" in entry}
+
+    def add_recipe(self, song_id, recipe):
+        """
+        Save the recipe of a wallpaper as the favorite of a song, replacing the previous one.
+
+        Args:
+            song_id (str): The ID of the song.
+            recipe (dict): The recipe of the wallpaper.
+        """
+        with self.lock:
+            self.remove_image(self.entries.get(song_id))
+            self.entries[song_id] = {"mode": recipe["mode"], "recipe": recipe}
+            self.write_index()
+            self.mtime = os.stat(self.directory).st_mtime_ns
+
+    def add(self, song_id, mode, image_path):
+        """
+        Save a wallpaper image as the favorite of a song, replacing the previous one.
+
+        Args:
+            song_id (str): The ID of the song.
+            mode (str): The mode of the wallpaper.
+            image_path (str): The wallpaper to save.
+
+        Returns:
+            str: The path of the saved wallpaper.
+        """
+        path = self.file_path(song_id, mode)
+        store_file(image_path, path)
+
+        with self.lock:
+            previous = self.entries.get(song_id)
+            if previous and previous.get("path") != path:
+                self.remove_image(previous)
+
+            self.entries[song_id] = {"mode": mode, "path": path}
+            self.write_index()
+            self.mtime = os.stat(self.directory).st_mtime_ns
+        return path
+
+    @staticmethod
+    def remove_image(entry):
+        """Delete the image of a favorite, if it was saved as an image."""
+        if entry and "path" in entry and os.path.exists(entry["path"]):
+            os.remove(entry["path"])
+
+    def read_index(self):
+        """
+        Read the index file.
+
+        Returns:
+            dict: The favorites stored in the index, empty if it doesn't exist or is invalid.
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def write_index(self):
+        """Write the index file atomically."""
+        temporary_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temporary_path, self.index_path)
+
+
+def parse_filename(name):
+    """
+    Parse the name of a favorite wallpaper.
+
+    Args:
+        name (str): The file name, e.g. "4uLU6hMCjMI75M1A2tKUQC-gradient.png".
+
+    Returns:
+        tuple: The song ID and the mode, or None if the name is not a favorite wallpaper.
+    """
+    stem, extension = os.path.splitext(name)
+    song_id, separator, mode = stem.rpartition("-")
+    if extension != ".png" or not separator or not song_id or not mode:
+        return None
+    return song_id, mode
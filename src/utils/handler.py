@@ -3,66 +3,48 @@ Module for handling the system environment and wallpaper management based on son
 """
 import os
 
+from utils.backends import create_backend
+from utils.favorites import FavoritesIndex
+from utils.tracing import tracer
+
+
 class Handler:
     """
     A class that handles the system environment and wallpaper management based on song changes.
 
-    The Handler class is responsible for detecting the system environment, checking song status,
-    managing wallpaper settings, and restoring or setting wallpapers based on current song changes.
+    The Handler class is responsible for checking song status, managing wallpaper settings,
+    and restoring or setting wallpapers based on current song changes, through a
+    wallpaper backend (see `utils.backends`).
 
     Attributes:
         song_id (str): The ID of the currently playing song.
         playing (bool): A flag indicating whether the song is currently playing or paused.
-        available_environments (list): A list of available environments to interact with.
-        favorites (dict): A dictionary of saved favorite album configurations.
-        environment (str): The current environment name.
-        command (str): The command used to change the wallpaper.
-        original_wallpaper (str): The original wallpaper to restore.
+        favorites (FavoritesIndex): The index of the favorite wallpapers, by song ID.
+        backend (WallpaperBackend): The backend used to change the wallpaper.
+        environment (str): The name of the backend.
     """
 
     # pylint: disable=C0301
-    def __init__(self):
+    def __init__(self, backend=None):
         """
         Initialize the Handler instance.
 
         This method sets up the default values for `song_id` and `playing`,
-        checks the available environment
-        loads the favorites, and determines the current environment, 
-        command, and original wallpaper.
-        """
-        self.song_id = None
-        self.playing = False
-
-        self.available_environments = [
-            {'envName': 'gnome',
-             'testCommand': 'gnome-session',
-             'command': 'gsettings set org.gnome.desktop.background picture-uri ' if ('dark' if 'dark' in (os.popen("gsettings get org.gnome.desktop.interface color-scheme").read()) else 'light') == 'light' else 'gsettings set org.gnome.desktop.background picture-uri-dark ',
-             'wallpaperPath': os.popen("gsettings get org.gnome.desktop.background picture-uri-dark").read() if 'dark' in (os.popen("gsettings get org.gnome.desktop.interface gtk-theme").read()) else os.popen("gsettings get org.gnome.desktop.background picture-uri").read()
-             }
-        ]
-        self.favorites = self.load_favorites()
-        self.environment, self.command, self.original_wallpaper = self.get_environment()
+        loads the favorites, and detects the wallpaper backend if none is given.
 
-        if not self.environment or not self.command or not self.original_wallpaper:
-            raise EnvironmentError("Environment not supported")
+        Parameters:
+            backend (WallpaperBackend, optional): The backend used to change the wallpaper.
+                Detected from the current desktop environment if not given.
 
-    def get_environment(self):
+        Raises:
+            EnvironmentError: If no backend is given and none is available.
         """
-        Detect the current environment (e.g., GNOME).
-
-        This method checks the available environments by running their respective test commands. 
-        If the environment is detected, it returns the environment name, the wallpaper command, 
-        and the original wallpaper path.
+        self.song_id = None
+        self.playing = False
 
-        Returns:
-            tuple: A tuple containing the environment name (str), the wallpaper command (str),
-            and the original wallpaper path (str).
-        """
-        for env in self.available_environments:
-            result = os.popen(env['testCommand']).read().strip()
-            if not result:
-                return env['envName'], env['command'], os.popen("gsettings get org.gnome.desktop.background picture-uri-dark").read().strip() if 'dark' in (os.popen("gsettings get org.gnome.desktop.interface color-scheme").read()) else os.popen("gsettings get org.gnome.desktop.background picture-uri").read()
-        return None, None, None
+        self.favorites = FavoritesIndex()
+        self.backend = backend or create_backend()
+        self.environment = self.backend.name
 
     def previous_song(self):
         """
@@ -116,47 +98,36 @@ class Handler:
         """
         self.playing = "False"
 
-    def load_favorites(self):
-        """
-        Load saved favorite album configurations.
-
-        This method loads previously saved configurations from the `src/savedConfigs` directory
-        and returns a dictionary of album IDs and modes.
-
-        Returns:
-            dict: A dictionary where keys are album IDs and values are the modes.
-        """
-        path = "src/savedConfigs"
-
-        if not os.path.exists(path):
-            os.makedirs(path)
-            return []
-
-        files = os.listdir(path)
-        favorites = {}
-
-        for file in files:
-            album_id, mode = file.split(".")[0].split("-")
-            favorites[album_id] = mode
-
-        return favorites
-
     def restore_wallpaper(self):
         """
         Restore the original wallpaper.
 
         This method restores the desktop wallpaper to the original one before any song change.
+        Nothing happens if the original wallpaper is already set.
         """
-        os.system(f"{self.command}{self.original_wallpaper}")
+        self.backend.restore()
 
-    def set_wallpaper(self, path="ImageCache/finalImage.png"):
+    def set_wallpaper(self, path=None, quiet=False):
         """
         Set a new wallpaper based on the current song.
 
         This method updates the desktop wallpaper to the generated image associated with the current song.
-        """
-        print(f"{self.command}" + os.path.abspath(path))
-        os.system(f"{self.command}" + os.path.abspath(path))
+        Nothing happens if the same image, unmodified, is already set.
+
+        Parameters:
+            path (str, optional): The image to set. Defaults to "ImageCache/finalImage.png".
+            quiet (bool, optional): Don't print the change, e.g. for the progress frames.
+                Defaults to False.
+        """
+        path = path or "ImageCache/finalImage.png"
+        with tracer.span("set_wallpaper"):
+            if self.backend.apply(path) and not quiet:
+                print(f"Wallpaper set to {os.path.abspath(path)}")
+
+    def close(self):
+        """Release the resources of the wallpaper backend."""
+        print(self.backend.describe())
+        self.backend.close()
 
     def same_song(self, song_id):
         """
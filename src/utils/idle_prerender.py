@@ -0,0 +1,148 @@
+"""
+Module that renders the most played tracks in background while the wallpaper is idle.
+
+It is the runtime counterpart of the offline `prerender.py` script: the wallpapers of
+the tracks played the most often are ready in the render cache before they are played
+again.
+"""
+
+import os
+import threading
+import traceback
+
+from utils.cancellation import CancelToken, RenderCancelled, activate
+
+# Modes that can be rendered offline (the waveform needs the Spotify audio analysis)
+PRERENDER_MODES = ["gradient", "blurred", "albumImage", "controllerImage", "lyric"]
+
+
+class IdlePrerenderer:
+    """
+    A class that renders the most played tracks in background while the wallpaper is idle.
+
+    The wallpapers missing from the render cache are rendered one at a time, in a
+    low-priority thread, with a generator of their own that shares the cover index and
+    the lyric library of the main one. Its lyric lookups have a worker of their own,
+    so they never queue ahead of the ones of the wallpaper shown, and its renders are
+    left out of the render times and of the quality controller. A pass is cancelled as soon as the playback changes,
+    and only starts again once the history, the modes or the display changed.
+
+    Attributes:
+        generator (WallpaperGenerator): The generator of the background renders.
+        render_cache (RenderCache): The cache where the wallpapers are stored.
+        history (PlayHistory): The plays of the tracks.
+        count (int): The number of most played tracks rendered.
+        token (CancelToken): The token of the pass running, or None.
+        done (tuple): The history size, the modes and the display of the last pass
+            that completed.
+        thread (Thread): The thread of the last pass, or None.
+    """
+
+    def __init__(self, generator, render_cache, history, count=20):
+        """
+        Initialize the pre-renderer.
+
+        Args:
+            generator (WallpaperGenerator): The generator of the background renders,
+                not used by any other thread.
+            render_cache (RenderCache): The cache where the wallpapers are stored.
+            history (PlayHistory): The plays of the tracks.
+            count (int, optional): The number of most played tracks rendered.
+                Defaults to 20.
+        """
+        self.generator = generator
+        self.render_cache = render_cache
+        self.history = history
+        self.count = count
+        self.token = None
+        self.done = None
+        self.thread = None
+
+    def start(self, modes):
+        """
+        Start a pass in background, unless one is running or nothing changed since the last.
+
+        Args:
+            modes (tuple): The modes enabled; the ones that need the playback
+                (e.g. the waveform) are left out.
+        """
+        key = (self.history.plays, tuple(modes), tuple(self.generator.get_display()))
+        if not self.count or key == self.done or (self.thread and self.thread.is_alive()):
+            return
+
+        self.token = CancelToken()
+        self.thread = threading.Thread(target=self.run, args=(self.token, key),
+                                       name="prerender", daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        """Stop the pass running at its next stage, if any."""
+        if self.token is not None:
+            self.token.cancel()
+
+    def close(self):
+        """Stop the pass running and release the generator."""
+        self.cancel()
+        if self.thread:
+            self.thread.join()
+        self.generator.close()
+
+    def run(self, token, key):
+        """
+        Render the missing wallpapers of the most played tracks. Runs in the background thread.
+
+        Args:
+            token (CancelToken): The token of the pass.
+            key (tuple): The history size, the modes and the display of the pass.
+        """
+        try:
+            # Leave the CPU to the wallpaper on screen (Linux sets it per thread)
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+        display = key[2]
+        modes = [mode for mode in key[1] if mode in PRERENDER_MODES]
+        rendered = 0
+        try:
+            with activate(token):
+                for song_details in self.history.most_played(self.count):
+                    for mode in modes:
+                        token.check("fetch")
+                        if self.render_cache.contains(song_details["song_id"], mode, display):
+                            continue
+                        try:
+                            rendered += self.render(song_details, mode)
+                        except RenderCancelled:
+                            raise
+                        #pylint: disable=broad-exception-caught
+                        except Exception:
+                            # Keep rendering the next tracks
+                            traceback.print_exc()
+        except RenderCancelled:
+            return
+        finally:
+            if rendered:
+                print(f"Pre-rendered {rendered} wallpapers of the most played tracks")
+
+        self.done = key
+
+    def render(self, song_details, mode):
+        """
+        Render a track in a mode and store the wallpaper in the render cache.
+
+        Args:
+            song_details (dict): The details of the track.
+            mode (str): The wallpaper mode.
+
+        Returns:
+            bool: True if it was rendered, False if it is not available in this mode.
+        """
+        self.generator.set_current_song_id(None)
+        self.generator.set_current_mode(mode)
+        if not self.generator.generate(mode, song_details):
+            return False
+
+        self.render_cache.put(song_details["song_id"], mode, self.generator.get_display(),
+                              self.generator.get_current_image_path(), move=True)
+        return True
@@ -2,10 +2,81 @@
 Module for image processing functions.
 """
 
+import io
 import math
+import os
 from PIL import Image, ImageDraw, ImageFont
 
-def paste_and_save_album_image(bg, cover, display, text):
+from utils.cancellation import checkpoint
+from utils.tracing import tracer
+
+# Where the final wallpaper is saved when no other path is given
+FINAL_IMAGE_PATH = "ImageCache/finalImage.png"
+
+def save_final_image(image, path=None):
+    """
+    Save the final wallpaper image.
+
+    Args:
+        image (Image): The final image.
+        path (str, optional): Where to save the image. Defaults to `FINAL_IMAGE_PATH`.
+    """
+    path = path or FINAL_IMAGE_PATH
+    checkpoint("encode")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with tracer.span("encode"):
+        image.save(path)
+
+def decode_cover(data, target_size=None):
+    """
+    Decode a cover, at a reduced scale if only a smaller size is needed.
+
+    JPEG images can be decoded directly at 1/2, 1/4 or 1/8 of their size, which is
+    much faster than decoding them fully and shrinking them afterwards. The largest
+    reduction that keeps the image at least as large as `target_size` is used; other
+    formats are always decoded fully.
+
+    Parameters:
+        data (bytes): The encoded cover.
+        target_size (tuple, optional): The smallest size (width, height) needed.
+            The cover is decoded at full resolution if not given.
+
+    Returns:
+        Image: The decoded cover, in RGB.
+    """
+    image = Image.open(io.BytesIO(data))
+    if (target_size and image.format == "JPEG"
+            and image.width >= 2 * target_size[0] and image.height >= 2 * target_size[1]):
+        with tracer.span("decode", scale="draft"):
+            image.draft("RGB", target_size)
+            image.load()
+    else:
+        with tracer.span("decode", scale="full"):
+            image.load()
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+def pick_image(images, min_width, default=None):
+    """
+    Pick the smallest variant of a cover that is at least `min_width` pixels wide.
+
+    Parameters:
+        images (list): The variants of the cover, as returned by Spotify
+            (dictionaries with `url`, `width` and `height`).
+        min_width (int): The width needed.
+        default (str, optional): The URL returned if there are no variants.
+
+    Returns:
+        str: The URL of the variant, or the largest one if none is wide enough.
+    """
+    if not images:
+        return default
+
+    candidates = [image for image in images if (image.get("width") or 0) >= min_width]
+    if candidates:
+        return min(candidates, key=lambda image: image["width"])["url"]
+    return max(images, key=lambda image: image.get("width") or 0)["url"]
+
+def paste_and_save_album_image(bg, cover, display, text, output_path=None):
     """
        Paste the album image in the center of the background image and save the final image.
        Args:
@@ -13,6 +84,7 @@ def paste_and_save_album_image(bg, cover, display, text):
            cover (Image): The album image.
            display (tuple): The dimensions of the display.
            text (Image): The text image.
+           output_path (str, optional): Where to save the final image.
     """
 
     width = int(display[0])
@@ -30,7 +102,7 @@ def paste_and_save_album_image(bg, cover, display, text):
     background.paste(bg, (0, 0))
     background.paste(text, (0, 0), mask = text)
 
-    background.save("ImageCache/finalImage.png")
+    save_final_image(background, output_path)
 
 #pylint: disable=too-many-positional-arguments, too-many-arguments
 def generate_text_image(song_title, artist_name, colors, display, position_x=50, position_y=50):
@@ -136,7 +208,7 @@ def find_darkest_color(colors):
     return [colors[1], colors[0]]
 
 # pylint: disable=no-member
-def resize_and_center_image(image, target_width, target_height):
+def resize_and_center_image(image, target_width, target_height, resample=Image.LANCZOS):
     """
     Resizes an image to a target width, and centers it vertically.
 
@@ -144,6 +216,7 @@ def resize_and_center_image(image, target_width, target_height):
         image (Image): The image to resize.
         target_width (int): The target width of the image.
         target_height (int): The target height of the image.
+        resample (int, optional): The resampling filter. Defaults to `Image.LANCZOS`.
 
     Returns:
         Image: The resized and centered image.
@@ -152,7 +225,7 @@ def resize_and_center_image(image, target_width, target_height):
     aspect_ratio = image.width / image.height
     new_height = target_height
     new_width = int(int(aspect_ratio) * int(new_height))
-    resized_image = image.resize((int(new_width), int(new_height)), Image.LANCZOS)
+    resized_image = image.resize((int(new_width), int(new_height)), resample)
 
     target_width = int(target_width)
     # Center the image vertically
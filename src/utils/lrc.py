@@ -0,0 +1,83 @@
+"""
+Module for reading time-synced lyrics in the LRC format.
+
+Every line of an LRC file starts with one or more timestamps, e.g.
+`[01:02.50]Some words`, and the file may have metadata tags such as `[ar:Artist]`
+and `[offset:+200]`. The synced lyric card shows the line matching the playback position.
+"""
+
+import bisect
+import re
+
+# A timestamp: minutes, seconds and an optional fraction (hundredths or milliseconds)
+TIMESTAMP = re.compile(r"\[(\d+):(\d{1,2})(?:[.:](\d{1,3}))?\]")
+OFFSET = re.compile(r"\[offset:\s*([+-]?\d+)\s*\]", re.IGNORECASE)
+
+
+def parse_lrc(text):
+    """
+    Parse LRC lyrics.
+
+    Lines without a timestamp and metadata tags are ignored. The `offset` tag (in
+    milliseconds, positive to show the lines earlier) is applied to every timestamp.
+
+    Args:
+        text (str): The content of the LRC file.
+
+    Returns:
+        list: The lines as (time in milliseconds, text) tuples, sorted by time.
+            An empty text marks an instrumental part.
+    """
+    offset = 0
+    match = OFFSET.search(text)
+    if match:
+        offset = int(match.group(1))
+
+    lines = []
+    for raw_line in text.splitlines():
+        position = 0
+        times = []
+        while True:
+            match = TIMESTAMP.match(raw_line, position)
+            if not match:
+                break
+            minutes, seconds, fraction = match.groups()
+            milliseconds = int((fraction or "0").ljust(3, "0"))
+            times.append(int(minutes) * 60000 + int(seconds) * 1000 + milliseconds)
+            position = match.end()
+
+        words = raw_line[position:].strip()
+        lines.extend((max(0, time - offset), words) for time in times)
+
+    lines.sort(key=lambda line: line[0])
+    return lines
+
+
+def line_at(lines, position_ms):
+    """
+    Find the line sung at a position.
+
+    Args:
+        lines (list): The lines, see `parse_lrc`.
+        position_ms (int): The position in the song, in milliseconds.
+
+    Returns:
+        int: The index of the line, or -1 before the first one.
+    """
+    return bisect.bisect_right([time for time, _ in lines], position_ms) - 1
+
+
+def next_change(lines, position_ms):
+    """
+    Find when the next line starts.
+
+    Args:
+        lines (list): The lines, see `parse_lrc`.
+        position_ms (int): The position in the song, in milliseconds.
+
+    Returns:
+        int: The time of the next line in milliseconds, or None after the last one.
+    """
+    index = line_at(lines, position_ms) + 1
+    return lines[index][0] if index < len(lines) else None
+
@@ -2,25 +2,259 @@
 Module for searching and retrieving song lyrics from Genius.
 """
 
+from collections import Counter
+import functools
 import re
-import io
-import gzip
-import urllib.request
+from html.parser import HTMLParser
 
 import requests
-from bs4 import BeautifulSoup
+
+from utils.metrics import CACHE_HITS, CACHE_MISSES
 
 SEARCH_BASE_URL = "https://genius.com/api/search"
 GENIUS_BASE_URL = "https://genius.com"
 
+REQUEST_HEADERS = {
+    'User-Agent': """Mozilla/5.0 (Windows NT 10.0; Win64; x64)\
+        AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36""",
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+# Size of the chunks read from the lyric page while streaming it
+CHUNK_SIZE = 16 * 1024
+
+# Class prefixes of the lyric containers and of the elements that follow the last one
+LYRICS_CONTAINER_CLASS = "Lyrics__Container"
+LYRICS_END_CLASSES = ("LyricsFooter", "Lyrics__Footer", "RightSidebar")
+
+# The header of a section, on its own line: `[Chorus: Artist]`
+SECTION_HEADER = re.compile(r"\[([^\]]*)\]")
+PUNCTUATION = re.compile(r"[^\w\s]")
+# The same characters in ASCII, removed much faster with `str.translate`
+ASCII_PUNCTUATION = str.maketrans("", "", "".join(c for c in map(chr, range(128))
+                                                  if PUNCTUATION.match(c)))
+
+# The sections shown on the lyric card, by preference
+RELEVANT_SECTIONS = ("chorus", "bridge", "verse")
+
+
+class LyricsContainerParser(HTMLParser):
+    """
+    Incremental HTML parser that only collects the text of the Genius lyric containers.
+
+    Everything outside the `Lyrics__Container` divs is skipped without building a tree.
+    Once the containers have been read and the lyric footer shows up, `done` is set so
+    that the caller can stop feeding (and downloading) the rest of the page.
+
+    Attributes:
+        containers (list): The text of every lyric container found so far.
+        done (bool): True once the end of the lyric section has been reached.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.containers = []
+        self.done = False
+        self._buffer = []
+        self._depth = 0
+        self._excluded_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+
+        attributes = dict(attrs)
+
+        if self._depth:
+            if tag == "br" and not self._excluded_depth:
+                self._buffer.append("\n")
+            elif tag == "div":
+                self._depth += 1
+                # Headers injected inside the container (contributors, translations...)
+                if self._excluded_depth or attributes.get("data-exclude-from-selection"):
+                    self._excluded_depth += 1
+            return
+
+        if tag != "div":
+            return
+
+        classes = (attributes.get("class") or "").split()
+        if (attributes.get("data-lyrics-container") == "true"
+                or any(c.startswith(LYRICS_CONTAINER_CLASS) for c in classes)):
+            self._depth = 1
+            self._buffer = []
+        elif self.containers and any(c.startswith(LYRICS_END_CLASSES) for c in classes):
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if not self._depth or tag != "div":
+            return
+
+        self._depth -= 1
+        if self._excluded_depth:
+            self._excluded_depth -= 1
+
+        if not self._depth:
+            self.containers.append("".join(self._buffer).strip())
+
+    def handle_data(self, data):
+        if self._depth and not self._excluded_depth:
+            self._buffer.append(data)
+
+
+class LyricSections:
+    """
+    The sections of a lyric, split in a single pass.
+
+    A section starts at a header line and ends at the next header or blank line.
+    The lyric is cut at the blank lines with `str.split`; a block is only read line by
+    line if it has a header that is not on its first line.
+
+    Attributes:
+        sections (list): The sections as (label, text) tuples, in order; the label is the
+            lower-case header (e.g. "chorus: artist"), or None for text without one.
+        line_counts (Counter): How many times every line appears, without case
+            and punctuation; counted the first time it is needed.
+    """
+
+    def __init__(self, lyric):
+        """
+        Split a lyric into sections.
+
+        Args:
+            lyric (str): The lyrics of the song.
+        """
+        self.sections = []
+
+        for block in lyric.split("\n\n"):
+            label = None
+            if block.startswith("["):
+                first, _, rest = block.partition("\n")
+                header = SECTION_HEADER.fullmatch(first.rstrip())
+                if header:
+                    label, block = header.group(1).strip().lower(), rest
+            if "\n[" in block or block.startswith("["):
+                self.split_lines(label, block)
+            else:
+                self.add(label, block)
+
+    def split_lines(self, label, block):
+        """Split a block with several headers, line by line."""
+        start = 0
+        for line in block.split("\n"):
+            header = SECTION_HEADER.fullmatch(line.strip()) if line.startswith("[") else None
+            if header:
+                self.add(label, block[:start])
+                label = header.group(1).strip().lower()
+                block, start = block[start + len(line) + 1:], 0
+            else:
+                start += len(line) + 1
+        self.add(label, block)
+
+    def add(self, label, text):
+        """Add a section, unless it is empty."""
+        text = text.strip()
+        if text:
+            self.sections.append((label, text))
+
+    @functools.cached_property
+    def line_counts(self):
+        """Count the lines of all the sections."""
+        text = "\n".join(text for _, text in self.sections).lower()
+        if text.isascii():
+            text = text.translate(ASCII_PUNCTUATION)
+        else:
+            text = PUNCTUATION.sub("", text)
+        return Counter(line for line in map(str.strip, text.split("\n")) if line)
+
+    def first(self, kind):
+        """
+        Find the first section of a kind.
+
+        Args:
+            kind (str): The start of the header, e.g. "chorus".
+
+        Returns:
+            str: The text of the section, or None if the lyric has none.
+        """
+        for label, text in self.sections:
+            if label is not None and label.startswith(kind):
+                return text
+        return None
+
+    def most_repeated(self, count=2):
+        """
+        Find the most repeated lines.
+
+        Args:
+            count (int, optional): The number of lines. Defaults to 2.
+
+        Returns:
+            str: The lines, most repeated first, or None if the lyric has fewer.
+        """
+        lines = self.line_counts.most_common(count)
+        if len(lines) < count:
+            return None
+        return "\n".join(line for line, _ in lines)
+
+
+@functools.lru_cache(maxsize=32)
+def parse_sections(lyric):
+    """
+    Split a lyric into sections, once per lyric.
+
+    Args:
+        lyric (str): The lyrics of the song.
+
+    Returns:
+        LyricSections: The sections, shared by every call with the same lyric.
+    """
+    return LyricSections(lyric)
+
+
+def extract_lyrics(chunks):
+    """
+    Extract the lyrics from an iterable of HTML chunks.
+
+    Chunks are consumed lazily and the iteration stops as soon as the parser has
+    gone past the last lyric container.
+
+    Args:
+        chunks (iterable): The HTML of a Genius song page, as strings.
+
+    Returns:
+        str: The text of the lyric containers, one container per paragraph.
+    """
+    parser = LyricsContainerParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+
+    return "\n".join(parser.containers)
+
+
 class LyricFinderClient:
     """Client for searching and retrieving song lyrics from Genius.
     Attributes:
         session (requests.Session): A session object for making HTTP requests.
+        timeout (float): Timeout in seconds for every request.
+        library (LyricLibrary): The local lyrics checked before Genius, or None.
     """
 
-    def __init__(self):
+    def __init__(self, timeout=10, library=None):
+        """
+        Initialize the client.
+
+        Args:
+            timeout (float, optional): Timeout in seconds for every request to Genius.
+                Defaults to 10.
+            library (LyricLibrary, optional): The local lyrics to check before Genius.
+        """
         self.session = requests.Session()
+        self.timeout = timeout
+        self.library = library
 
     def search_songs(self, query):
         """
@@ -32,7 +266,8 @@ class LyricFinderClient:
             list: A list of song objects.
         """
 
-        response = self.session.get(f"{SEARCH_BASE_URL}?q={query}")
+        response = self.session.get(SEARCH_BASE_URL, params={"q": query},
+                                    timeout=self.timeout)
         if response.status_code != 200:
             raise RuntimeError(f"Error searching for songs. Status code: {response.status_code}")
 
@@ -45,63 +280,30 @@ class LyricFinderClient:
 
     def retrieve_lyric(self, url):
         """Retrieve the lyrics of a song from the given URL.
+
+        The page is streamed through the client's session and fed chunk by chunk to
+        a `LyricsContainerParser`, so the download stops as soon as the lyric
+        containers have been read instead of parsing the whole document.
+
         Args:
             url (str): The URL of the song on Genius.
 
         Returns:
             str: The lyrics of the song
         """
-
-        html = self.get_full_html(url)
-        if not html:
-            return None
-
-        # Parsing dell'HTML per trovare il testo della canzone
-        soup = BeautifulSoup(html, 'html.parser')
-        lyrics_divs = soup.find_all("div", {"class": "Lyrics__Container-sc-1ynbvzw-1"})
-
-        lyrics = []
-        for lyrics_div in lyrics_divs:
-            lyrics.append(lyrics_div.get_text(separator="\n").strip())
-
-        return "\n".join(lyrics)
-
-    def get_full_html(self, url):
-        """
-        Retrieve the full HTML content of a page.
-        
-        Args:
-            url (str): The URL of the page.
-            
-        Returns:
-            str: The full HTML content of the page."""
         try:
-            # Crea un oggetto Request con intestazioni personalizzate
-            req = urllib.request.Request(url, headers={
-                'User-Agent': """Mozilla/5.0 (Windows NT 10.0; Win64; x64)\
-                    AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36""",
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-            })
-            with urllib.request.urlopen(req) as response:
-                # Controlla se la risposta è compressa
-                if response.info().get('Content-Encoding') == 'gzip':
-                    buf = io.BytesIO(response.read())
-                    with gzip.GzipFile(fileobj=buf) as f:
-                        html = f.read()
-                else:
-                    html = response.read()
-
-                return html.decode('utf-8')
-        except urllib.error.HTTPError as e:
-            print(f"HTTP error: {e}")
-            return None
-        except urllib.error.URLError as e:
-            print(f"URL error: {e}")
-            return None
-        except UnicodeDecodeError as e:
-            print(f"Unicode decode error: {e}")
+            with self.session.get(url, headers=REQUEST_HEADERS, stream=True,
+                                  timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    print(f"HTTP error: {response.status_code}")
+                    return None
+
+                # Genius always serves UTF-8, but it doesn't always say so
+                response.encoding = response.encoding or "utf-8"
+                return extract_lyrics(response.iter_content(chunk_size=CHUNK_SIZE,
+                                                            decode_unicode=True))
+        except requests.exceptions.RequestException as e:
+            print(f"Error retrieving lyric: {e}")
             return None
 
     def get_lyric(self, query):
@@ -136,37 +338,37 @@ class LyricFinderClient:
         print("Testo non trovato.")
         return None
 
+    def find_lyric(self, artist_name, song_title):
+        """Get the lyrics of a song from the local library, or from Genius if it isn't there.
+        Args:
+            artist_name (str): The name of the artist.
+            song_title (str): The title of the song.
+
+        Returns:
+            str: The lyrics of the song, or None if not found."""
+        if self.library is not None:
+            # A miss before the library is indexed would go to Genius, and be kept
+            self.library.wait_until_indexed()
+            lyric = self.library.get_lyric(artist_name, song_title)
+            if lyric:
+                CACHE_HITS.labels(cache="lyric_library").inc()
+                return lyric
+            CACHE_MISSES.labels(cache="lyric_library").inc()
+
+        return self.get_lyric(artist_name + " " + song_title)
+
     def find_most_relevant_part(self, lyric):
-        """Trova la parte più rilevante del testo basata sul chorus escludendo altre sezioni."""
-        # Regex to find the chorus
-        chorus_pattern = re.compile(r'\[Chorus[^\]]*?\](.*?)(?=\[|\n\n|$)',
-                                    re.IGNORECASE | re.DOTALL)
-
-        match = chorus_pattern.search(lyric)
-        if match:
-            chorus_lyrics = match.group(1).strip()
-            return self.reduce_if_double(chorus_lyrics)
-
-        # If no chorus is found, look for a bridge
-        bridge_pattern = re.compile(
-            r'\[Bridge.*?\](.*?)(?:\[(?!Bridge).*?\]|\n\n|$)',
-                re.IGNORECASE | re.DOTALL)
-        bridge_match = bridge_pattern.search(lyric)
-        if bridge_match:
-            bridge_lyrics = bridge_match.group(1).strip()
-            return self.reduce_if_double(bridge_lyrics)
-
-        # If no bridge is found, look for a verse
-        verse_pattern = re.compile(
-            r'\[Verse.*?\](.*?)(?:\[(?!Verse).*?\]|\n\n|$)',
-              re.IGNORECASE | re.DOTALL)
-        verse_match = verse_pattern.search(lyric)
-        if verse_match:
-            verse_lyrics = verse_match.group(1).strip()
-            return self.reduce_if_double(verse_lyrics)
-
-        # If no verse is found, look for the most repeated section
-        repeated_section = self.find_repeated_section(lyric)
+        """Trova la parte più rilevante del testo basata sul chorus escludendo altre sezioni.
+
+        The lyric is split into sections once (see `parse_sections`); the chorus is
+        preferred, then the bridge, the verse and the most repeated lines."""
+        sections = parse_sections(lyric)
+        for kind in RELEVANT_SECTIONS:
+            text = sections.first(kind)
+            if text:
+                return self.reduce_if_double(text)
+
+        repeated_section = sections.most_repeated()
         if repeated_section:
             return self.reduce_if_double(repeated_section)
 
@@ -180,24 +382,7 @@ class LyricFinderClient:
         Returns:
             str: The two most repeated phrases.
         """
-        # Remove punctuation and convert to lowercase
-        clean_lyric = re.sub(r'[^\w\s]', '', lyric).lower()
-
-        # Divide lyric into phrases
-        phrases = clean_lyric.split('\n')
-
-        # Count the number of occurrences of each phrase
-        phrase_counts = {}
-        for phrase in phrases:
-            phrase_counts[phrase] = phrase_counts.get(phrase, 0) + 1
-
-        # Order phrases by count
-        sorted_phrases = sorted(phrase_counts, key=phrase_counts.get, reverse=True)
-
-        # Return the two most repeated phrases
-        if len(sorted_phrases) >= 2:
-            return sorted_phrases[0] + '\n' + sorted_phrases[1]
-        return None
+        return parse_sections(lyric).most_repeated()
 
     def reduce_if_double(self, lyric):
         """Reduce the lyric to half if the two halves are the same.
@@ -0,0 +1,430 @@
+"""
+Module that looks up lyrics in a local folder of `.txt` and `.lrc` files.
+
+The files are named `<artist> - <title>.<ext>`, or `<artist>/<title>.<ext>`, anywhere
+in the folder. Their names are indexed in a SQLite database keyed by normalized artist
+and title, and by the trigrams (three-character substrings) of both, so a lookup is a
+couple of indexed queries however large the library is, and still finds the files
+whose names differ by a few typos.
+The index is refreshed incrementally: only the folders whose modification time changed
+are listed again, since adding, removing or renaming a file changes the time of its
+folder. Refreshes run in a background thread with their own connection, so lookups are
+served from the current index meanwhile. Contents are not indexed; files are read when
+they are found.
+"""
+
+import collections
+import difflib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from utils.lrc import parse_lrc
+
+EXTENSIONS = (".lrc", ".txt")
+
+# Parts of the titles that differ between Spotify and the file names
+BRACKETS = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+VERSION_SUFFIX = re.compile(r"\s+-\s+.*\b(remaster(ed)?|version|edit|live|mix|mono|stereo)\b.*$",
+                            re.IGNORECASE)
+FEATURING = re.compile(r"\s+(feat|ft|featuring)\.?\s.*$", re.IGNORECASE)
+
+# Bumped when the tables change; older indexes are dropped and built again
+SCHEMA_VERSION = 2
+
+# The number of closest files by trigrams compared to the song
+TRIGRAM_CANDIDATES = 50
+
+# The number of trigram rows read by a lookup, the rarest trigrams of the song first:
+# the common ones ("the", "ove") match most of the files and tell nothing apart
+TRIGRAM_ROWS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    folder TEXT,
+    artist TEXT,
+    title TEXT
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+CREATE INDEX IF NOT EXISTS files_artist ON files (artist, title);
+CREATE INDEX IF NOT EXISTS files_title ON files (title);
+CREATE TABLE IF NOT EXISTS trigrams (
+    trigram TEXT,
+    file INTEGER,
+    PRIMARY KEY (trigram, file)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trigram_counts (
+    trigram TEXT PRIMARY KEY,
+    count INTEGER
+) WITHOUT ROWID;
+"""
+
+
+def normalize(name):
+    """
+    Normalize an artist or a title, so that the same song has the same key everywhere.
+
+    Case, accents, punctuation and spacing are ignored, and so are the parts of the
+    titles that only name a version (`(Remastered 2011)`, `- Radio Edit`, `feat. X`).
+
+    Args:
+        name (str): The artist or the title.
+
+    Returns:
+        str: The key.
+    """
+    name = FEATURING.sub("", VERSION_SUFFIX.sub("", BRACKETS.sub(" ", name)))
+    name = unicodedata.normalize("NFKD", name.casefold().replace("&", " and "))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", name).split())
+
+
+def trigrams(text):
+    """
+    Get the trigrams of a normalized name, with its ends marked by spaces.
+
+    Args:
+        text (str): The name, see `normalize`.
+
+    Returns:
+        set: The three-character substrings.
+    """
+    text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def split_name(folder, name):
+    """
+    Get the artist and the title of a lyric file from its path.
+
+    Args:
+        folder (str): The folder of the file, relative to the library.
+        name (str): The name of the file, without extension.
+
+    Returns:
+        tuple: The normalized artist and title, or None if the name has no artist.
+    """
+    artist, separator, title = name.partition(" - ")
+    if not separator:
+        # `<artist>/<title>.<ext>`
+        artist, title = os.path.basename(folder), name
+    if not artist or not title:
+        return None
+    return normalize(artist), normalize(title)
+
+
+class LyricLibrary:
+    """
+    A class that finds the lyric files of the songs in a local folder.
+
+    Attributes:
+        directory (str): The folder of the lyric files.
+        path (str): The SQLite database of the index.
+        refresh_interval (float): The minimum time between two refreshes, in seconds,
+            or None to never refresh the index in background.
+        threshold (float): The minimum similarity (0 to 1) of a fuzzy match.
+        refreshed_at (float): When the index was last refreshed (`time.monotonic()`),
+            or None if it never was.
+        refresh_thread (Thread): The thread of the last background refresh, or None.
+        indexed (Event): Set once the index is up to date with the folder for the first
+            time in this process (or right away, if it is never refreshed).
+    """
+
+    def __init__(self, directory="lyrics", path="ImageCache/lyric_library.db",
+                 refresh_interval=30, threshold=0.85):
+        """
+        Initialize the library, opening its index.
+
+        Args:
+            directory (str, optional): The folder of the lyric files. Defaults to "lyrics".
+            path (str, optional): The SQLite database of the index.
+                Defaults to "ImageCache/lyric_library.db".
+            refresh_interval (float, optional): The minimum time between two refreshes
+                triggered by the lookups, in seconds; None never refreshes the index
+                in background (e.g. read by several processes). Defaults to 30.
+            threshold (float, optional): The minimum similarity of a fuzzy match.
+                Defaults to 0.85.
+        """
+        self.directory = directory
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.threshold = threshold
+        self.refreshed_at = None
+        self.refresh_thread = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.indexed = threading.Event()
+        if refresh_interval is None:
+            self.indexed.set()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Readers are not blocked by the refreshes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self.connection:
+                self.connection.executescript(
+                    "DROP TABLE IF EXISTS folders; DROP TABLE IF EXISTS files;"
+                    "DROP TABLE IF EXISTS trigrams; DROP TABLE IF EXISTS trigram_counts;")
+                self.connection.executescript(SCHEMA)
+                self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def refresh(self):
+        """
+        Bring the index up to date with the folder.
+
+        Every folder is checked with a single `stat`; only the ones that changed since
+        the last refresh are listed again. Folders that disappeared are dropped.
+        The index is updated in a single transaction on a connection of its own, so
+        lookups keep reading the previous index until it is done.
+
+        Returns:
+            int: The number of folders listed again.
+        """
+        try:
+            with self.refresh_lock:
+                listed = self.update_index() if os.path.isdir(self.directory) else 0
+            self.refreshed_at = time.monotonic()
+        finally:
+            # Even if it failed, so that nothing waits forever
+            self.indexed.set()
+        return listed
+
+    def wait_until_indexed(self, timeout=None):
+        """
+        Wait for the first refresh of the index, starting it if needed.
+
+        `find` never waits; call this first from a thread that can, e.g. the lyric
+        worker, so that a song of the library is not missed right after startup.
+
+        Args:
+            timeout (float, optional): The maximum time to wait, in seconds.
+                Defaults to None, until it is done.
+
+        Returns:
+            bool: True if the index was refreshed.
+        """
+        if not self.indexed.is_set():
+            self.refresh_in_background()
+        return self.indexed.wait(timeout)
+
+    def refresh_in_background(self):
+        """Start a refresh in a background thread, unless one is running or disabled."""
+        if self.refresh_interval is None:
+            return
+        with self.lock:
+            if self.refresh_thread is not None and self.refresh_thread.is_alive():
+                return
+            self.refresh_thread = threading.Thread(target=self.refresh, name="lyric-library",
+                                                   daemon=True)
+            self.refresh_thread.start()
+
+    def update_index(self):
+        """
+        Update the index with the folders that changed, see `refresh`.
+
+        Returns:
+            int: The number of folders listed again.
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                stored = dict(connection.execute("SELECT path, mtime_ns FROM folders"))
+                seen = set()
+                listed = 0
+                pending = [("", None)]
+                while pending:
+                    folder, parent = pending.pop()
+                    try:
+                        mtime_ns = os.stat(os.path.join(self.directory, folder)).st_mtime_ns
+                    except OSError:
+                        continue
+                    seen.add(folder)
+
+                    if stored.get(folder) == mtime_ns:
+                        children = [row[0] for row in connection.execute(
+                            "SELECT path FROM folders WHERE parent = ?", (folder,))]
+                    else:
+                        children = self.index_folder(connection, folder, parent, mtime_ns)
+                        listed += 1
+                    pending.extend((child, folder) for child in children)
+
+                for folder in stored.keys() - seen:
+                    connection.execute("DELETE FROM folders WHERE path = ?", (folder,))
+                    self.remove_files(connection, folder)
+        finally:
+            connection.close()
+        return listed
+
+    def index_folder(self, connection, folder, parent, mtime_ns):
+        """
+        List a folder again and replace its files in the index.
+
+        Args:
+            connection (Connection): The connection of the refresh.
+            folder (str): The folder, relative to the library.
+            parent (str): Its parent folder, or None for the library itself.
+            mtime_ns (int): Its modification time.
+
+        Returns:
+            list: Its subfolders, relative to the library.
+        """
+        children = []
+        files = []
+        try:
+            with os.scandir(os.path.join(self.directory, folder)) as entries:
+                for entry in entries:
+                    path = os.path.join(folder, entry.name)
+                    if entry.is_dir():
+                        children.append(path)
+                        continue
+                    name, extension = os.path.splitext(entry.name)
+                    key = split_name(folder, name)
+                    if extension.lower() in EXTENSIONS and key:
+                        files.append((path, folder, *key))
+        except OSError:
+            pass
+
+        self.remove_files(connection, folder)
+        rows = []
+        for path, folder_path, artist, title in files:
+            file_id = connection.execute(
+                "INSERT INTO files (path, folder, artist, title) VALUES (?, ?, ?, ?)",
+                (path, folder_path, artist, title)).lastrowid
+            rows.extend((trigram, file_id) for trigram in trigrams(f"{artist} {title}"))
+        connection.executemany("INSERT INTO trigrams VALUES (?, ?)", rows)
+        connection.executemany(
+            "INSERT INTO trigram_counts VALUES (?, ?) "
+            "ON CONFLICT (trigram) DO UPDATE SET count = count + excluded.count",
+            collections.Counter(trigram for trigram, _ in rows).items())
+        connection.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                           (folder, parent, mtime_ns))
+        return children
+
+    @staticmethod
+    def remove_files(connection, folder):
+        """
+        Remove the files of a folder from the index, with their trigrams.
+
+        Args:
+            connection (Connection): The connection of the refresh.
+            folder (str): The folder, relative to the library.
+        """
+        # The trigrams are found again from the names, rather than by a second index
+        rows = [(trigram, file_id) for file_id, artist, title in connection.execute(
+                    "SELECT id, artist, title FROM files WHERE folder = ?", (folder,))
+                for trigram in trigrams(f"{artist} {title}")]
+        connection.executemany("DELETE FROM trigrams WHERE trigram = ? AND file = ?", rows)
+        connection.executemany(
+            "UPDATE trigram_counts SET count = count - ? WHERE trigram = ?",
+            ((count, trigram)
+             for trigram, count in collections.Counter(trigram for trigram, _ in rows).items()))
+        connection.execute("DELETE FROM files WHERE folder = ?", (folder,))
+
+    def find(self, artist_name, song_title, extensions=EXTENSIONS):
+        """
+        Find the lyric file of a song.
+
+        The file with the same normalized artist and title is preferred; otherwise the
+        most similar one, if it is similar enough, among the files of the same artist,
+        the files with the same title, and the files sharing the most trigrams with the
+        song (typos in both the artist and the title). Between files of the same song,
+        the order of `extensions` decides.
+
+        Args:
+            artist_name (str): The name of the artist.
+            song_title (str): The title of the song.
+            extensions (tuple, optional): The extensions accepted, by preference.
+                Defaults to `.lrc` then `.txt`.
+
+        Returns:
+            str: The path of the file, or None if there is none.
+        """
+        # Never scan on the caller's thread: until the refresh is done, the lookups are
+        # served from the index as it is (empty the very first time)
+        if (self.refresh_interval is not None
+                and (self.refreshed_at is None
+                     or time.monotonic() - self.refreshed_at > self.refresh_interval)):
+            self.refresh_in_background()
+
+        artist, title = normalize(artist_name), normalize(song_title)
+        query = sorted(trigrams(f"{artist} {title}"))
+        with self.lock:
+            counts = self.connection.execute(
+                "SELECT trigram, count FROM trigram_counts "
+                f"WHERE trigram IN ({', '.join('?' * len(query))}) AND count > 0 "
+                "ORDER BY count", query).fetchall()
+            query, rows = [], 0
+            for trigram, count in counts:
+                rows += count
+                if rows > TRIGRAM_ROWS:
+                    break
+                query.append(trigram)
+            candidates = self.connection.execute(
+                "SELECT path, artist, title FROM files WHERE artist = ? OR title = ? "
+                "UNION SELECT path, artist, title FROM files JOIN "
+                "(SELECT file, COUNT(*) AS shared FROM trigrams "
+                f"WHERE trigram IN ({', '.join('?' * len(query))}) "
+                "GROUP BY file ORDER BY shared DESC LIMIT ?) ON files.id = file",
+                (artist, title, *query, TRIGRAM_CANDIDATES)).fetchall()
+
+        best, best_rank = None, None
+        for path, file_artist, file_title in candidates:
+            extension = os.path.splitext(path)[1].lower()
+            if extension not in extensions:
+                continue
+            score = difflib.SequenceMatcher(None, f"{artist} - {title}",
+                                            f"{file_artist} - {file_title}").ratio()
+            if score < self.threshold:
+                continue
+            # The most similar first, then the preferred extensions
+            rank = (score, -extensions.index(extension))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = path, rank
+
+        return os.path.join(self.directory, best) if best else None
+
+    def get_lyric(self, artist_name, song_title):
+        """
+        Read the lyrics of a song from the library.
+
+        The timestamps of the LRC files are dropped.
+
+        Args:
+            artist_name (str): The name of the artist.
+            song_title (str): The title of the song.
+
+        Returns:
+            str: The lyrics, or None if the song is not in the library.
+        """
+        path = self.find(artist_name, song_title)
+        if path is None:
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+            return None
+
+        if path.lower().endswith(".lrc"):
+            text = "\n".join(words for _, words in parse_lrc(text))
+        return text.strip() or None
+
+    def close(self):
+        """Close the index."""
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,149 @@
+"""
+Module for resolving song lyrics in the background, with a deadline.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import requests
+from cachetools import LRUCache
+
+from utils.lyric_finder import LyricFinderClient
+from utils.metrics import CACHE_HITS, CACHE_MISSES
+
+
+class LyricResolver:
+    """
+    A class that looks up lyrics in a background thread.
+
+    Lookups are submitted to a single worker, so a slow Genius never blocks the
+    wallpaper thread: callers wait at most `deadline` seconds and can come back
+    later for the result. The local library, if any, is checked before Genius; it is
+    indexed in background as soon as the resolver starts, and the worker waits for that
+    first index, so a song in the library never falls through to Genius at startup.
+    Resolved lyrics are kept in a small store keyed by song ID, so a song is looked up
+    only once.
+
+    Attributes:
+        deadline (float): Default time in seconds to wait for a lookup.
+        client (LyricFinderClient): The client used to query the library and Genius.
+        lyrics (LRUCache): The lookups, keyed by song ID.
+    """
+
+    def __init__(self, deadline=3, timeout=10, maxsize=100, library=None):
+        """
+        Initialize the resolver.
+
+        Args:
+            deadline (float, optional): Default time in seconds to wait for a lookup.
+                Defaults to 3.
+            timeout (float, optional): Timeout in seconds for every request to Genius.
+                Defaults to 10.
+            maxsize (int, optional): Number of lookups kept in the store. Defaults to 100.
+            library (LyricLibrary, optional): The local lyrics to check before Genius.
+        """
+        self.deadline = deadline
+        self.client = LyricFinderClient(timeout=timeout, library=library)
+        self.lyrics = LRUCache(maxsize)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lyric")
+        if library is not None:
+            library.refresh_in_background()
+
+    def lookup(self, song_id, artist_name, song_title):
+        """
+        Start the lookup of the lyrics of a song, unless it was already started.
+
+        Args:
+            song_id (str): The ID of the song, used as key of the store.
+            artist_name (str): The name of the artist.
+            song_title (str): The title of the song.
+
+        Returns:
+            Future: A future resolving to the most relevant part of the lyrics,
+                or None if no lyrics were found.
+        """
+        with self.lock:
+            future = self.lyrics.get(song_id)
+            if future is None:
+                CACHE_MISSES.labels(cache="lyric").inc()
+                future = self.executor.submit(self.fetch, artist_name, song_title)
+                self.lyrics[song_id] = future
+            else:
+                CACHE_HITS.labels(cache="lyric").inc()
+            return future
+
+    def resolve(self, song_id, artist_name, song_title, deadline=None):
+        """
+        Get the lyrics of a song, waiting at most `deadline` seconds.
+
+        Args:
+            song_id (str): The ID of the song.
+            artist_name (str): The name of the artist.
+            song_title (str): The title of the song.
+            deadline (float, optional): Time in seconds to wait. Defaults to the resolver
+                deadline; pass 0 to only check for a result that is already available.
+
+        Returns:
+            str: The most relevant part of the lyrics, or None if not found.
+
+        Raises:
+            TimeoutError: If the lookup is still running after the deadline.
+        """
+        future = self.lookup(song_id, artist_name, song_title)
+        try:
+            return future.result(timeout=self.deadline if deadline is None else deadline)
+        except TimeoutError:
+            raise
+        #pylint: disable=broad-exception-caught
+        except Exception as e:
+            # No lyrics this time; the next call looks them up again
+            print(f"Error retrieving lyric: {e}")
+            with self.lock:
+                if self.lyrics.get(song_id) is future:
+                    del self.lyrics[song_id]
+            return None
+
+    def is_ready(self, song_id):
+        """
+        Check if the lookup of a song has finished.
+
+        Args:
+            song_id (str): The ID of the song.
+
+        Returns:
+            bool: True if the lookup was started and has finished.
+        """
+        with self.lock:
+            future = self.lyrics.get(song_id)
+        return future is not None and future.done()
+
+    def fetch(self, artist_name, song_title):
+        """
+        Look up the lyrics and extract their most relevant part.
+
+        Runs in the worker thread.
+
+        Args:
+            artist_name (str): The name of the artist.
+            song_title (str): The title of the song.
+
+        Returns:
+            str: The most relevant part of the lyrics in upper case, or None.
+        """
+        try:
+            lyric = self.client.find_lyric(artist_name, song_title)
+        except (RuntimeError, requests.exceptions.RequestException) as e:
+            print(f"Error retrieving lyric: {e}")
+            return None
+
+        if not lyric:
+            return None
+
+        relevant_part = self.client.find_most_relevant_part(lyric)
+        return relevant_part.upper() if relevant_part else None
+
+    def close(self):
+        """Stop the worker and close the client's session."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
@@ -0,0 +1,289 @@
+"""
+Module that exposes the metrics of the program in the Prometheus text format.
+
+The metrics are served over HTTP on localhost only, and only when a port is
+configured (`metrics_port` in creds.txt).
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labels):
+    """Format a dictionary of labels as `{key="value",...}`."""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """
+    Base class of the metrics: a named family of series, one per label combination.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (tuple): The names of the labels of the metric.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def labels(self, **labels):
+        """
+        Get the series with the given label values, creating it if needed.
+
+        Returns:
+            The series, which has the same methods as an unlabelled metric.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            if key not in self.series:
+                self.series[key] = self.new_series()
+            return self.series[key]
+
+    def new_series(self):
+        """Create the value of a new series."""
+        raise NotImplementedError
+
+    def samples(self):
+        """
+        Get the samples of every series.
+
+        Returns:
+            list: Tuples of (suffix, labels, value).
+        """
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Render the metric in the Prometheus text format.
+
+        Returns:
+            str: The lines describing the metric.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {value}")
+        return "\n".join(lines)
+
+
+class _CounterSeries:
+    """The value of a counter series."""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increase the counter."""
+        with self.lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    """A counter, a value that only goes up."""
+
+    kind = "counter"
+
+    def new_series(self):
+        return _CounterSeries()
+
+    def inc(self, amount=1):
+        """Increase the unlabelled counter."""
+        self.labels().inc(amount)
+
+    def samples(self):
+        with self.lock:
+            series = list(self.series.items())
+        return [("", dict(zip(self.labelnames, key)), value.value) for key, value in series]
+
+
+class _HistogramSeries:
+    """The buckets, sum and count of a histogram series."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """Record an observation."""
+        with self.lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+
+class Histogram(Metric):
+    """A histogram of observed values, such as latencies in seconds."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value):
+        """Record an observation in the unlabelled histogram."""
+        self.labels().observe(value)
+
+    def samples(self):
+        with self.lock:
+            series = list(self.series.items())
+
+        samples = []
+        for key, value in series:
+            labels = dict(zip(self.labelnames, key))
+            with value.lock:
+                for bound, count in zip(self.buckets, value.counts):
+                    samples.append(("_bucket", dict(labels, le=bound), count))
+                samples.append(("_bucket", dict(labels, le="+Inf"), value.count))
+                samples.append(("_sum", labels, value.sum))
+                samples.append(("_count", labels, value.count))
+        return samples
+
+
+class Gauge(Metric):
+    """A gauge whose value is read from a function every time it is collected."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def new_series(self):
+        raise TypeError("Gauges computed from a function have no labels")
+
+    def samples(self):
+        return [("", {}, self.function())]
+
+
+class Registry:
+    """
+    A collection of metrics rendered together.
+
+    Attributes:
+        metrics (list): The registered metrics.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric to the registry.
+
+        Args:
+            metric (Metric): The metric to add.
+
+        Returns:
+            Metric: The same metric, so that it can be assigned.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render all the metrics in the Prometheus text format.
+
+        Returns:
+            str: The exposition text.
+        """
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+def resident_memory():
+    """Get the resident set size of the process, in bytes."""
+    try:
+        with open("/proc/self/statm", 'r', encoding='utf-8') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+REGISTRY = Registry()
+
+TIME_TO_WALLPAPER = REGISTRY.register(Histogram(
+    "syncwall_time_to_wallpaper_seconds",
+    "Time from the detection of a track change to the wallpaper being set."))
+TIME_TO_PLACEHOLDER = REGISTRY.register(Histogram(
+    "syncwall_time_to_placeholder_seconds",
+    "Time from the detection of a track change to the placeholder wallpaper being set."))
+RENDER_TIME = REGISTRY.register(Histogram(
+    "syncwall_render_seconds", "Time spent rendering a wallpaper.", ("mode",)))
+POLL_TIME = REGISTRY.register(Histogram(
+    "syncwall_spotify_poll_seconds", "Latency of the currently-playing requests to Spotify."))
+POLL_ERRORS = REGISTRY.register(Counter(
+    "syncwall_spotify_poll_errors_total", "Failed currently-playing requests to Spotify."))
+CACHE_HITS = REGISTRY.register(Counter(
+    "syncwall_cache_hits_total", "Lookups that found the item in a cache.", ("cache",)))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "syncwall_cache_misses_total", "Lookups that didn't find the item in a cache.", ("cache",)))
+BACKEND_APPLY_TIME = REGISTRY.register(Histogram(
+    "syncwall_backend_apply_seconds", "Time spent by the wallpaper backend applying a change.",
+    ("backend",)))
+RENDERS_CANCELLED = REGISTRY.register(Counter(
+    "syncwall_renders_cancelled_total",
+    "Renders dropped because a newer track started, by the stage they stopped at.",
+    ("stage",)))
+QUALITY_CHANGES = REGISTRY.register(Counter(
+    "syncwall_quality_changes_total",
+    "Changes of the render quality of a mode to fit the render budget.", ("mode", "direction")))
+RESIDENT_MEMORY = REGISTRY.register(Gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes.", resident_memory))
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of `REGISTRY` on /metrics."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer a scrape."""
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Don't print a line for every scrape."""
+
+
+def start_metrics_server(port):
+    """
+    Serve the metrics on http://127.0.0.1:<port>/metrics from a daemon thread.
+
+    Args:
+        port (int): The port to listen on.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call `shutdown()` to stop it.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
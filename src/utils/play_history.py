@@ -0,0 +1,119 @@
+"""
+Module that records the tracks played in a local SQLite database.
+
+Every play stores the details of the song, the mode of its wallpaper and the time the
+wallpaper took, so that the most played tracks can be rendered before they are played
+again, and their wallpapers kept longer in the render cache.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    song_id TEXT NOT NULL,
+    played_at REAL,
+    song_title TEXT,
+    artist_name TEXT,
+    image_url TEXT,
+    images TEXT,
+    song_length INTEGER,
+    mode TEXT,
+    render_time REAL
+);
+CREATE INDEX IF NOT EXISTS plays_song ON plays (song_id);
+"""
+
+
+class PlayHistory:
+    """
+    A class that stores the plays of the tracks.
+
+    Attributes:
+        path (str): The SQLite database of the history.
+        plays (int): The number of plays recorded, to tell when the history changed.
+    """
+
+    def __init__(self, path="ImageCache/history.db"):
+        """
+        Initialize the history, opening its database.
+
+        Args:
+            path (str, optional): The SQLite database of the history.
+                Defaults to "ImageCache/history.db".
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.plays = self.connection.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+
+    def record(self, song_details, mode, render_time=None):
+        """
+        Record the play of a track.
+
+        Args:
+            song_details (dict): The details of the song, see `SpotifyClient.get_current_song`.
+            mode (str): The mode of its wallpaper.
+            render_time (float, optional): The time the wallpaper took, in seconds.
+        """
+        row = (song_details["song_id"], time.time(), song_details.get("song_title"),
+               song_details.get("artist_name"), song_details.get("image_url"),
+               json.dumps(song_details.get("images")), song_details.get("song_length"),
+               mode, render_time)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO plays (song_id, played_at, song_title, artist_name, image_url, "
+                "images, song_length, mode, render_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row)
+            self.plays += 1
+
+    def play_counts(self):
+        """
+        Count the plays of every track.
+
+        Returns:
+            dict: The number of plays, keyed by song ID.
+        """
+        with self.lock:
+            return dict(self.connection.execute(
+                "SELECT song_id, COUNT(*) FROM plays GROUP BY song_id"))
+
+    def most_played(self, count):
+        """
+        Get the most played tracks, the most recently played first on a tie.
+
+        Args:
+            count (int): The number of tracks.
+
+        Returns:
+            list: The details of the songs, as last played.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT p.song_id, p.song_title, p.artist_name, p.image_url, p.images, "
+                "p.song_length FROM (SELECT COUNT(*) AS plays, MAX(id) AS last FROM plays "
+                "GROUP BY song_id ORDER BY plays DESC, last DESC LIMIT ?) AS c "
+                "JOIN plays AS p ON p.id = c.last ORDER BY c.plays DESC, c.last DESC",
+                (count,)).fetchall()
+
+        return [{
+            "song_id": song_id,
+            "song_title": song_title,
+            "artist_name": artist_name,
+            "image_url": image_url,
+            "images": json.loads(images) if images else None,
+            "song_length": song_length,
+        } for song_id, song_title, artist_name, image_url, images, song_length in rows]
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,192 @@
+"""
+Module with opt-in profiling hooks for the wallpaper renders.
+
+Renders can be wrapped in cProfile and/or tracemalloc. Every profiled render dumps
+a `.prof` file (open it with `python -m pstats` or snakeviz) and/or a report of the
+top allocations, named after the song and the mode. Only every Nth render is
+profiled, so the hooks can stay on in production.
+
+The hooks are configured with environment variables, or with the `profile` CLI command:
+    SPOTIFYSYNCWALL_PROFILE=cprofile,tracemalloc
+    SPOTIFYSYNCWALL_PROFILE_EVERY=10
+    SPOTIFYSYNCWALL_PROFILE_DIR=ImageCache/profiles
+"""
+
+from contextlib import contextmanager
+import cProfile
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+
+class RenderProfiler:
+    """
+    A class that profiles one render out of every `every`.
+
+    Attributes:
+        use_cprofile (bool): Whether renders are profiled with cProfile.
+        use_tracemalloc (bool): Whether the allocations of renders are traced.
+        every (int): Profile one render every `every` renders.
+        directory (str): Where the reports are written.
+        top (int): Number of allocation sites listed in the tracemalloc report.
+        renders (int): Number of renders seen so far.
+    """
+
+    #pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(self, use_cprofile=False, use_tracemalloc=False, every=1,
+                 directory="ImageCache/profiles", top=25):
+        """
+        Initialize the profiler.
+
+        Args:
+            use_cprofile (bool, optional): Profile renders with cProfile. Defaults to False.
+            use_tracemalloc (bool, optional): Trace the allocations of renders.
+                Defaults to False.
+            every (int, optional): Profile one render every `every` renders. Defaults to 1.
+            directory (str, optional): Where the reports are written.
+                Defaults to "ImageCache/profiles".
+            top (int, optional): Number of allocation sites in the tracemalloc report.
+                Defaults to 25.
+        """
+        self.use_cprofile = use_cprofile
+        self.use_tracemalloc = use_tracemalloc
+        self.every = max(1, every)
+        self.directory = directory
+        self.top = top
+        self.renders = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls):
+        """
+        Create a profiler configured by the SPOTIFYSYNCWALL_PROFILE* environment variables.
+
+        Returns:
+            RenderProfiler: The profiler, disabled if the variables are not set.
+        """
+        tools = os.environ.get("SPOTIFYSYNCWALL_PROFILE", "").lower().replace(" ", "").split(",")
+        return cls(use_cprofile="cprofile" in tools or "all" in tools,
+                   use_tracemalloc="tracemalloc" in tools or "all" in tools,
+                   every=int(os.environ.get("SPOTIFYSYNCWALL_PROFILE_EVERY", 1)),
+                   directory=os.environ.get("SPOTIFYSYNCWALL_PROFILE_DIR",
+                                            "ImageCache/profiles"))
+
+    def is_enabled(self):
+        """
+        Check if any profiling hook is enabled.
+
+        Returns:
+            bool: True if renders are profiled.
+        """
+        return self.use_cprofile or self.use_tracemalloc
+
+    def configure(self, use_cprofile=None, use_tracemalloc=None, every=None):
+        """
+        Change the configuration of the profiler; arguments left to None are unchanged.
+
+        Args:
+            use_cprofile (bool, optional): Profile renders with cProfile.
+            use_tracemalloc (bool, optional): Trace the allocations of renders.
+            every (int, optional): Profile one render every `every` renders.
+        """
+        with self.lock:
+            if use_cprofile is not None:
+                self.use_cprofile = use_cprofile
+            if use_tracemalloc is not None:
+                self.use_tracemalloc = use_tracemalloc
+            if every is not None:
+                self.every = max(1, every)
+
+    def describe(self):
+        """
+        Describe the current configuration.
+
+        Returns:
+            str: A human readable description.
+        """
+        tools = [name for name, used in (("cprofile", self.use_cprofile),
+                                         ("tracemalloc", self.use_tracemalloc)) if used]
+        if not tools:
+            return "Profiling is off."
+        return (f"Profiling with {' and '.join(tools)} one render every {self.every}, "
+                f"reports in {self.directory}.")
+
+    @contextmanager
+    def profile(self, song_title, mode):
+        """
+        Profile the enclosed render, if it is one of the sampled ones.
+
+        Args:
+            song_title (str): The title of the song, used in the report names.
+            mode (str): The wallpaper mode, used in the report names.
+        """
+        with self.lock:
+            self.renders += 1
+            sampled = self.is_enabled() and self.renders % self.every == 0
+            use_cprofile, use_tracemalloc = self.use_cprofile, self.use_tracemalloc
+
+        if not sampled:
+            yield
+            return
+
+        profiler = cProfile.Profile() if use_cprofile else None
+        started_tracemalloc = use_tracemalloc and not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(10)
+
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+
+            snapshot = tracemalloc.take_snapshot() if use_tracemalloc else None
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+            self.write_reports(self.report_name(song_title, mode), profiler, snapshot, elapsed)
+
+    def report_name(self, song_title, mode):
+        """
+        Build the base path of the reports of a render.
+
+        Args:
+            song_title (str): The title of the song.
+            mode (str): The wallpaper mode.
+
+        Returns:
+            str: The path, without extension.
+        """
+        slug = re.sub(r"[^\w]+", "_", song_title or "unknown").strip("_")[:60]
+        return os.path.join(self.directory,
+                            f"{slug}-{mode}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+    def write_reports(self, base_path, profiler, snapshot, elapsed):
+        """
+        Write the cProfile dump and the allocation report of a render.
+
+        Args:
+            base_path (str): The path of the reports, without extension.
+            profiler (cProfile.Profile): The profiler, or None.
+            snapshot (tracemalloc.Snapshot): The allocations snapshot, or None.
+            elapsed (float): The duration of the render in seconds.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        if profiler:
+            profiler.dump_stats(f"{base_path}.prof")
+
+        if snapshot:
+            statistics = snapshot.statistics("lineno")
+            with open(f"{base_path}.allocations.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Render time: {elapsed * 1000:.1f} ms\n")
+                f.write(f"Top {self.top} Python allocation sites "
+                        "(memory allocated by Pillow internally is not traced):\n\n")
+                for stat in statistics[:self.top]:
+                    f.write(f"{stat}\n")
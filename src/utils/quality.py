@@ -0,0 +1,136 @@
+"""
+Module that adapts the quality of the renders to a time budget.
+
+On a slow machine the full quality renders (a Gaussian blur at twice the display size,
+hundreds of gradient ellipses, LANCZOS resampling everywhere) can take seconds. With a
+budget, the duration of every render is measured and each mode steps down to a cheaper
+`QualityLevel` when it goes over, and back up once it has enough headroom.
+"""
+
+from dataclasses import dataclass
+import threading
+
+#pylint: disable=import-error
+from PIL import Image
+
+from utils.metrics import QUALITY_CHANGES
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    """
+    The settings of the renders at one level of quality.
+
+    Attributes:
+        name (str): The name of the level, for the messages.
+        blur_scale (float): The size the blurred background is computed at,
+            relative to the wallpaper.
+        resample (int): The filter used to resize the images (e.g. `Image.LANCZOS`).
+        ellipses (int): The number of ellipses of the centered gradient.
+        waveform_bars (int): The number of bars of the waveform.
+    """
+
+    name: str
+    blur_scale: float
+    resample: int
+    ellipses: int
+    waveform_bars: int
+
+
+# From the best to the cheapest
+QUALITY_LEVELS = (
+    QualityLevel("full", 1, Image.LANCZOS, 300, 100),
+    QualityLevel("high", 0.5, Image.BICUBIC, 200, 75),
+    QualityLevel("medium", 0.25, Image.BILINEAR, 120, 50),
+    QualityLevel("low", 0.125, Image.BILINEAR, 60, 30),
+)
+
+
+class QualityController:
+    """
+    A class that picks the quality of the renders of every mode from their duration.
+
+    A render over the budget steps its mode down one level right away. A mode steps
+    back up one level after `patience` renders in a row that took less than
+    `headroom` times the budget, so that it doesn't go back and forth.
+
+    Attributes:
+        budget (float): The time a render should take, in seconds; None renders
+            everything at full quality.
+        headroom (float): The fraction of the budget under which a render is fast.
+        patience (int): The number of fast renders in a row before stepping up.
+        levels (tuple): The quality levels, from the best to the cheapest.
+        modes (dict): The index of the level and the number of fast renders in a row
+            of every mode.
+    """
+
+    def __init__(self, budget=None, headroom=0.5, patience=3, levels=QUALITY_LEVELS):
+        """
+        Initialize the controller, with every mode at full quality.
+
+        Args:
+            budget (float, optional): The time a render should take, in seconds.
+                Defaults to None, no budget.
+            headroom (float, optional): The fraction of the budget under which a render
+                is fast. Defaults to 0.5.
+            patience (int, optional): The number of fast renders in a row before
+                stepping up. Defaults to 3.
+            levels (tuple, optional): The quality levels, from the best to the cheapest.
+        """
+        self.budget = budget
+        self.headroom = headroom
+        self.patience = patience
+        self.levels = levels
+        self.modes = {}
+        self.lock = threading.Lock()
+
+    def level(self, mode):
+        """
+        Get the quality of the next render of a mode.
+
+        Args:
+            mode (str): The wallpaper mode.
+
+        Returns:
+            QualityLevel: The quality level.
+        """
+        with self.lock:
+            return self.levels[self.modes.get(mode, (0, 0))[0]]
+
+    def record(self, mode, duration):
+        """
+        Adapt the quality of a mode to the duration of its last render.
+
+        Args:
+            mode (str): The wallpaper mode.
+            duration (float): The time the render took, in seconds.
+
+        Returns:
+            QualityLevel: The new quality level, or None if it didn't change.
+        """
+        if not self.budget:
+            return None
+
+        with self.lock:
+            index, fast = self.modes.get(mode, (0, 0))
+            if duration > self.budget:
+                step, fast = 1, 0
+            elif duration < self.budget * self.headroom:
+                fast += 1
+                step = -1 if fast >= self.patience else 0
+            else:
+                step, fast = 0, 0
+
+            new_index = min(max(index + step, 0), len(self.levels) - 1)
+            if new_index != index:
+                fast = 0
+            self.modes[mode] = (new_index, fast)
+
+        if new_index == index:
+            return None
+
+        level = self.levels[new_index]
+        QUALITY_CHANGES.labels(mode=mode, direction="down" if step > 0 else "up").inc()
+        print(f"Rendering {mode} at {level.name} quality "
+              f"({duration * 1000:.0f} ms, budget {self.budget * 1000:.0f} ms)")
+        return level
@@ -0,0 +1,196 @@
+"""
+Module that stores the rendered wallpapers on disk, so that they can be reused.
+"""
+
+import os
+import shutil
+import threading
+
+from utils.metrics import CACHE_HITS, CACHE_MISSES
+
+
+class RenderCache:
+    """
+    A class that stores rendered wallpapers on disk, keyed by song, mode and display.
+
+    Every wallpaper is stored as `<path>/<width>x<height>/<mode>/<song_id>.png`.
+    Files are written under a temporary name and renamed in place, so an interrupted
+    write never leaves a partial wallpaper behind.
+
+    With a maximum size, the wallpapers of the least played songs are evicted first
+    (the oldest first between songs played as often), down to 90% of the size, so
+    the wallpapers of the daily rotation stay. The favorites are never evicted.
+
+    Attributes:
+        path (str): The directory where the wallpapers are stored.
+        max_bytes (int): The maximum size of the cache, or None for no limit.
+        history (PlayHistory): The play counts used to choose what to evict, if any.
+        size (int): The size of the cache in bytes, measured at the first store.
+    """
+
+    def __init__(self, path="ImageCache/renders", max_bytes=None, history=None):
+        """
+        Initialize the render cache.
+
+        Args:
+            path (str, optional): The directory where the wallpapers are stored.
+                Defaults to "ImageCache/renders".
+            max_bytes (int, optional): The maximum size of the cache. Defaults to None,
+                no limit.
+            history (PlayHistory, optional): The play counts used to choose what to
+                evict. Without it, the oldest wallpapers are evicted first.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.history = history
+        self.size = None
+        self.lock = threading.Lock()
+
+    def get_path(self, song_id, mode, display):
+        """
+        Get the path where the wallpaper of a song is stored.
+
+        Args:
+            song_id (str): The ID of the song.
+            mode (str): The wallpaper mode.
+            display (list): The dimensions of the display (width, height).
+
+        Returns:
+            str: The path of the wallpaper, whether it exists or not.
+        """
+        resolution = f"{int(display[0])}x{int(display[1])}"
+        return os.path.join(self.path, resolution, mode, f"{song_id}.png")
+
+    def contains(self, song_id, mode, display):
+        """
+        Check if the wallpaper of a song is stored, without counting it as a lookup.
+
+        Args:
+            song_id (str): The ID of the song.
+            mode (str): The wallpaper mode.
+            display (list): The dimensions of the display (width, height).
+
+        Returns:
+            bool: True if the wallpaper is stored.
+        """
+        return os.path.exists(self.get_path(song_id, mode, display))
+
+    def get(self, song_id, mode, display):
+        """
+        Look up the wallpaper of a song.
+
+        Args:
+            song_id (str): The ID of the song.
+            mode (str): The wallpaper mode.
+            display (list): The dimensions of the display (width, height).
+
+        Returns:
+            str: The path of the wallpaper, or None if it is not stored.
+        """
+        path = self.get_path(song_id, mode, display)
+        if os.path.exists(path):
+            CACHE_HITS.labels(cache="render").inc()
+            return path
+
+        CACHE_MISSES.labels(cache="render").inc()
+        return None
+
+    #pylint: disable=too-many-arguments, too-many-positional-arguments
+    def put(self, song_id, mode, display, image_path, move=False):
+        """
+        Store a rendered wallpaper.
+
+        Args:
+            song_id (str): The ID of the song.
+            mode (str): The wallpaper mode.
+            display (list): The dimensions of the display (width, height).
+            image_path (str): The path of the rendered wallpaper.
+            move (bool, optional): Move the file instead of copying it. Defaults to False.
+
+        Returns:
+            str: The path of the stored wallpaper.
+        """
+        path = self.get_path(song_id, mode, display)
+        if self.max_bytes is None:
+            store_file(image_path, path, move)
+            return path
+
+        with self.lock:
+            if self.size is None:
+                self.size = sum(entry[3] for entry in self.entries())
+            self.size -= os.path.getsize(path) if os.path.exists(path) else 0
+            store_file(image_path, path, move)
+            self.size += os.path.getsize(path)
+            if self.size > self.max_bytes:
+                self.evict(keep=path)
+        return path
+
+    def entries(self):
+        """
+        List the wallpapers stored.
+
+        Returns:
+            list: Tuples of (path, song ID, mode, size in bytes, modification time).
+        """
+        entries = []
+        for resolution in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            for mode in os.listdir(os.path.join(self.path, resolution)):
+                folder = os.path.join(self.path, resolution, mode)
+                with os.scandir(folder) as files:
+                    for entry in files:
+                        if entry.name.endswith(".png"):
+                            stat = entry.stat()
+                            entries.append((entry.path, entry.name[:-len(".png")], mode,
+                                            stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Remove the wallpapers of the least played songs, down to 90% of the maximum size.
+
+        The lock must be held.
+
+        Args:
+            keep (str, optional): A wallpaper that must not be removed, e.g. the one
+                just stored.
+        """
+        counts = self.history.play_counts() if self.history is not None else {}
+        candidates = sorted((entry for entry in self.entries()
+                             if entry[2] != "favorite" and entry[0] != keep),
+                            key=lambda entry: (counts.get(entry[1], 0), entry[4]))
+
+        evicted = 0
+        for path, _, _, size, _ in candidates:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+            evicted += 1
+
+        if evicted:
+            print(f"Render cache: evicted {evicted} wallpapers of the least played songs")
+
+
+def store_file(source, destination, move=False):
+    """
+    Copy or move a file, replacing the destination atomically.
+
+    The file is first written next to the destination under a temporary name,
+    then renamed, so readers never see a partially written file.
+
+    Args:
+        source (str): The path of the file to store.
+        destination (str): Where to store the file.
+        move (bool, optional): Move the file instead of copying it. Defaults to False.
+    """
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+
+    temporary_path = f"{destination}.{os.getpid()}.tmp"
+    if move:
+        shutil.move(source, temporary_path)
+    else:
+        shutil.copyfile(source, temporary_path)
+    os.replace(temporary_path, destination)
@@ -0,0 +1,133 @@
+"""
+Module with the thread that renders the wallpapers, away from the Spotify polling.
+"""
+
+import threading
+import traceback
+
+from utils.cancellation import CancelToken, RenderCancelled, activate
+from utils.metrics import RENDERS_CANCELLED
+
+
+class RenderWorker:
+    """
+    A class that renders the wallpapers of the track changes in a background thread.
+
+    Only the most recent track matters: submitting a render cancels the one running
+    (it stops at its next checkpoint, see `utils.cancellation`) and replaces the one
+    waiting. A render only starts once its track has been playing for `debounce`
+    seconds, so skipping several tracks in a row renders the last one only.
+
+    Attributes:
+        render (callable): The function rendering a track change, called with the
+            submitted arguments while their token is active.
+        debounce (float): How long a track must stay the same before it is rendered,
+            in seconds.
+        pending (tuple): The next render, as (token, args), or None.
+        current (CancelToken): The token of the render running, or None.
+    """
+
+    def __init__(self, render, debounce=0):
+        """
+        Initialize the worker and start its thread.
+
+        Args:
+            render (callable): The function rendering a track change.
+            debounce (float, optional): How long a track must stay the same before
+                it is rendered, in seconds. Defaults to 0.
+        """
+        self.render = render
+        self.debounce = debounce
+        self.pending = None
+        self.current = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="render", daemon=True)
+        self.thread.start()
+
+    def submit(self, song_id, *args):
+        """
+        Render a track change, cancelling the renders of the previous ones.
+
+        Args:
+            song_id (str): The ID of the song.
+            *args: The arguments of the render function.
+
+        Returns:
+            CancelToken: The token of the new render.
+        """
+        token = CancelToken(song_id)
+        with self.condition:
+            self.cancel_locked()
+            self.pending = (token, args)
+            self.condition.notify()
+        return token
+
+    def cancel(self):
+        """
+        Cancel the render running and the one waiting, if any.
+
+        Returns:
+            bool: True if a render was cancelled.
+        """
+        with self.condition:
+            return self.cancel_locked()
+
+    def cancel_locked(self):
+        """Cancel the renders; the condition must be held."""
+        cancelled = False
+        if self.pending is not None:
+            self.pending[0].cancel()
+            self.pending = None
+            cancelled = True
+        if self.current is not None:
+            self.current.cancel()
+            cancelled = True
+        return cancelled
+
+    def is_busy(self):
+        """
+        Check if a render is running or waiting.
+
+        Returns:
+            bool: True if the worker is busy.
+        """
+        with self.condition:
+            return self.pending is not None or self.current is not None
+
+    def run(self):
+        """Render the submitted track changes until the worker is closed."""
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                token, args = self.pending
+                self.pending = None
+                self.current = token
+
+            try:
+                # A newer track cancels the token while waiting
+                if token.wait(self.debounce):
+                    RENDERS_CANCELLED.labels(stage="debounce").inc()
+                    continue
+                with activate(token):
+                    self.render(*args)
+            except RenderCancelled as e:
+                RENDERS_CANCELLED.labels(stage=e.stage).inc()
+            except Exception:  #pylint: disable=broad-exception-caught
+                # Keep rendering the next tracks
+                traceback.print_exc()
+            finally:
+                with self.condition:
+                    if self.current is token:
+                        self.current = None
+
+    def close(self):
+        """Cancel the renders and stop the thread."""
+        with self.condition:
+            self.cancel_locked()
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
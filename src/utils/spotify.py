@@ -2,10 +2,13 @@
 Module for interacting with the Spotify API.
 """
 import json
+import time
 
 import requests
 from spotipy import util
 
+from utils.metrics import POLL_ERRORS, POLL_TIME
+
 
 class SpotifyClient:
     """
@@ -79,7 +82,13 @@ class SpotifyClient:
 
         for _ in range(self.max_tries):
             try:
+                start = time.perf_counter()
                 response = requests.get(url, headers=header, timeout=10)
+                POLL_TIME.observe(time.perf_counter() - start)
+
+                if response.status_code >= 400:
+                    POLL_ERRORS.inc()
+
                 if response.status_code == 200:
                     content = json.loads(response.text)
 
@@ -87,7 +96,10 @@ class SpotifyClient:
                     item = content.get("item")
                     name = item.get("name")
                     artist_name = item.get("album").get("artists")[0].get("name")
-                    image_url = item.get("album").get("images")[0].get("url")
+                    # All the sizes of the cover (usually 640, 300 and 64px), largest first
+                    images = sorted(item.get("album").get("images"),
+                                    key=lambda image: image.get("width") or 0, reverse=True)
+                    image_url = images[0].get("url")
                     song_id = item.get("id")
                     song_length = item.get("duration_ms")
 
@@ -95,14 +107,17 @@ class SpotifyClient:
                         "song_title": name,
                         "artist_name": artist_name,
                         "image_url": image_url,
+                        "images": images,
                         "song_id": song_id,
                         "song_length": song_length,
+                        "progress_ms": content.get("progress_ms"),
                         "playing": status
                     }
 
                     # Check if all data values are valid
                     return data
             except requests.exceptions.RequestException as e:
+                POLL_ERRORS.inc()
                 print(f"Error while getting current song: {e}")
                 continue
 
@@ -0,0 +1,224 @@
+"""
+Module for timing the stages of the track-change pipeline.
+
+Stages are recorded as named spans into a ring buffer, grouped by the track change
+they belong to, and can be exported as Chrome trace-event JSON (chrome://tracing,
+Perfetto).
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    """
+    A class that records timing spans into a ring buffer.
+
+    Every span recorded between `begin_change` and `end_change`, on the thread that
+    began the change, is attached to that track change, so the latency of a change can
+    be broken down stage by stage. The spans of the other threads (background renders,
+    live wallpapers) are left out.
+
+    Attributes:
+        events (deque): The most recent spans.
+        changes (deque): The most recent track changes.
+    """
+
+    def __init__(self, capacity=2000, max_changes=100):
+        """
+        Initialize the tracer.
+
+        Args:
+            capacity (int, optional): Number of spans kept. Defaults to 2000.
+            max_changes (int, optional): Number of track changes kept. Defaults to 100.
+        """
+        self.events = deque(maxlen=capacity)
+        self.changes = deque(maxlen=max_changes)
+        self.lock = threading.Lock()
+        # The track change of every thread, set by `begin_change`
+        self.local = threading.local()
+        self.change_count = 0
+
+    @contextmanager
+    def span(self, name, **args):
+        """
+        Time the enclosed block as a span.
+
+        Args:
+            name (str): The name of the stage.
+            **args: Details shown with the span in the trace (e.g. the mode).
+
+        Yields:
+            dict: The span, completed with its duration when the block exits.
+        """
+        event = {
+            "name": name,
+            "start": time.perf_counter(),
+            "duration": 0,
+            "thread": threading.get_ident(),
+            "change": None,
+            "args": args,
+        }
+        try:
+            yield event
+        finally:
+            event["duration"] = time.perf_counter() - event["start"]
+            self.record(event)
+
+    def record(self, event):
+        """
+        Store a completed span, attaching it to the track change of its thread.
+
+        Args:
+            event (dict): The span.
+        """
+        change = getattr(self.local, "change", None)
+        with self.lock:
+            self.events.append(event)
+            if change is not None and event["change"] is None:
+                event["change"] = change["id"]
+                change["spans"].append(event)
+
+    def begin_change(self, song_id, song_title=None, adopt=()):
+        """
+        Start a new track change; the following spans of the thread are attached to it.
+
+        Args:
+            song_id (str): The ID of the new song.
+            song_title (str, optional): The title of the new song.
+            adopt (iterable, optional): Spans already recorded that belong to this change,
+                such as the poll that detected it.
+        """
+        with self.lock:
+            self.change_count += 1
+            change = {
+                "id": self.change_count,
+                "song_id": song_id,
+                "song_title": song_title,
+                "start": min([event["start"] for event in adopt] + [time.perf_counter()]),
+                "end": None,
+                "spans": [],
+            }
+            for event in adopt:
+                event["change"] = change["id"]
+                change["spans"].append(event)
+
+            self.changes.append(change)
+        self.local.change = change
+
+    def end_change(self):
+        """Mark the track change of the thread as completed (the wallpaper is set)."""
+        change = getattr(self.local, "change", None)
+        if change is not None:
+            with self.lock:
+                change["end"] = time.perf_counter()
+            self.local.change = None
+
+    def last_changes(self, count):
+        """
+        Get the most recent track changes.
+
+        Args:
+            count (int): How many changes to return.
+
+        Returns:
+            list: The changes, oldest first.
+        """
+        with self.lock:
+            return list(self.changes)[-count:]
+
+    @staticmethod
+    def breakdown(change):
+        """
+        Compute how long a track change spent in each stage.
+
+        Nested spans are subtracted from their parent, so every stage only counts
+        its own time (the render doesn't include the palette extraction it triggers).
+
+        Args:
+            change (dict): A track change.
+
+        Returns:
+            dict: The time spent in each stage in milliseconds, in order of appearance.
+        """
+        spans = sorted(change["spans"], key=lambda event: event["start"])
+        stages = {}
+        for span in spans:
+            end = span["start"] + span["duration"]
+            nested = sum(child["duration"] for child in spans
+                         if child is not span and child["thread"] == span["thread"]
+                         and child["start"] >= span["start"]
+                         and child["start"] + child["duration"] <= end
+                         and not _is_nested_deeper(child, span, spans))
+            stages[span["name"]] = stages.get(span["name"], 0) + \
+                (span["duration"] - nested) * 1000
+        return stages
+
+    def time_in(self, span, names):
+        """
+        Compute how long a span spent in some of the stages nested in it.
+
+        Args:
+            span (dict): A completed span.
+            names (tuple): The names of the stages.
+
+        Returns:
+            float: The time in seconds; a stage nested in another one is counted once.
+        """
+        end = span["start"] + span["duration"]
+        with self.lock:
+            stages = [event for event in self.events
+                      if event is not span and event["thread"] == span["thread"]
+                      and event["name"] in names and event["start"] >= span["start"]
+                      and event["start"] + event["duration"] <= end]
+        return sum(stage["duration"] for stage in stages
+                   if not any(other is not stage and other["start"] <= stage["start"]
+                              and stage["start"] + stage["duration"]
+                              <= other["start"] + other["duration"]
+                              for other in stages))
+
+    def export_chrome_trace(self, path):
+        """
+        Write the spans in the Chrome trace-event JSON format.
+
+        Args:
+            path (str): Where to write the trace.
+        """
+        with self.lock:
+            events = list(self.events)
+
+        trace_events = [{
+            "name": event["name"],
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["duration"] * 1e6,
+            "pid": os.getpid(),
+            "tid": event["thread"],
+            "args": dict(event["args"], change=event["change"]),
+        } for event in events]
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+
+def _is_nested_deeper(child, parent, spans):
+    """Check if `child` is inside another span that is itself inside `parent`."""
+    child_end = child["start"] + child["duration"]
+    parent_end = parent["start"] + parent["duration"]
+    for span in spans:
+        if span is child or span is parent or span["thread"] != child["thread"]:
+            continue
+        span_end = span["start"] + span["duration"]
+        if (parent["start"] <= span["start"] and span_end <= parent_end
+                and span["start"] <= child["start"] and child_end <= span_end):
+            return True
+    return False
+
+
+# The tracer shared by the whole program
+tracer = Tracer()
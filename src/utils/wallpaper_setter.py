@@ -0,0 +1,118 @@
+"""
+Module for setting the GNOME wallpaper without spawning a shell for every change.
+
+The wallpaper is written to GSettings in-process through PyGObject when it is installed
+(`pip install PyGObject`), otherwise with a `gsettings` subprocess run without a shell.
+Either way the setter remembers what it applied last and skips the changes that would
+not change anything, such as restoring the original wallpaper every second while the
+playback is paused.
+"""
+
+import os
+import pathlib
+import subprocess
+import threading
+import urllib.parse
+import urllib.request
+
+try:
+    #pylint: disable=import-error
+    import gi
+    gi.require_version("Gio", "2.0")
+    from gi.repository import Gio
+except (ImportError, ValueError):
+    Gio = None
+
+
+def to_uri(path_or_uri):
+    """
+    Convert a path to a file URI; URIs and GSettings values are returned unquoted.
+
+    Parameters:
+        path_or_uri (str): A path, a URI or a quoted value as printed by gsettings.
+
+    Returns:
+        str: The URI.
+    """
+    value = path_or_uri.strip().strip("'\"")
+    if "://" in value:
+        return value
+    return pathlib.Path(os.path.abspath(value)).as_uri()
+
+
+def change_key(uri):
+    """
+    Build the key identifying a wallpaper change.
+
+    The modification time of local files is part of the key: the generated wallpapers
+    are always written to the same path, so a new render must be applied again.
+
+    Parameters:
+        uri (str): The URI of the wallpaper.
+
+    Returns:
+        tuple: The URI and the modification time in nanoseconds (None if not a local file).
+    """
+    if uri.startswith("file://"):
+        try:
+            # The URI is percent-encoded (spaces, non-ASCII characters)
+            path = urllib.request.url2pathname(urllib.parse.urlparse(uri).path)
+            return uri, os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+    return uri, None
+
+
+class GSettingsSetter:
+    """
+    A class that sets a GSettings wallpaper key, deduplicating the changes.
+
+    Attributes:
+        schema (str): The GSettings schema of the wallpaper.
+        key (str): The key holding the wallpaper URI (picture-uri or picture-uri-dark).
+        last_applied (tuple): The key of the last change applied, see `change_key`.
+        settings (Gio.Settings): The in-process settings, or None to use `gsettings`.
+    """
+
+    def __init__(self, key="picture-uri", schema="org.gnome.desktop.background"):
+        """
+        Initialize the setter.
+
+        Parameters:
+            key (str, optional): The key holding the wallpaper URI. Defaults to "picture-uri".
+            schema (str, optional): The GSettings schema.
+                Defaults to "org.gnome.desktop.background".
+        """
+        self.schema = schema
+        self.key = key
+        self.last_applied = None
+        self.lock = threading.Lock()
+        self.settings = Gio.Settings.new(schema) if Gio else None
+
+    def apply(self, path_or_uri, force=False):
+        """
+        Set the wallpaper, unless it is already the one applied last.
+
+        Parameters:
+            path_or_uri (str): The image to set, as a path or a URI.
+            force (bool, optional): Apply the change even if it looks like a duplicate.
+                Defaults to False.
+
+        Returns:
+            bool: True if the wallpaper was changed, False if the change was skipped.
+        """
+        uri = to_uri(path_or_uri)
+        key = change_key(uri)
+
+        with self.lock:
+            if key == self.last_applied and not force:
+                return False
+
+            if self.settings is not None:
+                self.settings.set_string(self.key, uri)
+                Gio.Settings.sync()
+            else:
+                subprocess.run(["gsettings", "set", self.schema, self.key, uri], check=False)
+
+            self.last_applied = key
+            return True